@@ -0,0 +1,139 @@
+"""
+基准测试：重计算期间的事件循环延迟
+
+模拟一组持续进行的轻量报价请求，同时执行大量技术指标计算，
+对比"在事件循环内直接计算"与"交给计算执行器"两种方式下：
+- 事件循环延迟（定时器实际唤醒时间 - 预期唤醒时间）
+- 并发报价请求的响应耗时
+
+无需 API Key，所有网络请求均以 asyncio.sleep 模拟。
+"""
+import asyncio
+import random
+import time
+from typing import List
+
+from src.compute import ComputeExecutor
+from src.kline_frame import KlineFrame
+from src.tools.technical_indicators import TechnicalIndicatorsTool
+from src.tools.batch_indicators import BatchIndicatorsTool
+
+
+BARS = 1000              # 每只股票K线条数
+SYMBOLS = 40             # 批量指标的股票数量
+HEAVY_JOBS = 6           # 重计算任务数
+QUOTE_RTT = 0.005        # 模拟报价请求的网络耗时（秒）
+MONITOR_INTERVAL = 0.01  # 事件循环延迟采样间隔（秒）
+
+
+def make_frame(n: int) -> KlineFrame:
+    """生成随机游走K线"""
+    price = 100.0
+    records = []
+    for i in range(n):
+        open_price = price
+        price *= 1 + random.gauss(0, 0.02)
+        records.append({
+            "t": 1700000000000 + i * 86400000,
+            "o": open_price,
+            "h": max(open_price, price) * 1.01,
+            "l": min(open_price, price) * 0.99,
+            "c": price,
+            "v": 1000,
+            "tu": 1000 * price
+        })
+    return KlineFrame.from_records(records)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """计算百分位数"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def monitor_lag(samples: List[float], stop: asyncio.Event):
+    """持续采样事件循环延迟"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(MONITOR_INTERVAL)
+        samples.append(time.perf_counter() - start - MONITOR_INTERVAL)
+
+
+async def quote_traffic(latencies: List[float], stop: asyncio.Event):
+    """持续发起模拟报价请求"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(QUOTE_RTT)
+        latencies.append(time.perf_counter() - start)
+
+
+async def scenario(name: str, executor: ComputeExecutor, frames: List[KlineFrame]):
+    """运行一个场景并打印统计"""
+    stop = asyncio.Event()
+    lags: List[float] = []
+    latencies: List[float] = []
+    
+    background = [
+        asyncio.create_task(monitor_lag(lags, stop)),
+        *[asyncio.create_task(quote_traffic(latencies, stop)) for _ in range(10)]
+    ]
+    
+    frame = frames[0]
+    closes, highs, lows = frame.c.tolist(), frame.h.tolist(), frame.l.tolist()
+    
+    start = time.perf_counter()
+    jobs = []
+    for _ in range(HEAVY_JOBS):
+        jobs.append(executor.run(
+            TechnicalIndicatorsTool.compute_indicators,
+            closes, highs, lows, ["all"],
+            size=len(closes),
+            kind=ComputeExecutor.PROCESS
+        ))
+        jobs.append(executor.run(
+            BatchIndicatorsTool.compute,
+            frames,
+            size=sum(len(f) for f in frames)
+        ))
+    await asyncio.gather(*jobs)
+    elapsed = time.perf_counter() - start
+    
+    stop.set()
+    await asyncio.gather(*background)
+    
+    print(f"\n📊 {name}")
+    print(f"   计算总耗时:       {elapsed * 1000:8.1f} ms")
+    print(f"   事件循环延迟 p50: {percentile(lags, 0.5) * 1000:8.2f} ms")
+    print(f"   事件循环延迟 p99: {percentile(lags, 0.99) * 1000:8.2f} ms")
+    print(f"   事件循环延迟 max: {max(lags) * 1000:8.2f} ms")
+    print(f"   报价耗时 p50:     {percentile(latencies, 0.5) * 1000:8.2f} ms")
+    print(f"   报价耗时 p99:     {percentile(latencies, 0.99) * 1000:8.2f} ms")
+    print(f"   报价完成数:       {len(latencies):8d}")
+
+
+async def main():
+    print("=" * 60)
+    print("⏱️  事件循环延迟基准测试")
+    print("=" * 60)
+    print(f"K线: {SYMBOLS} 只 × {BARS} 条 | 重计算任务: {HEAVY_JOBS * 2} 个 | 模拟报价 RTT: {QUOTE_RTT * 1000:.0f} ms")
+    
+    random.seed(42)
+    frames = [make_frame(BARS) for _ in range(SYMBOLS)]
+    
+    inline = ComputeExecutor(threshold=10 ** 9)
+    await scenario("事件循环内直接计算", inline, frames)
+    
+    offload = ComputeExecutor(threads=4, processes=2, threshold=0)
+    try:
+        # 预先启动线程池和进程池，不把启动开销计入测试
+        await asyncio.gather(
+            offload.run(sum, [0]),
+            *[offload.run(sum, [0], kind=ComputeExecutor.PROCESS) for _ in range(offload.processes)]
+        )
+        await scenario("计算执行器（线程池 + 进程池）", offload, frames)
+    finally:
+        offload.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
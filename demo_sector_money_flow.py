@@ -10,43 +10,12 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from src.itick_client import get_client
+from src.sectors import etf_flow, list_sectors
 
 
-# A股主要板块ETF代码
-A_STOCK_SECTOR_ETFS = {
-    "科技板块": [
-        {"name": "半导体ETF", "region": "SH", "code": "512480"},
-        {"name": "人工智能ETF", "region": "SH", "code": "515070"},
-        {"name": "芯片ETF", "region": "SZ", "code": "159995"},
-        {"name": "5G ETF", "region": "SH", "code": "515050"},
-    ],
-    "消费板块": [
-        {"name": "白酒ETF", "region": "SH", "code": "512690"},
-        {"name": "消费ETF", "region": "SZ", "code": "159928"},
-        {"name": "医药ETF", "region": "SH", "code": "512010"},
-    ],
-    "金融板块": [
-        {"name": "证券ETF", "region": "SH", "code": "512880"},
-        {"name": "银行ETF", "region": "SH", "code": "512800"},
-        {"name": "保险ETF", "region": "SH", "code": "512910"},
-    ],
-    "新能源板块": [
-        {"name": "新能源车ETF", "region": "SH", "code": "515030"},
-        {"name": "光伏ETF", "region": "SH", "code": "515790"},
-        {"name": "电池ETF", "region": "SZ", "code": "159755"},
-    ],
-}
-
-# 港股主要板块ETF
-HK_SECTOR_ETFS = {
-    "科技板块": [
-        {"name": "恒生科技ETF", "region": "HK", "code": "3033"},
-        {"name": "互联网科技ETF", "region": "HK", "code": "3022"},
-    ],
-    "医疗板块": [
-        {"name": "医疗保健ETF", "region": "HK", "code": "3067"},
-    ],
-}
+# 板块ETF定义见 src/data/sectors.json
+A_STOCK_SECTOR_ETFS = list_sectors("A股")
+HK_SECTOR_ETFS = list_sectors("港股")
 
 
 async def analyze_etf_money_flow(client, region: str, code: str, name: str, days: int = 5):
@@ -71,71 +40,16 @@ async def analyze_etf_money_flow(client, region: str, code: str, name: str, days
             return {"name": name, "error": "获取行情失败"}
         
         # 获取K线数据
-        kline = await client.get_stock_kline(region, code, period="day", limit=days + 1)
+        frame = await client.get_stock_kline_frame(region, code, period="day", limit=days + 1)
         
-        if not kline or len(kline) < 2:
+        if len(frame) < 2:
             return {"name": name, "error": "获取K线失败"}
         
-        # 基础数据
-        latest_price = quote.get('ld', 0)
-        change_pct = quote.get('chp', 0)
-        volume = quote.get('v', 0)
-        turnover = quote.get('tu', 0)
-        
-        # 计算量能比（今日 vs 昨日）
-        today_volume = kline[-1].get('v', 0)
-        yesterday_volume = kline[-2].get('v', 0)
-        volume_ratio = (today_volume / yesterday_volume) if yesterday_volume else 1.0
-        
-        # 计算近N日涨跌
-        period_change = 0
-        if len(kline) >= days:
-            first_close = kline[-days].get('c', 0)
-            last_close = kline[-1].get('c', 0)
-            period_change = ((last_close - first_close) / first_close * 100) if first_close else 0
-        
-        # 资金流向评分（0-100）
-        # 涨跌幅权重50%，量能比权重30%，近期趋势20%
-        score = (
-            (change_pct * 10) * 0.5 +  # 涨1%得5分
-            ((volume_ratio - 1) * 100) * 0.3 +  # 放量20%得6分
-            (period_change * 2) * 0.2  # 近期涨1%得0.4分
-        )
-        score = max(0, min(100, score + 50))  # 归一化到0-100
-        
-        # 资金流向判断
-        if change_pct > 2 and volume_ratio > 1.2:
-            flow_status = "🔥 强势流入"
-        elif change_pct > 0.5 and volume_ratio > 1:
-            flow_status = "🟢 持续流入"
-        elif change_pct > 0:
-            flow_status = "✅ 小幅流入"
-        elif change_pct > -0.5:
-            flow_status = "⚪ 震荡整理"
-        elif change_pct > -2:
-            flow_status = "🔴 小幅流出"
-        else:
-            flow_status = "❌ 大幅流出"
-        
-        # 估算净流入金额（简化算法）
-        # 实际应该用逐笔成交的买卖盘数据
-        if change_pct > 0 and volume_ratio > 1:
-            net_inflow = turnover * (change_pct / 100) * volume_ratio
-        else:
-            net_inflow = -turnover * abs(change_pct / 100) * 0.5
-        
+        # 评分与净流入估算与服务端板块快照一致
         return {
             "name": name,
             "code": f"{region}.{code}",
-            "price": latest_price,
-            "change_pct": change_pct,
-            "volume": volume,
-            "turnover": turnover,
-            "volume_ratio": volume_ratio,
-            "period_change": period_change,
-            "score": score,
-            "flow_status": flow_status,
-            "net_inflow": net_inflow,
+            **etf_flow(quote, frame, days)
         }
         
     except Exception as e:
@@ -0,0 +1,381 @@
+"""
+Bar Store - 本地K线存储
+缓存已获取的K线及其完整覆盖区间，能直接返回或由更细周期合成所需K线时无需再请求 iTick
+配置持久化目录后，每个序列及其附属数据（如资金流向记录）以 .npz 文件保存，重启后按需加载
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+from pathlib import Path
+import logging
+import os
+import threading
+import time
+import numpy as np
+from .config import settings
+from .compute import get_executor
+from .kline_frame import KlineFrame
+from .resample import Resampler, source_periods
+
+
+# 序列键: (类型 stock/index, 市场, 代码, 周期)
+SeriesKey = Tuple[str, str, str, str]
+
+# 完整覆盖区间列表: 按时间排列、互不相交也不首尾相接的 [start, end]（毫秒）
+Coverage = List[Tuple[int, int]]
+
+logger = logging.getLogger(__name__)
+
+
+def merge_coverage(coverage: Coverage, start: int, end: int) -> Coverage:
+    """把 [start, end] 并入覆盖区间列表，与之重叠或首尾相接的区间合并为一个"""
+    merged = []
+    for cov_start, cov_end in coverage:
+        if cov_end + 1 < start or cov_start > end + 1:
+            merged.append((cov_start, cov_end))
+        else:
+            start, end = min(start, cov_start), max(end, cov_end)
+    merged.append((start, end))
+    return sorted(merged)
+
+
+def find_interval(coverage: Coverage, t: int) -> Optional[Tuple[int, int]]:
+    """包含时间戳 t 的覆盖区间"""
+    for cov_start, cov_end in coverage:
+        if cov_start <= t <= cov_end:
+            return cov_start, cov_end
+    return None
+
+
+def _coverage_list(array: np.ndarray) -> Coverage:
+    """持久化的覆盖区间数组（旧文件为单个 [start, end]）转换为区间列表"""
+    return [(int(start), int(end)) for start, end in array.reshape(-1, 2).tolist()]
+
+
+class BarStore:
+    """
+    本地K线存储
+    
+    每个序列保存合并后的 KlineFrame 和若干完整覆盖区间 [start, end]：
+    区间内的每一根K线都已在本地，区间外的数据可能缺失。
+    分段并发获取时各段可能乱序写入，不相接的区间分别保留，后续写入补上空隙时再合并。
+    """
+    
+    def __init__(self, max_bars: int = 50000, ttl: int = 60, directory: Optional[str] = None):
+        """
+        初始化存储
+        
+        Args:
+            max_bars: 每个序列最多保留的K线条数，超出时丢弃最早的
+            ttl: 覆盖区间末端距当前时间在此秒数内视为最新
+            directory: 持久化目录，为空时只保存在内存
+        """
+        self.max_bars = max_bars
+        self.ttl = ttl
+        self.directory = Path(directory) if directory else None
+        self._frames: Dict[SeriesKey, KlineFrame] = {}
+        self._coverage: Dict[SeriesKey, Coverage] = {}
+        self._loaded: set = set()
+        # 已在内存更新、尚未写入持久化目录的序列（见 put 的 persist 参数）
+        self._dirty: set = set()
+        # 未加载序列的元数据缓存: 序列键 -> (文件修改时间, K线条数, 完整覆盖区间)
+        self._summaries: Dict[SeriesKey, Tuple[int, int, Coverage]] = {}
+        self.resampler = Resampler()
+        self._listeners: List[Callable[[SeriesKey, KlineFrame, int], None]] = []
+    
+    def add_listener(self, listener: Callable[[SeriesKey, KlineFrame, int], None]):
+        """注册写入回调，参数为序列键、合并后的序列和本次写入的最早时间戳"""
+        self._listeners.append(listener)
+    
+    def path(self, key: SeriesKey, name: str = "bars") -> Optional[Path]:
+        """
+        序列在持久化目录中的文件路径
+        
+        Args:
+            key: 序列键
+            name: 文件名，bars 为K线本身，其他名称用于附属数据
+        """
+        if self.directory is None:
+            return None
+        kind, region, code, period = key
+        return self.directory / kind / region / code / f"{period}.{name}.npz"
+    
+    def save_arrays(self, key: SeriesKey, name: str, arrays: Dict[str, np.ndarray]):
+        """
+        将数组写入序列的附属文件（先写临时文件再替换，避免写到一半的文件）
+        
+        可在计算执行器的线程中调用，临时文件按线程区分。
+        """
+        path = self.path(key, name)
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+            with open(tmp, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"[BarStore] 写入失败: {path}, error={str(e)}")
+    
+    def load_arrays(self, key: SeriesKey, name: str) -> Optional[Dict[str, np.ndarray]]:
+        """读取序列的附属文件，不存在或损坏时返回 None"""
+        path = self.path(key, name)
+        if path is None or not path.is_file():
+            return None
+        try:
+            with np.load(path) as data:
+                return {field: data[field] for field in data.files}
+        except (OSError, ValueError) as e:
+            logger.warning(f"[BarStore] 读取失败: {path}, error={str(e)}")
+            return None
+    
+    def _ensure_loaded(self, key: SeriesKey):
+        """首次访问序列时从持久化目录加载"""
+        if self.directory is None or key in self._loaded:
+            return
+        self._loaded.add(key)
+        if key in self._frames:
+            return
+        
+        data = self.load_arrays(key, "bars")
+        if data is None or "coverage" not in data:
+            return
+        self._frames[key] = KlineFrame(*(data[f] for f in KlineFrame.FIELDS))
+        self._coverage[key] = _coverage_list(data["coverage"])
+    
+    def keys(self) -> List[SeriesKey]:
+        """所有序列键（包括持久化目录中尚未加载的）"""
+        keys = set(self._frames)
+        if self.directory is not None and self.directory.is_dir():
+            for path in self.directory.glob("*/*/*/*.bars.npz"):
+                kind, region, code = path.parts[-4:-1]
+                keys.add((kind, region, code, path.name[:-len(".bars.npz")]))
+        return list(keys)
+    
+    def summary(self, key: SeriesKey) -> Optional[Tuple[int, Coverage]]:
+        """
+        序列的K线条数和完整覆盖区间
+        
+        未加载的序列只读取文件中的覆盖区间和时间列的数组头，不加载K线。
+        """
+        if key in self._frames:
+            return len(self._frames[key]), self._coverage[key]
+        path = self.path(key)
+        if path is None or not path.is_file():
+            return None
+        
+        try:
+            mtime = path.stat().st_mtime_ns
+            cached = self._summaries.get(key)
+            if cached is not None and cached[0] == mtime:
+                return cached[1], cached[2]
+            with np.load(path) as data:
+                if "coverage" not in data.files or "t" not in data.files:
+                    return None
+                coverage = _coverage_list(data["coverage"])
+                with data.zip.open("t.npy") as f:
+                    version = np.lib.format.read_magic(f)
+                    read_header = (
+                        np.lib.format.read_array_header_1_0 if version == (1, 0)
+                        else np.lib.format.read_array_header_2_0
+                    )
+                    shape = read_header(f)[0]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"[BarStore] 读取失败: {path}, error={str(e)}")
+            return None
+        
+        self._summaries[key] = (mtime, int(shape[0]), coverage)
+        return int(shape[0]), coverage
+    
+    def get(self, key: SeriesKey) -> Optional[KlineFrame]:
+        """获取序列的全部本地K线"""
+        self._ensure_loaded(key)
+        return self._frames.get(key)
+    
+    def coverage(self, key: SeriesKey) -> Coverage:
+        """获取序列的完整覆盖区间列表（毫秒，按时间排列），没有数据时为空"""
+        self._ensure_loaded(key)
+        return list(self._coverage.get(key, []))
+    
+    def covers(self, key: SeriesKey, start: int, end: int) -> bool:
+        """[start, end] 是否在某个完整覆盖区间内"""
+        interval = find_interval(self.coverage(key), start)
+        return interval is not None and end <= interval[1]
+    
+    def put(self, key: SeriesKey, frame: KlineFrame, start: int, end: int, persist: bool = True) -> KlineFrame:
+        """
+        写入K线
+        
+        Args:
+            key: 序列键
+            frame: 新获取的K线
+            start: 这批数据完整覆盖的起始时间（毫秒）
+            end: 这批数据完整覆盖的结束时间（毫秒）
+            persist: 是否立即写入持久化目录；为 False 时只更新内存，由 save_dirty 在后台写入
+        
+        Returns:
+            合并后的序列
+        """
+        self._ensure_loaded(key)
+        existing = self._frames.get(key)
+        merged = frame if existing is None else existing.merge(frame)
+        
+        # 与已有覆盖区间重叠或首尾相接时合并，不相接时单独保留
+        coverage = merge_coverage(self._coverage.get(key, []), start, end)
+        
+        if len(merged) > self.max_bars:
+            merged = merged.tail(self.max_bars)
+            first = int(merged.t[0])
+            coverage = [(max(cov_start, first), cov_end) for cov_start, cov_end in coverage if cov_end >= first]
+        
+        self._frames[key] = merged
+        self._coverage[key] = coverage
+        if persist:
+            self._dirty.discard(key)
+            self.save_arrays(key, "bars", self._bar_arrays(key))
+        elif self.directory is not None:
+            self._dirty.add(key)
+        
+        if len(frame) > 0:
+            self.resampler.invalidate(key, int(frame.t[0]))
+            for listener in self._listeners:
+                listener(key, merged, int(frame.t[0]))
+        return merged
+    
+    def _bar_arrays(self, key: SeriesKey) -> Dict[str, np.ndarray]:
+        """序列持久化的数组（K线各列和覆盖区间）"""
+        frame = self._frames[key]
+        return {
+            **{f: getattr(frame, f) for f in KlineFrame.FIELDS},
+            "coverage": np.array(self._coverage[key], dtype=np.int64).reshape(-1, 2)
+        }
+    
+    async def save_dirty(self):
+        """把只在内存更新的序列写入持久化目录（文件写入交给计算执行器，不阻塞事件循环）"""
+        dirty, self._dirty = self._dirty, set()
+        for key in dirty:
+            # 数组在写入期间不会被修改（合并总是生成新数组），可直接交给其他线程
+            arrays = self._bar_arrays(key)
+            await get_executor().run(self.save_arrays, key, "bars", arrays, size=len(arrays["t"]))
+    
+    def _is_fresh(self, end: int, now: int) -> bool:
+        """覆盖区间末端是否足够新"""
+        return end >= now - self.ttl * 1000
+    
+    @staticmethod
+    def _interval(coverage: Coverage, start: Optional[int], end: Optional[int], now: int) -> Optional[Tuple[int, int]]:
+        """
+        请求应落在的覆盖区间
+        
+        指定起始时间时为包含起始时间的区间；否则指定了已过去的结束时间时为包含结束时间的区间，
+        请求到最新数据时为最后一个区间。
+        """
+        if not coverage:
+            return None
+        if start is not None:
+            return find_interval(coverage, start)
+        if end is not None and end < now:
+            return find_interval(coverage, end)
+        return coverage[-1]
+    
+    def _select(
+        self,
+        frame: KlineFrame,
+        coverage: Tuple[int, int],
+        start: Optional[int],
+        end: Optional[int],
+        limit: Optional[int]
+    ) -> Optional[KlineFrame]:
+        """在覆盖区间内截取请求的K线，覆盖不足时返回 None"""
+        cov_start, cov_end = coverage
+        now = int(time.time() * 1000)
+        
+        if start is not None and start < cov_start:
+            return None
+        if end is not None and end < now:
+            if cov_end < end:
+                return None
+        elif not self._is_fresh(cov_end, now):
+            return None
+        
+        selected = frame.between(cov_start if start is None else start, end)
+        if limit:
+            if start is None and len(selected) < limit:
+                return None
+            selected = selected.tail(limit)
+        return selected
+    
+    def query(
+        self,
+        kind: str,
+        region: str,
+        code: str,
+        period: str,
+        session_region: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> Optional[KlineFrame]:
+        """
+        从本地返回K线：优先使用同周期数据，否则由更细周期合成
+        
+        Args:
+            kind: stock 或 index
+            region: 市场代码
+            code: 代码
+            period: 请求的周期
+            session_region: 用于确定交易时段的市场代码
+            start: 起始时间（毫秒）
+            end: 结束时间（毫秒）
+            limit: 返回最近的条数
+        
+        Returns:
+            本地数据完整覆盖请求时返回 KlineFrame，否则返回 None
+        """
+        key = (kind, region, code, period)
+        now = int(time.time() * 1000)
+        self._ensure_loaded(key)
+        if key in self._frames:
+            interval = self._interval(self._coverage[key], start, end, now)
+            selected = None if interval is None else self._select(self._frames[key], interval, start, end, limit)
+            if selected is not None:
+                return selected
+        
+        for source in source_periods(period):
+            source_key = (kind, region, code, source)
+            self._ensure_loaded(source_key)
+            if source_key not in self._frames:
+                continue
+            
+            interval = self._interval(self._coverage[source_key], start, end, now)
+            if interval is None:
+                continue
+            cov_start, cov_end = interval
+            source_bars = self._frames[source_key].between(cov_start, None)
+            bars = self.resampler.resample(source_key, source_bars, period, session_region)
+            if len(bars) == 0:
+                continue
+            
+            # 覆盖区间起点落在某个周期中间时，该周期不完整
+            if bars.t[0] < cov_start:
+                bars = bars[1:]
+                if len(bars) == 0:
+                    continue
+                cov_start = int(bars.t[0])
+            
+            selected = self._select(bars, (cov_start, cov_end), start, end, limit)
+            if selected is not None:
+                return selected
+        
+        return None
+
+
+# 全局存储实例
+_store: Optional[BarStore] = None
+
+
+def get_bar_store() -> BarStore:
+    """获取全局K线存储实例"""
+    global _store
+    if _store is None:
+        _store = BarStore(settings.bar_store_max_bars, settings.bar_cache_ttl, settings.bar_store_dir or None)
+    return _store
@@ -0,0 +1,97 @@
+"""
+Compute Executor - 计算任务执行器
+将 CPU 密集的分析计算移出事件循环，避免阻塞其他并发的 MCP 请求
+"""
+from typing import Any, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import asyncio
+import functools
+from .config import settings
+
+
+class ComputeExecutor:
+    """
+    计算执行器
+    
+    - 线程池：适合 NumPy 向量化计算（运算期间释放 GIL）
+    - 进程池：适合纯 Python 循环的计算（不受 GIL 限制）
+    
+    数据量低于阈值时直接在当前线程计算，省去调度开销。
+    """
+    
+    THREAD = "thread"
+    PROCESS = "process"
+    
+    def __init__(self, threads: int = 4, processes: int = 0, threshold: int = 500):
+        """
+        初始化执行器
+        
+        Args:
+            threads: 线程池大小
+            processes: 进程池大小，0 表示不启用（进程任务改由线程池执行）
+            threshold: 触发后台执行的数据量阈值（如K线条数）
+        """
+        self.threads = threads
+        self.processes = processes
+        self.threshold = threshold
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+    
+    def _pool(self, kind: str):
+        """按需创建并返回对应的池"""
+        if kind == self.PROCESS and self.processes > 0:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.processes)
+            return self._process_pool
+        
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                max_workers=self.threads,
+                thread_name_prefix="itick-compute"
+            )
+        return self._thread_pool
+    
+    async def run(self, func: Callable, *args, size: int = 0, kind: str = THREAD, **kwargs) -> Any:
+        """
+        执行计算任务
+        
+        Args:
+            func: 计算函数（进程池执行时须可被 pickle，即模块级函数或静态方法）
+            *args: 位置参数
+            size: 数据量，低于阈值时直接执行
+            kind: THREAD 或 PROCESS
+            **kwargs: 关键字参数
+        
+        Returns:
+            计算结果
+        """
+        if size < self.threshold:
+            return func(*args, **kwargs)
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool(kind), functools.partial(func, *args, **kwargs))
+    
+    def shutdown(self):
+        """关闭所有池"""
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False)
+            self._thread_pool = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
+
+
+# 全局执行器实例
+_executor: Optional[ComputeExecutor] = None
+
+
+def get_executor() -> ComputeExecutor:
+    """获取全局计算执行器实例"""
+    global _executor
+    if _executor is None:
+        _executor = ComputeExecutor(
+            settings.compute_threads,
+            settings.compute_processes,
+            settings.compute_offload_threshold
+        )
+    return _executor
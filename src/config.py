@@ -13,7 +13,46 @@ class Settings(BaseSettings):
     itick_api_key: str = ""
     itick_api_base_url: str = "https://api.itick.org"
     
+    # 请求限流配置
+    itick_rate_limit: float = 10.0      # 每秒最大请求数（0 表示不限速）
+    itick_max_concurrency: int = 8      # 最大并发请求数
+    itick_max_clients: int = 32         # 最多保留的客户端数（每个 API Key 一个，各自有连接池和限流器）
+    
+    # 本地K线存储配置
+    bar_store_max_bars: int = 50000     # 每个序列最多保留的K线条数
+    bar_cache_ttl: int = 60             # 本地K线视为最新的时长（秒）
+    bar_store_dir: str = ""             # 持久化目录（为空则只保存在内存）
+    
+    # 计算执行器配置
+    compute_threads: int = 4            # 向量化计算线程池大小
+    compute_processes: int = 2          # 纯 Python 计算进程池大小（0 表示不启用）
+    compute_offload_threshold: int = 500  # 数据量达到该值时移出事件循环计算
+    
+    # 逐笔成交配置
+    tick_watchlist: str = ""            # 启动即采集的股票，如 "SH.600519,HK.700"
+    tick_poll_interval: float = 1.0     # 逐笔成交轮询间隔（秒）
+    tick_watch_ttl: int = 1800          # 工具调用发起的临时采集在最后一次查询后保留的时长（秒）
+    tick_watch_max: int = 20            # 临时采集的股票数上限
+    tick_recorder_enabled: bool = False  # 是否把采集到的逐笔成交写入本地环形文件
+    tick_recorder_dir: str = "data/ticks"  # 环形文件目录
+    tick_recorder_capacity: int = 100000  # 每只股票保留的成交条数
+    depth_recorder_enabled: bool = False  # 是否同时轮询关注列表的盘口，并把盘口变化追加写入本地日志
+    depth_recorder_dir: str = "data/depth"  # 盘口日志目录
+    
+    # 指数快照配置
+    index_snapshot_enabled: bool = False  # 是否后台刷新常用指数快照
+    index_snapshot_codes: str = "000001,399001,399006,000688,000300,000905,000852,HSI,HSTECH,HSCEI,IXIC,SPX,DJI"
+    index_snapshot_interval: int = 60   # 交易时段内的刷新间隔（秒）
+    index_snapshot_days: int = 250      # 快照保留的日K线条数
+    
+    # 板块快照配置
+    sector_snapshot_enabled: bool = False  # 是否后台刷新内置板块快照
+    sector_snapshot_interval: int = 60  # 交易时段内的刷新间隔（秒）
+    sector_snapshot_days: int = 5       # 资金评分中近期涨跌的统计天数
+    sector_stream_enabled: bool = False  # 是否采集板块成分逐笔成交，实时维护板块汇总
+    
     # 服务器配置
+    mcp_session_ttl: int = 3600         # MCP 会话空闲超过该时长（秒）且未打开通知流时过期，清除其资源订阅
     port: int = 3000
     host: str = "0.0.0.0"
     debug: bool = False
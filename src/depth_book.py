@@ -0,0 +1,471 @@
+"""
+Depth Book - 增量盘口与盘口历史
+按价位维护每只股票的盘口，新快照只与当前盘口比较出变化的档位（推送源可直接应用增量），
+变化以增量编码追加写入每只股票一个的盘口日志，查询时回放得到价差、委比等时间序列及某一价位挂单量的变化
+"""
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from bisect import bisect_right
+from pathlib import Path
+import heapq
+import logging
+import struct
+import time
+import numpy as np
+from .config import settings
+from .order_book import OrderBook
+from .tick_feed import get_tick_feed, valid_symbol
+from .tick_flow import get_flow_engine
+
+logger = logging.getLogger(__name__)
+
+
+BID = 1
+ASK = -1
+
+# 事件头（11字节）：时间戳、变化档位数、是否为关键帧（先清空盘口再应用）
+EVENT_HEADER = struct.Struct("<qHB")
+
+# 单个档位的变化（21字节），挂单量为 0 表示该价位撤出盘口
+CHANGE_DTYPE = np.dtype([
+    ("side", "i1"),         # 1=买盘, -1=卖盘
+    ("price", "<f8"),
+    ("volume", "<f8"),
+    ("orders", "<i4")
+])
+
+MAGIC = b"ITKDEPT1"
+
+
+class DepthBook:
+    """
+    按价位维护的盘口
+    
+    买卖两侧为 {价格: (挂单量, 订单数)}。快照只包含前若干档，
+    因此快照中没有的价位视为撤出（可能只是移出了可见档位）。
+    """
+    
+    __slots__ = ("bids", "asks", "t")
+    
+    def __init__(self):
+        self.bids: Dict[float, Tuple[float, int]] = {}
+        self.asks: Dict[float, Tuple[float, int]] = {}
+        self.t = 0
+    
+    def clear(self):
+        self.bids.clear()
+        self.asks.clear()
+    
+    def apply(self, changes: np.ndarray):
+        """应用档位变化（CHANGE_DTYPE 数组）"""
+        for side, price, volume, orders in zip(
+            changes["side"].tolist(), changes["price"].tolist(),
+            changes["volume"].tolist(), changes["orders"].tolist()
+        ):
+            levels = self.bids if side == BID else self.asks
+            if volume > 0:
+                levels[price] = (volume, orders)
+            else:
+                levels.pop(price, None)
+    
+    def diff(self, book: OrderBook) -> np.ndarray:
+        """新快照相对当前盘口变化的档位"""
+        rows = []
+        for side, levels, (price, volume, orders) in (
+            (BID, self.bids, book.side("bid")),
+            (ASK, self.asks, book.side("ask"))
+        ):
+            new = dict(zip(price.tolist(), zip(volume.tolist(), orders.tolist())))
+            rows.extend((side, p, 0.0, 0) for p in levels.keys() - new.keys())
+            rows.extend((side, p, *level) for p, level in new.items() if levels.get(p) != level)
+        return np.array(rows, dtype=CHANGE_DTYPE)
+    
+    def levels(self) -> np.ndarray:
+        """当前全部档位（用于关键帧）"""
+        rows = [(BID, p, *level) for p, level in self.bids.items()]
+        rows.extend((ASK, p, *level) for p, level in self.asks.items())
+        return np.array(rows, dtype=CHANGE_DTYPE)
+    
+    def order_book(self, depth: int = 10) -> OrderBook:
+        """按档位排列的盘口（买盘从高到低，卖盘从低到高）"""
+        bids = heapq.nlargest(depth, self.bids.items())
+        asks = heapq.nsmallest(depth, self.asks.items())
+        return OrderBook(
+            np.array([p for p, _ in bids], dtype=np.float64),
+            np.array([level[0] for _, level in bids], dtype=np.float64),
+            np.array([level[1] for _, level in bids], dtype=np.int64),
+            np.array([p for p, _ in asks], dtype=np.float64),
+            np.array([level[0] for _, level in asks], dtype=np.float64),
+            np.array([level[1] for _, level in asks], dtype=np.int64)
+        )
+
+
+class DepthHistory:
+    """
+    一段盘口日志
+    
+    从关键帧开始，因此回放第一个事件即得到完整盘口。
+    各事件的档位变化连续存放在 changes 中，第 i 个事件为 changes[bounds[i]:bounds[i + 1]]。
+    """
+    
+    def __init__(self, t: np.ndarray, reset: np.ndarray, counts: np.ndarray, changes: np.ndarray):
+        self.t = t
+        self.reset = reset
+        self.bounds = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.changes = changes
+    
+    def __len__(self) -> int:
+        return len(self.t)
+    
+    def replay(self) -> Iterator[Tuple[int, DepthBook]]:
+        """依次回放事件，产出 (时间戳, 应用该事件后的盘口)；盘口对象在回放中被复用"""
+        book = DepthBook()
+        for i, t in enumerate(self.t.tolist()):
+            if self.reset[i]:
+                book.clear()
+            book.apply(self.changes[self.bounds[i]:self.bounds[i + 1]])
+            book.t = t
+            yield t, book
+    
+    def series(self, levels: int = 5) -> Dict[str, np.ndarray]:
+        """
+        每个事件之后的盘口指标
+        
+        Args:
+            levels: 计算委比的档位数
+        
+        Returns:
+            {t, best_bid, best_ask, mid, spread, spread_bps, microprice, imbalance, bid_depth, ask_depth}，
+            无法计算的值为 NaN
+        """
+        nan = float("nan")
+        rows = []
+        for t, book in self.replay():
+            bid = heapq.nlargest(levels, book.bids.items())
+            ask = heapq.nsmallest(levels, book.asks.items())
+            bid_volume = sum(level[0] for _, level in bid)
+            ask_volume = sum(level[0] for _, level in ask)
+            imbalance = (bid_volume - ask_volume) / (bid_volume + ask_volume) if bid_volume + ask_volume else nan
+            if bid and ask:
+                (best_bid, (bid_size, _)), (best_ask, (ask_size, _)) = bid[0], ask[0]
+                mid = (best_bid + best_ask) / 2
+                microprice = (best_bid * ask_size + best_ask * bid_size) / (bid_size + ask_size)
+            else:
+                best_bid = bid[0][0] if bid else nan
+                best_ask = ask[0][0] if ask else nan
+                mid = microprice = nan
+            rows.append((t, best_bid, best_ask, mid, microprice, imbalance, bid_volume, ask_volume))
+        
+        columns = list(zip(*rows)) if rows else [()] * 8
+        t = np.array(columns[0], dtype=np.int64)
+        best_bid, best_ask, mid, microprice, imbalance, bid_depth, ask_depth = (
+            np.array(column, dtype=np.float64) for column in columns[1:]
+        )
+        spread = best_ask - best_bid
+        return {
+            "t": t,
+            "best_bid": best_bid,
+            "best_ask": best_ask,
+            "mid": mid,
+            "spread": spread,
+            "spread_bps": spread / mid * 10000,
+            "microprice": microprice,
+            "imbalance": imbalance,
+            "bid_depth": bid_depth,
+            "ask_depth": ask_depth
+        }
+    
+    def level(self, side: int, price: float) -> np.ndarray:
+        """
+        某一价位在每个事件之后的挂单量（向量化，无需回放）
+        
+        Args:
+            side: BID 或 ASK
+            price: 价格
+        
+        Returns:
+            与 t 等长的挂单量，不在盘口中为 0
+        """
+        values = np.full(len(self.t), np.nan)
+        values[self.reset.astype(bool)] = 0.0
+        match = np.flatnonzero((self.changes["side"] == side) & np.isclose(self.changes["price"], price, rtol=0, atol=1e-9))
+        values[np.searchsorted(self.bounds, match, side="right") - 1] = self.changes["volume"][match]
+        
+        # 未涉及该价位的事件沿用之前的值
+        assigned = np.where(np.isnan(values), 0, np.arange(len(values)))
+        return values[np.maximum.accumulate(assigned)] if len(values) else values
+
+
+def sample_grid(t: np.ndarray, start: int, end: int, points: int = 20000) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    把事件序列采样到等间隔时间网格（每个网格点取之前最近一个事件的值）
+    
+    盘口只在变化时记录事件，按网格求平均即为按持续时间加权的平均。
+    
+    Args:
+        t: 事件时间戳（升序）
+        start: 起始时间（毫秒）
+        end: 结束时间（毫秒）
+        points: 网格点数上限（间隔不小于1秒）
+    
+    Returns:
+        (网格时间戳, 每个网格点对应的事件下标，之前没有事件时为 -1)
+    """
+    step = max(1000, (end - start) // points + 1)
+    grid = np.arange(start, end + 1, step, dtype=np.int64)
+    return grid, np.searchsorted(t, grid, side="right") - 1
+
+
+class DepthLog:
+    """
+    单只股票的盘口日志（只追加）
+    
+    文件为 8 字节标识后接若干事件，每个事件为事件头和若干档位变化。
+    打开时扫描一遍事件头建立关键帧索引，读取时间段时从之前最近的关键帧开始。
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self.last_t = 0
+        self._keyframes: List[Tuple[int, int]] = []
+        
+        path.parent.mkdir(parents=True, exist_ok=True)
+        valid = False
+        if path.is_file():
+            with open(path, "rb") as f:
+                valid = f.read(len(MAGIC)) == MAGIC
+            if not valid:
+                logger.warning(f"[DepthLog] 文件损坏，重新创建: {path}")
+        if not valid:
+            path.write_bytes(MAGIC)
+        self._scan()
+        self._file = open(path, "ab")
+    
+    def _scan(self):
+        """扫描事件头，截掉末尾不完整的事件（写入中断）"""
+        data = self.path.read_bytes()
+        offset = len(MAGIC)
+        while offset + EVENT_HEADER.size <= len(data):
+            t, count, reset = EVENT_HEADER.unpack_from(data, offset)
+            size = EVENT_HEADER.size + count * CHANGE_DTYPE.itemsize
+            if offset + size > len(data):
+                break
+            if reset:
+                self._keyframes.append((t, offset))
+            self.last_t = t
+            offset += size
+        if offset < len(data):
+            logger.warning(f"[DepthLog] 截掉不完整的事件: {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+    
+    def append(self, t: int, changes: np.ndarray, reset: bool = False):
+        """追加一个事件"""
+        if reset:
+            self._keyframes.append((t, self._file.tell()))
+        self._file.write(EVENT_HEADER.pack(t, len(changes), int(reset)) + changes.tobytes())
+        self.last_t = t
+    
+    def read(self, start: Optional[int] = None, end: Optional[int] = None) -> Optional[DepthHistory]:
+        """
+        读取时间段内的事件
+        
+        Args:
+            start: 起始时间（毫秒），实际从不晚于该时间的最近关键帧开始
+            end: 结束时间（毫秒）
+        
+        Returns:
+            DepthHistory，没有关键帧时返回 None
+        """
+        if not self._keyframes:
+            return None
+        self._file.flush()
+        
+        index = 0
+        if start is not None:
+            index = max(bisect_right(self._keyframes, (start, float("inf"))) - 1, 0)
+        offset = self._keyframes[index][1]
+        
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        
+        times, resets, counts, parts = [], [], [], []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            t, count, reset = EVENT_HEADER.unpack_from(data, offset)
+            if end is not None and t > end:
+                break
+            offset += EVENT_HEADER.size
+            parts.append(np.frombuffer(data, dtype=CHANGE_DTYPE, count=count, offset=offset))
+            offset += count * CHANGE_DTYPE.itemsize
+            times.append(t)
+            resets.append(reset)
+            counts.append(count)
+        
+        return DepthHistory(
+            np.array(times, dtype=np.int64),
+            np.array(resets, dtype=np.uint8),
+            np.array(counts, dtype=np.int64),
+            np.concatenate(parts) if parts else np.empty(0, dtype=CHANGE_DTYPE)
+        )
+    
+    def close(self):
+        self._file.close()
+
+
+class DepthEngine:
+    """
+    增量盘口引擎
+    
+    每只股票维护一个 DepthBook。常驻关注列表中的股票，快照与当前盘口比较后只把变化的档位写入日志，
+    盘口不变时不写；每 KEYFRAME_EVENTS 个事件（以及每次启动后的第一个事件）写一个完整盘口的关键帧，
+    读取任意时间段最多回放一个关键帧间隔。
+    """
+    
+    # 关键帧间隔（事件数）
+    KEYFRAME_EVENTS = 600
+    
+    def __init__(self, directory: Optional[str] = None):
+        """
+        初始化引擎
+        
+        Args:
+            directory: 盘口日志目录，为空时只维护当前盘口，不记录历史
+        """
+        self.directory = Path(directory) if directory else None
+        self._books: Dict[Tuple[str, str], DepthBook] = {}
+        self._logs: Dict[Tuple[str, str], DepthLog] = {}
+        self._since_keyframe: Dict[Tuple[str, str], int] = {}
+        self._listeners: List[Callable[[str, str, int, OrderBook], None]] = []
+    
+    def add_listener(self, listener: Callable[[str, str, int, OrderBook], None]):
+        """注册盘口更新回调 (region, code, t, 盘口)"""
+        self._listeners.append(listener)
+    
+    def path(self, region: str, code: str) -> Optional[Path]:
+        """盘口日志路径，未开启记录或代码无效时为 None"""
+        if self.directory is None or not valid_symbol(region, code):
+            return None
+        return self.directory / region.upper() / f"{code}.depth"
+    
+    def log(self, region: str, code: str, create: bool = False) -> Optional[DepthLog]:
+        """
+        获取股票的盘口日志
+        
+        Args:
+            region: 市场代码
+            code: 股票代码
+            create: 不存在时是否创建
+        """
+        key = (region.upper(), str(code))
+        log = self._logs.get(key)
+        path = self.path(*key)
+        if log is None and path is not None and (create or path.is_file()):
+            log = DepthLog(path)
+            self._logs[key] = log
+        return log
+    
+    def on_depth(self, region: str, code: str, data: Dict) -> OrderBook:
+        """
+        数据源回调：应用一次 iTick 盘口快照（无时间戳时按当前时间）
+        
+        没有任何档位的快照（如接口未返回数据）不更新盘口，直接返回该空盘口。
+        """
+        snapshot = OrderBook.from_depth(data)
+        if snapshot.empty:
+            return snapshot
+        t = int(data.get("t") or time.time() * 1000)
+        return self.apply_snapshot(region, code, t, snapshot)
+    
+    def apply_snapshot(self, region: str, code: str, t: int, snapshot: OrderBook) -> OrderBook:
+        """
+        应用一次盘口快照
+        
+        Returns:
+            更新后的盘口
+        """
+        key = (region.upper(), str(code))
+        book = self._books.setdefault(key, DepthBook())
+        if t < book.t:
+            return book.order_book()
+        return self._update(key, t, book, book.diff(snapshot))
+    
+    def apply_diff(self, region: str, code: str, t: int, changes: np.ndarray) -> OrderBook:
+        """
+        应用推送源的档位增量（CHANGE_DTYPE 数组）
+        
+        Returns:
+            更新后的盘口
+        """
+        key = (region.upper(), str(code))
+        book = self._books.setdefault(key, DepthBook())
+        if t < book.t:
+            return book.order_book()
+        return self._update(key, t, book, changes)
+    
+    def _update(self, key: Tuple[str, str], t: int, book: DepthBook, changes: np.ndarray) -> OrderBook:
+        book.apply(changes)
+        book.t = t
+        
+        # 只记录常驻关注列表（TICK_WATCHLIST 等）中的股票，工具临时查询的股票只维护当前盘口
+        log = self.log(*key, create=True) if key in get_tick_feed().symbols else None
+        if log is not None:
+            count = self._since_keyframe.get(key)
+            if count is None or count >= self.KEYFRAME_EVENTS:
+                log.append(t, book.levels(), reset=True)
+                self._since_keyframe[key] = 0
+            elif len(changes):
+                log.append(t, changes)
+                self._since_keyframe[key] = count + 1
+        
+        current = book.order_book()
+        for listener in self._listeners:
+            try:
+                listener(*key, t, current)
+            except Exception as e:
+                logger.error(f"[DepthEngine] 回调处理失败: {key[0]}.{key[1]}, error={str(e)}")
+        return current
+    
+    def book(self, region: str, code: str) -> Optional[OrderBook]:
+        """当前盘口"""
+        book = self._books.get((region.upper(), str(code)))
+        return book.order_book() if book is not None else None
+    
+    def history(self, region: str, code: str, start: Optional[int] = None, end: Optional[int] = None) -> Optional[DepthHistory]:
+        """读取盘口历史（未开启记录或没有记录时返回 None）"""
+        log = self.log(region, code)
+        return log.read(start, end) if log is not None else None
+    
+    def symbols(self) -> List[Tuple[str, str]]:
+        """有盘口日志的股票"""
+        if self.directory is None or not self.directory.is_dir():
+            return []
+        return sorted((path.parent.name, path.stem) for path in self.directory.glob("*/*.depth"))
+    
+    def close(self):
+        """关闭所有盘口日志"""
+        for log in self._logs.values():
+            log.close()
+        self._logs.clear()
+        self._since_keyframe.clear()
+
+
+def forward_quote(region: str, code: str, t: int, book: OrderBook):
+    """把最优买卖价提供给逐笔资金流向引擎（按 Lee-Ready 判断主动方向）"""
+    if book.two_sided:
+        get_flow_engine().update_quote(region, code, float(book.bid_price[0]), float(book.ask_price[0]), t)
+
+
+# 全局引擎实例
+_engine: Optional[DepthEngine] = None
+
+
+def get_depth_engine() -> DepthEngine:
+    """获取全局增量盘口引擎（开启盘口记录时订阅逐笔成交数据源的盘口轮询）"""
+    global _engine
+    if _engine is None:
+        _engine = DepthEngine(settings.depth_recorder_dir if settings.depth_recorder_enabled else None)
+        _engine.add_listener(forward_quote)
+        if settings.depth_recorder_enabled:
+            get_tick_feed().add_depth_listener(_engine.on_depth)
+    return _engine
@@ -0,0 +1,107 @@
+"""
+Downsampling - K线降采样
+把长序列压缩到指定点数并保留走势形状：收盘价序列用 LTTB（Largest-Triangle-Three-Buckets），
+蜡烛图按等条数分桶聚合 OHLC
+"""
+import numpy as np
+from .kline_frame import KlineFrame
+
+
+DOWNSAMPLE_METHODS = ("ohlc", "lttb")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """
+    LTTB 降采样，返回保留点的位置
+    
+    首尾两点固定保留，中间的点等分为 n-2 个桶，每个桶保留与
+    「上一个保留点」和「下一个桶的均值点」构成三角形面积最大的点。
+    各桶均值一次性用 reduceat 求出；桶间依赖上一个保留点，按桶循环，桶内向量化计算。
+    
+    Args:
+        x: 横坐标（如时间戳，升序）
+        y: 纵坐标（如收盘价）
+        n: 目标点数（≥3）
+    
+    Returns:
+        升序的位置数组，长度为 min(n, len(x))
+    """
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+    
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    
+    # 中间 size-2 个点分成 n-2 个桶，edges[i]:edges[i+1] 为第 i 个桶
+    edges = (np.arange(n - 1) * (size - 2) // (n - 2)) + 1
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:-1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:-1], edges[:-1] - 1) / counts
+    
+    # 每个桶的「下一个桶均值点」，最后一个桶用末点
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+    
+    out = np.empty(n, dtype=np.int64)
+    out[0] = 0
+    out[-1] = size - 1
+    selected = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[selected], y[selected]
+        area = np.abs((ax - next_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[i] - ay))
+        selected = lo + int(np.argmax(area))
+        out[i + 1] = selected
+    return out
+
+
+def ohlc_buckets(frame: KlineFrame, n: int) -> KlineFrame:
+    """
+    按等条数分桶聚合K线：开=首条开盘，高/低=桶内极值，收=末条收盘，量/额求和
+    
+    按条数而非时间分桶，休市时段不会产生空桶。
+    
+    Args:
+        frame: K线数据
+        n: 目标条数
+    
+    Returns:
+        聚合后的K线，时间戳为各桶首条K线的时间
+    """
+    size = len(frame)
+    if n >= size or n < 1:
+        return frame
+    
+    starts = np.arange(n) * size // n
+    ends = np.append(starts[1:], size) - 1
+    return KlineFrame(
+        frame.t[starts],
+        frame.o[starts],
+        np.maximum.reduceat(frame.h, starts),
+        np.minimum.reduceat(frame.l, starts),
+        frame.c[ends],
+        np.add.reduceat(frame.v, starts),
+        np.add.reduceat(frame.tu, starts)
+    )
+
+
+def downsample(frame: KlineFrame, max_points: int, method: str = "ohlc") -> KlineFrame:
+    """
+    把K线压缩到不超过 max_points 条
+    
+    Args:
+        frame: K线数据
+        max_points: 最大条数
+        method: ohlc=分桶聚合蜡烛图, lttb=按收盘价走势挑选原始K线
+    
+    Returns:
+        降采样后的K线（条数不足 max_points 时原样返回）
+    """
+    if method == "lttb":
+        if len(frame) <= max_points:
+            return frame
+        return frame.take(lttb_indices(frame.t, frame.c, max_points))
+    if method == "ohlc":
+        return ohlc_buckets(frame, max_points)
+    raise ValueError(f"不支持的降采样方法: {method}（可用: {', '.join(DOWNSAMPLE_METHODS)}）")
@@ -0,0 +1,389 @@
+"""
+Flow Aggregates - K线资金流向聚合
+按成交均价分档把K线成交额拆分到各级别资金，并对分钟K线维护增量的日内分桶聚合
+"""
+from typing import Dict, List, Optional, Tuple
+from collections import deque
+import numpy as np
+from .bar_store import SeriesKey, get_bar_store
+from .kline_frame import KlineFrame
+from .resample import bucket_labels
+from .tick_flow import LEVELS
+
+
+# 按成交均价分档的资金分布比例 (最低均价, 各级别占比)
+ORDER_SIZE_BANDS = [
+    (100, {"super_large": 0.30, "large": 0.25, "medium": 0.25, "small": 0.20}),  # 高价股
+    (50, {"super_large": 0.25, "large": 0.25, "medium": 0.30, "small": 0.20}),   # 中价股
+    (0, {"super_large": 0.20, "large": 0.25, "medium": 0.30, "small": 0.25}),    # 低价股
+]
+
+# 日内分桶周期及保留的桶数
+INTRADAY_BUCKETS = {
+    "5min": 48,     # 最近4小时
+    "30min": 16,    # 最近2个交易日左右
+    "day": 5        # 最近5个交易日
+}
+
+
+def level_ratios(avg_price: np.ndarray) -> np.ndarray:
+    """
+    按成交均价计算各级别资金占比
+    
+    Args:
+        avg_price: 每根K线的成交均价
+    
+    Returns:
+        形状为 (级别数, K线数) 的占比矩阵，行顺序同 LEVELS
+    """
+    conditions = [avg_price >= min_price for min_price, _ in ORDER_SIZE_BANDS]
+    return np.array([
+        np.select(conditions, [distribution[level] for _, distribution in ORDER_SIZE_BANDS],
+                  ORDER_SIZE_BANDS[-1][1][level])
+        for level in LEVELS
+    ], dtype=np.float64).reshape(len(LEVELS), len(avg_price))
+
+
+def split_levels(frame: KlineFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将K线成交额拆分为各级别的流入、流出
+    
+    上涨K线（收盘≥开盘）计为流入，下跌计为流出；成交量或成交额为0的K线不计入。
+    
+    Returns:
+        (流入矩阵, 流出矩阵)，形状均为 (级别数, K线数)
+    """
+    active = (frame.tu != 0) & (frame.v != 0)
+    avg_price = np.divide(frame.tu, frame.v, out=np.zeros(len(frame)), where=active)
+    amounts = level_ratios(avg_price) * np.where(active, frame.tu, 0.0)
+    is_inflow = frame.c >= frame.o
+    return amounts * is_inflow, amounts * ~is_inflow
+
+
+def flow_summary(inflow: np.ndarray, outflow: np.ndarray) -> Dict[str, object]:
+    """将各级别流入、流出向量整理为与 MoneyFlowTool.analyze_flow 相同的结构"""
+    result: Dict[str, object] = {
+        "total_inflow": float(inflow.sum()),
+        "total_outflow": float(outflow.sum())
+    }
+    for index, level in enumerate(LEVELS):
+        result[level] = (float(inflow[index]), float(outflow[index]))
+    return result
+
+
+class IntradayFlow:
+    """
+    单只股票的日内资金流向分桶
+    
+    已完结的分钟K线只累加一次；最后一根K线可能仍在变化，单独保存，查询时临时叠加。
+    """
+    
+    def __init__(self, region: str):
+        """
+        初始化分桶
+        
+        Args:
+            region: 市场代码（决定交易时段和分桶边界）
+        """
+        self.region = region
+        self.committed_t = 0
+        self._pending = KlineFrame.empty()
+        # 周期 -> [(桶起始时间UTC毫秒, 流入向量, 流出向量), ...]
+        self._buckets: Dict[str, deque] = {
+            period: deque(maxlen=size) for period, size in INTRADAY_BUCKETS.items()
+        }
+    
+    def update(self, frame: KlineFrame):
+        """
+        处理新到达的分钟K线
+        
+        Args:
+            frame: 该股票的全部分钟K线（升序），只处理上次已累加之后的部分
+        """
+        start = int(np.searchsorted(frame.t, self.committed_t, side="right"))
+        new = frame[start:]
+        if len(new) == 0:
+            return
+        
+        if len(new) > 1:
+            self._accumulate(new[:-1])
+            self.committed_t = int(new.t[-2])
+        self._pending = new[-1:]
+    
+    def _accumulate(self, bars: KlineFrame):
+        """把已完结的K线累加进各周期的桶"""
+        inflow, outflow = split_levels(bars)
+        for period, buckets in self._buckets.items():
+            labels, offsets = bucket_labels(bars.t, period, self.region)
+            starts = np.flatnonzero(np.diff(labels, prepend=labels[0] - 1))
+            bucket_in = np.add.reduceat(inflow, starts, axis=1)
+            bucket_out = np.add.reduceat(outflow, starts, axis=1)
+            
+            for i, index in enumerate(starts):
+                t = int(labels[index] - offsets[index])
+                if buckets and buckets[-1][0] == t:
+                    buckets[-1][1][:] += bucket_in[:, i]
+                    buckets[-1][2][:] += bucket_out[:, i]
+                else:
+                    buckets.append((t, bucket_in[:, i].copy(), bucket_out[:, i].copy()))
+    
+    def buckets(self, period: str) -> List[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        获取某周期的分桶（含未完结的最后一根K线）
+        
+        Args:
+            period: INTRADAY_BUCKETS 中的周期
+        
+        Returns:
+            [(桶起始时间, 各级别流入, 各级别流出), ...]，按时间升序
+        """
+        result = [(t, inflow.copy(), outflow.copy()) for t, inflow, outflow in self._buckets[period]]
+        if len(self._pending) == 0:
+            return result
+        
+        inflow, outflow = split_levels(self._pending)
+        labels, offsets = bucket_labels(self._pending.t, period, self.region)
+        t = int(labels[0] - offsets[0])
+        if result and result[-1][0] == t:
+            result[-1][1][:] += inflow[:, 0]
+            result[-1][2][:] += outflow[:, 0]
+        else:
+            result.append((t, inflow[:, 0], outflow[:, 0]))
+        return result
+    
+    def latest(self, period: str) -> Optional[Tuple[int, Dict[str, object]]]:
+        """
+        获取某周期最近一个桶的资金流向
+        
+        Returns:
+            (桶起始时间, 资金流向汇总)，无数据时返回 None
+        """
+        buckets = self.buckets(period)
+        if not buckets:
+            return None
+        t, inflow, outflow = buckets[-1]
+        return t, flow_summary(inflow, outflow)
+
+
+class IntradayFlowTracker:
+    """
+    日内资金流向跟踪器
+    
+    监听本地K线存储，个股分钟K线写入时增量更新对应股票的分桶。
+    """
+    
+    PERIOD = "1min"
+    
+    def __init__(self):
+        self._flows: Dict[Tuple[str, str], IntradayFlow] = {}
+    
+    def on_bars(self, key: SeriesKey, frame: KlineFrame, since: int = 0):
+        """K线存储写入回调"""
+        kind, region, code, period = key
+        if kind != "stock" or period != self.PERIOD:
+            return
+        
+        flow = self._flows.get((region, code))
+        if flow is None:
+            flow = self._flows[(region, code)] = IntradayFlow(region)
+        flow.update(frame)
+    
+    def get(self, region: str, code: str) -> Optional[IntradayFlow]:
+        """
+        获取股票的日内分桶
+        
+        跟踪器创建前已存入本地的K线在首次查询时补算。
+        """
+        flow = self._flows.get((region, code))
+        if flow is None:
+            frame = get_bar_store().get(("stock", region, code, self.PERIOD))
+            if frame is None:
+                return None
+            self.on_bars(("stock", region, code, self.PERIOD), frame)
+            flow = self._flows[(region, code)]
+        return flow
+
+
+# 全局跟踪器实例
+_tracker: Optional[IntradayFlowTracker] = None
+
+
+def get_intraday_tracker() -> IntradayFlowTracker:
+    """获取全局日内资金流向跟踪器（首次调用时注册到K线存储）"""
+    global _tracker
+    if _tracker is None:
+        _tracker = IntradayFlowTracker()
+        get_bar_store().add_listener(_tracker.on_bars)
+    return _tracker
+
+
+# 日线资金流向记录的字段
+FLOW_RECORD_DTYPE = np.dtype(
+    [
+        ("t", np.int64),           # 交易日时间戳（毫秒）
+        ("close", np.float64),     # 收盘价
+        ("change", np.float64),    # 涨跌幅（%，相对开盘）
+        ("turnover", np.float64),  # 成交额
+        ("net", np.float64),       # 净流入
+        ("main_net", np.float64),  # 主力净流入（超大单+大单）
+    ]
+    + [(f"{level}_{side}", np.float64) for level in LEVELS for side in ("in", "out")]
+)
+
+
+def daily_records(frame: KlineFrame) -> np.ndarray:
+    """
+    由日K线计算逐日资金流向记录
+    
+    Args:
+        frame: 日K线
+    
+    Returns:
+        FLOW_RECORD_DTYPE 结构化数组，成交量或成交额为0的交易日不产生记录
+    """
+    active = (frame.tu != 0) & (frame.v != 0)
+    inflow, outflow = split_levels(frame)
+    
+    records = np.zeros(len(frame), dtype=FLOW_RECORD_DTYPE)
+    records["t"] = frame.t
+    records["close"] = frame.c
+    with np.errstate(divide="ignore", invalid="ignore"):
+        records["change"] = np.where(frame.o != 0, (frame.c - frame.o) / frame.o * 100, 0.0)
+    records["turnover"] = inflow.sum(axis=0) + outflow.sum(axis=0)
+    records["net"] = inflow.sum(axis=0) - outflow.sum(axis=0)
+    records["main_net"] = inflow[:2].sum(axis=0) - outflow[:2].sum(axis=0)
+    for index, level in enumerate(LEVELS):
+        records[f"{level}_in"] = inflow[index]
+        records[f"{level}_out"] = outflow[index]
+    return records[active]
+
+
+def summarize_records(records: np.ndarray) -> Dict[str, object]:
+    """
+    汇总一段逐日资金流向记录
+    
+    Returns:
+        与 MoneyFlowTool.analyze_flow 相同结构的结果（含 daily 明细）
+    """
+    inflow = np.array([records[f"{level}_in"].sum() for level in LEVELS])
+    outflow = np.array([records[f"{level}_out"].sum() for level in LEVELS])
+    result = flow_summary(inflow, outflow)
+    result["daily"] = [
+        {
+            "date": t,
+            "trend": "📈" if change >= 0 else "📉",
+            "change": change,
+            "turnover": turnover,
+            "main_flow": main
+        }
+        for t, change, turnover, main in zip(
+            records["t"].tolist(), records["change"].tolist(),
+            records["turnover"].tolist(), records["main_net"].tolist()
+        )
+    ]
+    return result
+
+
+class FlowHistory:
+    """
+    逐日资金流向记录
+    
+    监听本地K线存储，个股日K线写入时只重算本次写入之后的交易日，
+    结果与K线一同持久化（附属文件 day.flow.npz），长区间查询只需按时间范围截取。
+    """
+    
+    PERIOD = "day"
+    
+    def __init__(self):
+        self._records: Dict[SeriesKey, np.ndarray] = {}
+    
+    def _load(self, key: SeriesKey) -> np.ndarray:
+        """
+        获取序列的记录：内存 → 持久化文件 → 由本地K线重算
+        
+        本实例注册之前写入的K线（如重启后其他工具先获取了日K线）不会触发回调，
+        因此持久化的记录没有覆盖到本地K线的首尾时，重算缺少的部分并写回。
+        """
+        records = self._records.get(key)
+        if records is not None:
+            return records
+        
+        store = get_bar_store()
+        frame = store.get(key)
+        data = store.load_arrays(key, "flow")
+        if data is not None and data["records"].dtype == FLOW_RECORD_DTYPE:
+            records = data["records"]
+        else:
+            records = None
+        
+        if frame is None or len(frame) == 0:
+            records = records if records is not None else np.zeros(0, dtype=FLOW_RECORD_DTYPE)
+        elif records is None or len(records) == 0 or frame.t[0] < records["t"][0]:
+            records = daily_records(frame)
+            store.save_arrays(key, "flow", {"records": records})
+        elif frame.t[-1] > records["t"][-1]:
+            # 最后一条记录所在交易日可能在记录之后又有更新，一并重算
+            since = int(records["t"][-1])
+            records = np.concatenate([
+                records[records["t"] < since],
+                daily_records(frame.between(since, None))
+            ])
+            store.save_arrays(key, "flow", {"records": records})
+        
+        self._records[key] = records
+        return records
+    
+    def on_bars(self, key: SeriesKey, frame: KlineFrame, since: int):
+        """K线存储写入回调"""
+        kind, _, _, period = key
+        if kind != "stock" or period != self.PERIOD:
+            return
+        
+        existing = self._load(key)
+        records = np.concatenate([
+            existing[existing["t"] < since],
+            daily_records(frame.between(since, None))
+        ])
+        self._records[key] = records
+        get_bar_store().save_arrays(key, "flow", {"records": records})
+    
+    def query(
+        self,
+        region: str,
+        code: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        按时间范围截取逐日记录
+        
+        Args:
+            region: 市场代码
+            code: 股票代码
+            start: 起始时间（毫秒）
+            end: 结束时间（毫秒）
+            limit: 返回最近的条数
+        
+        Returns:
+            FLOW_RECORD_DTYPE 结构化数组（按时间升序）
+        """
+        records = self._load(("stock", region, code, self.PERIOD))
+        t = records["t"]
+        lo = 0 if start is None else int(np.searchsorted(t, start, side="left"))
+        hi = len(records) if end is None else int(np.searchsorted(t, end, side="right"))
+        records = records[lo:hi]
+        return records[-limit:] if limit else records
+
+
+# 全局记录实例
+_history: Optional[FlowHistory] = None
+
+
+def get_flow_history() -> FlowHistory:
+    """获取全局逐日资金流向记录（首次调用时注册到K线存储）"""
+    global _history
+    if _history is None:
+        _history = FlowHistory()
+        get_bar_store().add_listener(_history.on_bars)
+    return _history
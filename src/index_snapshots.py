@@ -0,0 +1,196 @@
+"""
+Index Snapshots - 指数行情快照
+后台按交易时段刷新常用指数的行情和日K线：交易时段内按固定间隔刷新，收盘后刷新一次，
+休市期间不请求。指数分析工具优先使用快照，上游请求量固定且可预期。
+"""
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import time
+import pytz
+from .config import settings
+from .itick_client import get_client, ItickAPIError
+from .kline_frame import KlineFrame
+from .resample import index_region, market_session
+
+logger = logging.getLogger(__name__)
+
+
+class IndexSnapshot(NamedTuple):
+    """指数快照"""
+    code: str
+    quote: Dict
+    frame: KlineFrame      # 日K线
+    fetched_at: float      # 刷新时间（Unix 秒）
+
+
+def market_state(region: str, now: float) -> Tuple[bool, float]:
+    """
+    计算市场的交易状态（按周一至周五判断，不含节假日）
+    
+    Args:
+        region: 市场代码
+        now: 当前时间（Unix 秒）
+    
+    Returns:
+        (是否在当日开盘到收盘之间（含午休）, 最近一次收盘时间（Unix 秒）)
+    """
+    tz_name, sessions = market_session(region)
+    tz = pytz.timezone(tz_name)
+    local = datetime.fromtimestamp(now, tz)
+    minute = local.hour * 60 + local.minute
+    open_minute, close_minute = sessions[0][0], sessions[-1][1]
+    
+    trading_day = local.weekday() < 5
+    in_session = trading_day and open_minute <= minute < close_minute
+    
+    # 最近一次收盘：今天已收盘则为今天，否则向前找最近的工作日
+    day = local.date()
+    if not trading_day or minute < close_minute:
+        day -= timedelta(days=1)
+        while day.weekday() >= 5:
+            day -= timedelta(days=1)
+    close = tz.localize(datetime(day.year, day.month, day.day) + timedelta(minutes=close_minute))
+    return in_session, close.timestamp()
+
+
+def session_state(code: str, now: float) -> Tuple[bool, float]:
+    """计算指数所在市场的交易状态，见 market_state"""
+    return market_state(index_region(code), now)
+
+
+class SnapshotScheduler:
+    """
+    指数快照调度器
+    
+    - 交易时段内（含午休）每 interval 秒刷新一次
+    - 收盘后刷新一次，直到下一个交易时段不再请求
+    - 刷新失败时等待一个 interval 后重试
+    
+    子类覆盖 session 和 fetch 即可调度其他快照。
+    """
+    
+    def __init__(self, codes: List[str], interval: int = 60, days: int = 250, tick: float = 5.0):
+        """
+        初始化调度器
+        
+        Args:
+            codes: 指数代码列表
+            interval: 交易时段内的刷新间隔（秒）
+            days: 快照保留的日K线条数
+            tick: 检查是否需要刷新的间隔（秒）
+        """
+        self.codes = list(dict.fromkeys(codes))
+        self.interval = interval
+        self.days = days
+        self.tick = tick
+        self._snapshots: Dict[str, IndexSnapshot] = {}
+        self._attempted: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._api_key: Optional[str] = None
+    
+    def session(self, code: str, now: float) -> Tuple[bool, float]:
+        """快照所属市场的交易状态，见 market_state"""
+        return session_state(code, now)
+    
+    def is_fresh(self, code: str, snapshot, now: float) -> bool:
+        """快照是否仍可直接使用"""
+        in_session, last_close = self.session(code, now)
+        if in_session:
+            return now - snapshot.fetched_at < self.interval * 2
+        return snapshot.fetched_at >= last_close
+    
+    def is_due(self, code: str, now: float) -> bool:
+        """指数是否需要刷新"""
+        if now - self._attempted.get(code, 0) < self.interval:
+            return False
+        snapshot = self._snapshots.get(code)
+        if snapshot is None:
+            return True
+        in_session, last_close = self.session(code, now)
+        if in_session:
+            return now - snapshot.fetched_at >= self.interval
+        return snapshot.fetched_at < last_close
+    
+    def get(self, code: str) -> Optional[IndexSnapshot]:
+        """获取仍新鲜的快照，调度器未运行或快照过期时返回 None"""
+        if not self.running:
+            return None
+        snapshot = self._snapshots.get(str(code))
+        if snapshot is None or not self.is_fresh(str(code), snapshot, time.time()):
+            return None
+        return snapshot
+    
+    async def fetch(self, code: str, client) -> Optional[IndexSnapshot]:
+        """获取单个指数的行情和日K线，行情为空时返回 None"""
+        quote, frame = await asyncio.gather(
+            client.get_index_quote(code=code, region="GB"),
+            client.get_index_kline_frame(code=code, region="GB", period="day", limit=self.days),
+            return_exceptions=True
+        )
+        
+        for result in (quote, frame):
+            if isinstance(result, Exception):
+                raise result
+        if not quote:
+            return None
+        return IndexSnapshot(code, quote, frame, time.time())
+    
+    async def refresh(self, code: str):
+        """刷新单个快照"""
+        self._attempted[code] = time.time()
+        try:
+            snapshot = await self.fetch(code, get_client(self._api_key))
+        except Exception as e:
+            message = e.message if isinstance(e, ItickAPIError) else str(e)
+            logger.warning(f"[{type(self).__name__}] 刷新失败: {code}, error={message}")
+            return
+        
+        if snapshot is None:
+            logger.warning(f"[{type(self).__name__}] 数据为空: {code}")
+            return
+        self._snapshots[code] = snapshot
+    
+    async def _run(self):
+        """调度循环"""
+        while True:
+            now = time.time()
+            due = [code for code in self.codes if self.is_due(code, now)]
+            if due:
+                await asyncio.gather(*[self.refresh(code) for code in due], return_exceptions=True)
+            await asyncio.sleep(self.tick)
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def start(self, api_key: Optional[str] = None):
+        """启动后台刷新（已运行时忽略）"""
+        if api_key:
+            self._api_key = api_key
+        if not self.running and self.codes:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        """停止后台刷新"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# 全局调度器实例
+_scheduler: Optional[SnapshotScheduler] = None
+
+
+def get_snapshot_scheduler() -> SnapshotScheduler:
+    """获取全局指数快照调度器"""
+    global _scheduler
+    if _scheduler is None:
+        codes = [code.strip() for code in settings.index_snapshot_codes.split(",") if code.strip()]
+        _scheduler = SnapshotScheduler(codes, settings.index_snapshot_interval, settings.index_snapshot_days)
+    return _scheduler
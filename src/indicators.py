@@ -0,0 +1,277 @@
+"""
+Vectorized Indicators - 向量化技术指标计算
+基于 NumPy 的二维指标内核，输入为 (股票数 × K线数) 矩阵，一次计算所有股票
+"""
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def align_by_time(
+    times: Sequence[np.ndarray],
+    values: Sequence[np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按时间戳对齐多只股票的序列
+    
+    Args:
+        times: 每只股票的时间戳数组（升序）
+        values: 每只股票对应的数值数组
+    
+    Returns:
+        (合并后的时间戳, 对齐后的二维矩阵)，缺失值向前填充，
+        上市前等无数据的位置为 NaN
+    """
+    if not times:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0))
+    
+    timeline = np.unique(np.concatenate([np.asarray(t, dtype=np.int64) for t in times]))
+    matrix = np.full((len(times), len(timeline)), np.nan)
+    
+    for row, (t, v) in enumerate(zip(times, values)):
+        if len(t):
+            matrix[row, np.searchsorted(timeline, t)] = v
+    
+    return timeline, ffill(matrix)
+
+
+def align_right(values: Sequence[np.ndarray], length: Optional[int] = None) -> np.ndarray:
+    """
+    按K线序号右对齐多只股票的序列（不按时间戳合并）
+    
+    各股票只使用自身的K线，最新一根位于最后一列；交易日历不同或数据较短时，
+    前端用 NaN 补齐，不会插入向前填充的虚拟K线。
+    
+    Args:
+        values: 每只股票的数值数组（按时间升序）
+        length: 矩阵列数，默认为最长序列的长度；更短时只保留各序列最近 length 个值
+    
+    Returns:
+        (股票数 × length) 矩阵
+    """
+    if length is None:
+        length = max((len(v) for v in values), default=0)
+    matrix = np.full((len(values), length), np.nan)
+    for row, v in enumerate(values):
+        count = min(len(v), length)
+        if count:
+            matrix[row, length - count:] = np.asarray(v, dtype=np.float64)[-count:]
+    return matrix
+
+
+def ffill(matrix: np.ndarray) -> np.ndarray:
+    """沿时间轴（axis=1）向前填充 NaN"""
+    valid = ~np.isnan(matrix)
+    index = np.where(valid, np.arange(matrix.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    filled = matrix[np.arange(matrix.shape[0])[:, None], index]
+    # 首个有效值之前仍保持 NaN
+    filled[~np.maximum.accumulate(valid, axis=1)] = np.nan
+    return filled
+
+
+def sma(matrix: np.ndarray, period: int) -> np.ndarray:
+    """简单移动平均，窗口内存在 NaN 时结果为 NaN"""
+    out = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] >= period:
+        out[:, period - 1:] = sliding_window_view(matrix, period, axis=1).mean(axis=-1)
+    return out
+
+
+def rolling_std(matrix: np.ndarray, period: int) -> np.ndarray:
+    """滚动总体标准差"""
+    out = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] >= period:
+        out[:, period - 1:] = sliding_window_view(matrix, period, axis=1).std(axis=-1)
+    return out
+
+
+def ema(matrix: np.ndarray, period: int, block: int = 64) -> np.ndarray:
+    """
+    指数移动平均
+    
+    与 TechnicalIndicatorsTool.calculate_ema 一致，以首个有效值为初值。
+    """
+    return ewm(matrix, 2 / (period + 1), block)
+
+
+def ewm(matrix: np.ndarray, alpha: float, block: int = 64) -> np.ndarray:
+    """
+    指数加权平均：out[i] = α·x[i] + (1-α)·out[i-1]，以首个有效值为初值
+    
+    按 block 列分块，块内递推展开为下三角权重矩阵的矩阵乘法，
+    Python 层循环只有 K线数/block 次，且矩阵乘法期间释放 GIL。
+    中间的缺失值应事先向前填充（见 ffill）。
+    """
+    rows, cols = matrix.shape
+    if cols == 0:
+        return np.empty(matrix.shape)
+    
+    # 首个有效值之前用该值回填：常数序列的EMA不变，等价于从首个有效值开始递推
+    valid = ~np.isnan(matrix)
+    first = np.where(valid.any(axis=1), valid.argmax(axis=1), 0)
+    seed = matrix[np.arange(rows), first]
+    x = np.where(np.arange(cols) < first[:, None], seed[:, None], matrix)
+    
+    # 块内权重: out[i] = Σ_{j≤i} α(1-α)^(i-j) x[j] + (1-α)^(i+1) prev
+    size = min(block, cols)
+    lag = np.arange(size)[:, None] - np.arange(size)[None, :]
+    weights = np.where(lag >= 0, alpha * (1 - alpha) ** np.clip(lag, 0, None), 0.0)
+    decay = (1 - alpha) ** np.arange(1, size + 1)
+    
+    out = np.empty(matrix.shape)
+    prev = seed
+    for start in range(0, cols, size):
+        chunk = x[:, start:start + size]
+        n = chunk.shape[1]
+        out[:, start:start + n] = chunk @ weights[:n, :n].T + prev[:, None] * decay[None, :n]
+        prev = out[:, start + n - 1]
+    
+    out[np.arange(cols) < first[:, None]] = np.nan
+    return out
+
+
+def macd(matrix: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> Dict[str, np.ndarray]:
+    """MACD：返回 DIF、DEA 和 MACD 柱"""
+    dif = ema(matrix, fast) - ema(matrix, slow)
+    dea = ema(dif, signal)
+    return {"dif": dif, "dea": dea, "macd": (dif - dea) * 2}
+
+
+def rsi(matrix: np.ndarray, period: int = 14) -> np.ndarray:
+    """RSI：与单股工具一致，取最近 period 期涨跌幅的简单平均"""
+    out = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] <= period:
+        return out
+    
+    change = np.diff(matrix, axis=1)
+    avg_gain = sma(np.clip(change, 0, None), period)
+    avg_loss = sma(np.clip(-change, 0, None), period)
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = 100 - 100 / (1 + avg_gain / avg_loss)
+    value = np.where(avg_loss == 0, 100.0, value)
+    value[np.isnan(avg_gain) | np.isnan(avg_loss)] = np.nan
+    
+    out[:, 1:] = value
+    return out
+
+
+def kdj(highs: np.ndarray, lows: np.ndarray, closes: np.ndarray, n: int = 9) -> Dict[str, np.ndarray]:
+    """
+    KDJ：与单股工具的简化算法一致（K=D=RSV）
+    """
+    rsv = np.full(closes.shape, np.nan)
+    if closes.shape[1] >= n:
+        highest = sliding_window_view(highs, n, axis=1).max(axis=-1)
+        lowest = sliding_window_view(lows, n, axis=1).min(axis=-1)
+        span = highest - lowest
+        with np.errstate(divide="ignore", invalid="ignore"):
+            value = (closes[:, n - 1:] - lowest) / span * 100
+        rsv[:, n - 1:] = np.where(span == 0, 50.0, value)
+    
+    return {"k": rsv, "d": rsv, "j": 3 * rsv - 2 * rsv}
+
+
+def boll(matrix: np.ndarray, period: int = 20, std_dev: float = 2.0) -> Dict[str, np.ndarray]:
+    """布林带：中轨为 N 期均线，上下轨为中轨 ± std_dev 倍标准差"""
+    middle = sma(matrix, period)
+    std = rolling_std(matrix, period)
+    return {
+        "upper": middle + std_dev * std,
+        "middle": middle,
+        "lower": middle - std_dev * std
+    }
+
+
+def latest(matrix: np.ndarray) -> np.ndarray:
+    """取每行最新一个值"""
+    if matrix.shape[1] == 0:
+        return np.full(matrix.shape[0], np.nan)
+    return matrix[:, -1]
+
+
+
+def aligned_returns(
+    times: Sequence[np.ndarray],
+    closes: Sequence[np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    按时间戳对齐收盘价并计算对数收益率
+    
+    各市场交易日不同：某序列当天无K线时不计收益率，
+    下一个有K线的交易日的收益率覆盖整个缺口。
+    
+    Args:
+        times: 每个序列的时间戳数组（升序）
+        closes: 每个序列的收盘价
+    
+    Returns:
+        (时间轴, 向前填充的收盘价矩阵, 收益率矩阵（无效处为0）, 收益率有效掩码)
+    """
+    timeline, filled = align_by_time(times, closes)
+    observed = np.zeros(filled.shape, dtype=bool)
+    for row, t in enumerate(times):
+        observed[row, np.searchsorted(timeline, t)] = True
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(np.log(filled), axis=1)
+    mask = observed[:, 1:] & np.isfinite(returns)
+    return timeline, filled, np.where(mask, returns, 0.0), mask
+
+
+def pairwise_corr_beta(returns: np.ndarray, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    两两相关系数和 Beta（只使用双方都有效的收益率）
+    
+    通过掩码矩阵乘法一次得到所有序列对的共同样本数、和与平方和，
+    没有 Python 层的两两循环。
+    
+    Args:
+        returns: 收益率矩阵（序列数 × 期数），无效处为0
+        mask: 有效掩码
+    
+    Returns:
+        (相关系数矩阵, Beta矩阵)，beta[i, j] 为序列 i 相对序列 j 的 Beta；
+        共同样本少于3期时为 NaN
+    """
+    m = mask.astype(np.float64)
+    x = returns * m
+    
+    n = m @ m.T             # 共同样本数
+    sx = x @ m.T            # sx[i, j]: 序列 i 在共同样本上的和
+    sxx = (x * x) @ m.T     # 序列 i 在共同样本上的平方和
+    sxy = x @ x.T           # 共同样本上的乘积和
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = (sxy - sx * sx.T / n) / (n - 1)
+        var = (sxx - sx * sx / n) / (n - 1)
+        corr = cov / np.sqrt(var * var.T)
+        beta = cov / var.T
+    
+    invalid = n < 3
+    corr[invalid] = np.nan
+    beta[invalid] = np.nan
+    return np.clip(corr, -1.0, 1.0), beta
+
+
+def relative_strength(filled: np.ndarray, benchmark: int, window: int) -> np.ndarray:
+    """
+    滚动相对强弱：各序列与基准价格比值在 window 期内的变化（%）
+    
+    Args:
+        filled: 向前填充的收盘价矩阵
+        benchmark: 基准序列所在行
+        window: 滚动窗口期数
+    
+    Returns:
+        与 filled 同形状的矩阵，前 window 期为 NaN；>0 表示跑赢基准
+    """
+    out = np.full(filled.shape, np.nan)
+    if filled.shape[1] <= window:
+        return out
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = filled / filled[benchmark]
+        out[:, window:] = (ratio[:, window:] / ratio[:, :-window] - 1) * 100
+    return out
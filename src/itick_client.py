@@ -2,9 +2,100 @@
 iTick API Client
 封装 iTick API 调用，提供统一的接口和错误处理
 """
+import asyncio
+import time
+from collections import OrderedDict
 import httpx
-from typing import Dict, Any, Optional, List
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Set, Tuple
+import pytz
 from .config import settings
+from .kline_frame import KlineFrame
+from .bar_store import BarStore, get_bar_store
+from .resample import resample, market_session, index_region, INTRADAY_MINUTES
+
+
+# 周期到 kType 的映射 (基于测试结果)
+PERIOD_TO_KTYPE = {
+    "1min": 1,
+    "5min": 5,
+    "60min": 8,
+    "day": 2,
+    "week": 3,
+    "month": 4
+}
+
+# iTick 未直接提供、由细周期在本地合成的周期 -> 源周期
+LOCAL_PERIODS = {
+    "15min": "5min",
+    "30min": "5min"
+}
+
+# iTick K线接口的默认/最大返回条数
+DEFAULT_KLINE_LIMIT = 100
+MAX_KLINE_LIMIT = 1000
+
+# 分段请求时每段预计K线数占上限的比例（留出余量，避免单段被截断）
+CHUNK_FILL = 0.8
+
+# 非分钟级周期每个自然日的K线数（按自然日估计，偏保守）
+BARS_PER_DAY = {
+    "day": 1.0,
+    "week": 1 / 7,
+    "month": 1 / 28
+}
+
+
+def date_range_ms(
+    start_date: Optional[str],
+    end_date: Optional[str],
+    region: str
+) -> Tuple[Optional[int], Optional[int]]:
+    """
+    将 YYYYMMDD 日期转换为市场当地时间的毫秒区间
+
+    Returns:
+        (起始日零点, 结束日末尾)，未提供的一端为 None
+    """
+    tz = pytz.timezone(market_session(region)[0])
+    
+    def to_ms(date_str: str, days: int = 0) -> int:
+        day = datetime.strptime(date_str, "%Y%m%d") + timedelta(days=days)
+        return int(tz.localize(day).timestamp() * 1000)
+    
+    start = to_ms(start_date) if start_date else None
+    end = to_ms(end_date, 1) - 1 if end_date else None
+    return start, end
+
+
+def chunk_dates(start_date: str, end_date: str, period: str, region: str) -> List[Tuple[str, str]]:
+    """
+    将日期区间切分为单次请求不会超过 MAX_KLINE_LIMIT 条K线的若干段
+
+    Args:
+        start_date: 起始日期 (YYYYMMDD)
+        end_date: 结束日期 (YYYYMMDD)
+        period: 请求 iTick 的周期
+        region: 用于确定交易时长的市场代码
+
+    Returns:
+        [(段起始日期, 段结束日期), ...]，按时间顺序
+    """
+    if period in INTRADAY_MINUTES:
+        minutes = sum(end - start for start, end in market_session(region)[1])
+        per_day = minutes / INTRADAY_MINUTES[period]
+    else:
+        per_day = BARS_PER_DAY.get(period, 1.0)
+    span = max(1, int(MAX_KLINE_LIMIT * CHUNK_FILL / per_day))
+    
+    day = datetime.strptime(start_date, "%Y%m%d")
+    last = datetime.strptime(end_date, "%Y%m%d")
+    chunks = []
+    while day <= last:
+        chunk_end = min(day + timedelta(days=span - 1), last)
+        chunks.append((day.strftime("%Y%m%d"), chunk_end.strftime("%Y%m%d")))
+        day = chunk_end + timedelta(days=1)
+    return chunks
 
 
 class ItickAPIError(Exception):
@@ -15,9 +106,61 @@ class ItickAPIError(Exception):
         super().__init__(f"[{code}] {message}")
 
 
+class RateLimiter:
+    """
+    异步请求限流器
+    
+    令牌桶控制每秒请求数，信号量控制同时在途的请求数。
+    同一客户端的所有请求共享一个限流器，并发抓取时也不会超出配额。
+    """
+    
+    def __init__(self, rate: float, max_concurrency: int):
+        """
+        初始化限流器
+        
+        Args:
+            rate: 每秒最大请求数，<=0 表示不限速
+            max_concurrency: 最大并发请求数
+        """
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    
+    async def _take_token(self):
+        """等待并取出一个令牌"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+    
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        if self.rate > 0:
+            try:
+                await self._take_token()
+            except BaseException:
+                self._semaphore.release()
+                raise
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+
+
 class ItickClient:
     """iTick API 客户端"""
     
+    # 单次请求超时（秒）
+    TIMEOUT = 30.0
+    
     # 错误码映射
     ERROR_MESSAGES = {
         "E001": "目标产品不存在，请检查股票代码是否正确",
@@ -34,7 +177,8 @@ class ItickClient:
         """
         self.api_key = api_key or settings.itick_api_key
         self.base_url = settings.itick_api_base_url
-        self.client = httpx.AsyncClient(timeout=30.0)
+        self.client = httpx.AsyncClient(timeout=self.TIMEOUT)
+        self.limiter = RateLimiter(settings.itick_rate_limit, settings.itick_max_concurrency)
     
     async def _request(
         self, 
@@ -69,12 +213,13 @@ class ItickClient:
             request_headers.update(headers)
         
         try:
-            response = await self.client.request(
-                method=method,
-                url=url,
-                params=params,
-                headers=request_headers
-            )
+            async with self.limiter:
+                response = await self.client.request(
+                    method=method,
+                    url=url,
+                    params=params,
+                    headers=request_headers
+                )
             response.raise_for_status()
             
             data = response.json()
@@ -135,17 +280,7 @@ class ItickClient:
         Returns:
             K线数据列表
         """
-        # 周期到 kType 的映射 (基于测试结果)
-        period_to_ktype = {
-            "1min": 1,
-            "5min": 5,
-            "60min": 8,
-            "day": 2,
-            "week": 3,
-            "month": 4
-        }
-        
-        ktype = period_to_ktype.get(period, 2)  # 默认日线
+        ktype = PERIOD_TO_KTYPE.get(period, 2)  # 默认日线
         
         params = {
             "region": region,
@@ -167,6 +302,32 @@ class ItickClient:
             return result.get("data", [])
         return []
     
+    async def get_stock_kline_frame(
+        self,
+        region: str,
+        code: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        period: str = "day",
+        limit: Optional[int] = None,
+        cache: bool = True
+    ) -> KlineFrame:
+        """
+        获取股票K线数据（列式）
+        
+        参数同 get_stock_kline，另支持本地合成的 15min/30min 周期。
+        本地K线存储已完整覆盖请求时直接返回（同周期或由更细周期合成），
+        否则请求 iTick 并写入存储。
+        
+        Args:
+            cache: 是否把请求到的K线写入本地存储；一次性扫描大量股票时传 False，
+                仍会使用本地已有的数据
+        
+        Returns:
+            经过校验和缺失值处理的 KlineFrame
+        """
+        return await self._get_kline_frame("stock", region, code, start_date, end_date, period, limit, cache)
+    
     async def get_stock_tick(self, region: str, code: str) -> Dict[str, Any]:
         """
         获取股票Tick数据
@@ -253,17 +414,7 @@ class ItickClient:
         Returns:
             K线数据列表
         """
-        # 周期到 kType 的映射
-        period_to_ktype = {
-            "1min": 1,
-            "5min": 5,
-            "60min": 8,
-            "day": 2,
-            "week": 3,
-            "month": 4
-        }
-        
-        ktype = period_to_ktype.get(period, 2)
+        ktype = PERIOD_TO_KTYPE.get(period, 2)
         
         params = {
             "region": region,
@@ -285,18 +436,213 @@ class ItickClient:
             return result.get("data", [])
         return []
     
+    async def get_index_kline_frame(
+        self,
+        code: str,
+        region: str = "GB",
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        period: str = "day",
+        limit: Optional[int] = None
+    ) -> KlineFrame:
+        """
+        获取指数K线数据（列式）
+        
+        参数同 get_index_kline，本地存储的使用方式同 get_stock_kline_frame
+        
+        Returns:
+            经过校验和缺失值处理的 KlineFrame
+        """
+        return await self._get_kline_frame("index", region, code, start_date, end_date, period, limit)
+    
+    async def _get_kline_frame(
+        self,
+        kind: str,
+        region: str,
+        code: str,
+        start_date: Optional[str],
+        end_date: Optional[str],
+        period: str,
+        limit: Optional[int],
+        cache: bool = True
+    ) -> KlineFrame:
+        """
+        获取K线：优先本地存储，其次请求 iTick
+        
+        Args:
+            kind: stock 或 index
+            cache: 是否把请求到的K线写入本地存储
+            其余参数同 get_stock_kline
+        """
+        session_region = region if kind == "stock" else index_region(code)
+        start, end = date_range_ms(start_date, end_date, session_region)
+        
+        store = get_bar_store()
+        cached = store.query(kind, region, code, period, session_region, start, end, limit)
+        if cached is not None:
+            return cached
+        
+        # 本地合成的周期需要按倍数请求源周期K线
+        fetch_period = LOCAL_PERIODS.get(period, period)
+        fetch_limit = limit
+        if fetch_period != period and limit:
+            ratio = INTRADAY_MINUTES[period] // INTRADAY_MINUTES[fetch_period]
+            fetch_limit = min(limit * ratio, MAX_KLINE_LIMIT)
+        
+        key = (kind, region, code, fetch_period)
+        if start_date and end_date and (not limit or limit > MAX_KLINE_LIMIT):
+            # 完整日期区间：按段并发请求，每段落地即写入存储
+            frame = await self._fetch_range(store, key, start_date, end_date, session_region, cache)
+        else:
+            records = await self._fetch_records(key, start_date, end_date, fetch_limit)
+            frame = KlineFrame.from_records(records)
+            if cache:
+                self._store_fetched(store, key, frame, start, end, fetch_limit)
+        
+        if fetch_period == period:
+            return frame
+        
+        cached = store.query(kind, region, code, period, session_region, start, end, limit)
+        if cached is not None:
+            return cached
+        bars = resample(frame, period, session_region)
+        return bars.tail(limit) if limit else bars
+    
+    async def _fetch_records(
+        self,
+        key: Tuple[str, str, str, str],
+        start_date: Optional[str],
+        end_date: Optional[str],
+        limit: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        """按序列键请求一次 iTick K线"""
+        kind, region, code, period = key
+        if kind == "stock":
+            return await self.get_stock_kline(region, code, start_date, end_date, period, limit)
+        return await self.get_index_kline(code, region, start_date, end_date, period, limit)
+    
+    async def _fetch_chunk(
+        self,
+        store: BarStore,
+        key: Tuple[str, str, str, str],
+        start_date: str,
+        end_date: str,
+        session_region: str,
+        cache: bool = True
+    ) -> KlineFrame:
+        """
+        请求一段日期区间并写入存储（cache 为 False 时不写入）；返回条数达到上限（被截断）时对半拆分重新请求
+        """
+        records = await self._fetch_records(key, start_date, end_date, MAX_KLINE_LIMIT)
+        frame = KlineFrame.from_records(records)
+        
+        first = datetime.strptime(start_date, "%Y%m%d")
+        days = (datetime.strptime(end_date, "%Y%m%d") - first).days + 1
+        if len(frame) >= MAX_KLINE_LIMIT and days > 1:
+            middle = first + timedelta(days=days // 2)
+            halves = await asyncio.gather(
+                self._fetch_chunk(store, key, start_date, (middle - timedelta(days=1)).strftime("%Y%m%d"), session_region, cache),
+                self._fetch_chunk(store, key, middle.strftime("%Y%m%d"), end_date, session_region, cache)
+            )
+            return halves[0].merge(halves[1])
+        
+        if cache:
+            start, end = date_range_ms(start_date, end_date, session_region)
+            self._store_fetched(store, key, frame, start, end, MAX_KLINE_LIMIT)
+        return frame
+    
+    async def _fetch_range(
+        self,
+        store: BarStore,
+        key: Tuple[str, str, str, str],
+        start_date: str,
+        end_date: str,
+        session_region: str,
+        cache: bool = True
+    ) -> KlineFrame:
+        """
+        分段并发获取日期区间内的全部K线
+        
+        各段受客户端限流器约束并发请求，每段完成即写入本地存储，中途失败时
+        已获取的部分不会丢失；本地覆盖区间已包含的历史段直接跳过。
+        
+        Returns:
+            按时间戳去重合并后的K线
+        """
+        now = int(time.time() * 1000)
+        
+        chunks = []
+        skipped = False
+        for chunk in chunk_dates(start_date, end_date, key[3], session_region):
+            start, end = date_range_ms(chunk[0], chunk[1], session_region)
+            if end <= now and store.covers(key, start, end):
+                skipped = True
+                continue
+            chunks.append(chunk)
+        
+        results = await asyncio.gather(*[
+            self._fetch_chunk(store, key, chunk_start, chunk_end, session_region, cache)
+            for chunk_start, chunk_end in chunks
+        ], return_exceptions=True)
+        
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        
+        # 跳过的段取自本地存储；不直接返回存储内容，因为存储有条数上限
+        start, end = date_range_ms(start_date, end_date, session_region)
+        parts = [store.get(key).between(start, end)] if skipped else []
+        return KlineFrame.combine(parts + list(results)).between(start, end)
+    
+    @staticmethod
+    def _store_fetched(
+        store: BarStore,
+        key: Tuple[str, str, str, str],
+        frame: KlineFrame,
+        start: Optional[int],
+        end: Optional[int],
+        limit: Optional[int]
+    ):
+        """
+        将 iTick 返回的K线写入本地存储，并推算其完整覆盖区间
+        
+        返回条数达到 limit 时说明被截断，只能确认返回的这段K线是完整的；
+        未截断时覆盖整个请求区间（未指定起始日期即为全部历史）。
+        """
+        now = int(time.time() * 1000)
+        request_end = now if end is None else min(end, now)
+        truncated = len(frame) >= (limit or DEFAULT_KLINE_LIMIT)
+        
+        if truncated:
+            # 按最近 limit 条理解；同时指定起始日期时无法确定截断方向，只认返回的区间
+            cov_start = int(frame.t[0])
+            cov_end = int(frame.t[-1]) if start is not None else request_end
+        elif start is not None:
+            cov_start, cov_end = start, request_end
+        elif len(frame) > 0:
+            cov_start, cov_end = 0, request_end
+        else:
+            return
+        
+        store.put(key, frame, cov_start, cov_end)
+    
     async def close(self):
         """关闭 HTTP 客户端"""
         await self.client.aclose()
 
 
-# 全局客户端实例
-_client: Optional[ItickClient] = None
+# 全局客户端实例，每个 API Key 一个（按最近使用排序）
+_clients: "OrderedDict[str, ItickClient]" = OrderedDict()
+# 等待关闭的淘汰客户端任务（保留引用，避免任务在执行前被垃圾回收）
+_closing: Set[asyncio.Task] = set()
 
 
 def get_client(api_key: Optional[str] = None) -> ItickClient:
     """
-    获取全局 iTick 客户端实例
+    获取 API Key 对应的全局 iTick 客户端实例
+    
+    相同 API Key 复用同一实例，以共享连接池和限流器；不同 API Key 各自独立，
+    交替使用时不会互相替换。实例数超过 ITICK_MAX_CLIENTS 时关闭最久未使用的实例。
     
     Args:
         api_key: 可选的 API Key，用于覆盖默认配置
@@ -304,7 +650,46 @@ def get_client(api_key: Optional[str] = None) -> ItickClient:
     Returns:
         ItickClient 实例
     """
-    global _client
-    if _client is None or api_key:
-        _client = ItickClient(api_key)
-    return _client
+    key = api_key or settings.itick_api_key
+    client = _clients.get(key)
+    if client is not None:
+        _clients.move_to_end(key)
+        return client
+    
+    client = ItickClient(key)
+    _clients[key] = client
+    while len(_clients) > max(1, settings.itick_max_clients):
+        _, evicted = _clients.popitem(last=False)
+        _close_later(evicted)
+    return client
+
+
+def _close_later(client: ItickClient):
+    """关闭被淘汰的客户端（等待已发出的请求超时后再关闭连接池）"""
+    async def close():
+        try:
+            await asyncio.sleep(ItickClient.TIMEOUT)
+        finally:
+            # 服务停止时等待被取消，仍然关闭连接池
+            await client.close()
+    
+    try:
+        task = asyncio.get_running_loop().create_task(close())
+    except RuntimeError:
+        # 没有运行中的事件循环（如脚本中同步调用），连接池随对象回收
+        return
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+
+async def close_clients():
+    """关闭全部客户端（服务停止时调用），包括等待关闭的淘汰客户端"""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.close()
+    
+    closing = list(_closing)
+    for task in closing:
+        task.cancel()
+    await asyncio.gather(*closing, return_exceptions=True)
@@ -0,0 +1,169 @@
+"""
+Kline Frame - 列式K线数据结构
+将 iTick 返回的K线字典列表一次性解析为按列存储的 NumPy 数组，供所有工具共享
+"""
+from typing import Dict, Any, List, Optional
+import numpy as np
+
+
+class KlineFrame:
+    """
+    列式K线数据
+    
+    每个字段是一列一维数组：t 为毫秒时间戳（int64），其余为 float64。
+    数据按时间升序排列且时间戳唯一。切片返回共享底层内存的视图，不复制数据。
+    """
+    
+    __slots__ = ("t", "o", "h", "l", "c", "v", "tu")
+    
+    FIELDS = ("t", "o", "h", "l", "c", "v", "tu")
+    
+    def __init__(
+        self,
+        t: np.ndarray,
+        o: np.ndarray,
+        h: np.ndarray,
+        l: np.ndarray,
+        c: np.ndarray,
+        v: np.ndarray,
+        tu: np.ndarray
+    ):
+        self.t = t
+        self.o = o
+        self.h = h
+        self.l = l
+        self.c = c
+        self.v = v
+        self.tu = tu
+    
+    @classmethod
+    def empty(cls) -> "KlineFrame":
+        """创建空的K线数据"""
+        block = np.empty((len(cls.FIELDS), 0))
+        return cls(np.empty(0, dtype=np.int64), *block[1:])
+    
+    @classmethod
+    def from_records(cls, records: Optional[List[Dict[str, Any]]]) -> "KlineFrame":
+        """
+        从 iTick K线字典列表构建
+        
+        缺失值处理：
+        - 缺少时间戳或收盘价（或收盘价<=0）的K线被丢弃
+        - 缺少开/高/低价时用收盘价补齐
+        - 缺少成交量/成交额时记为 0
+        - 时间戳重复时保留最后一条
+        
+        Args:
+            records: K线字典列表，字段为 t/o/h/l/c/v/tu
+        
+        Returns:
+            KlineFrame 实例
+        """
+        if not records:
+            return cls.empty()
+        
+        try:
+            raw = np.array(
+                [[k.get(f) for f in cls.FIELDS] for k in records],
+                dtype=float
+            )
+        except (TypeError, ValueError):
+            # 个别字段无法转为数字时逐条清洗
+            raw = np.array(
+                [[cls._to_float(k.get(f)) for f in cls.FIELDS] for k in records],
+                dtype=float
+            )
+        
+        t, c = raw[:, 0], raw[:, 4]
+        raw = raw[np.isfinite(t) & np.isfinite(c) & (c > 0)]
+        if len(raw) == 0:
+            return cls.empty()
+        
+        # 按时间排序去重（保留同一时间戳的最后一条）
+        order = np.argsort(raw[:, 0], kind="stable")
+        raw = raw[order]
+        keep = np.append(raw[1:, 0] != raw[:-1, 0], True)
+        raw = raw[keep]
+        
+        # 转为列优先存储，每列是同一块内存上的连续视图
+        block = np.ascontiguousarray(raw.T)
+        t, o, h, l, c, v, tu = block
+        for column in (o, h, l):
+            missing = ~np.isfinite(column)
+            column[missing] = c[missing]
+        for column in (v, tu):
+            column[~np.isfinite(column)] = 0.0
+        
+        return cls(t.astype(np.int64), o, h, l, c, v, tu)
+    
+    @staticmethod
+    def _to_float(value: Any) -> float:
+        """将单个值转为浮点数，无法转换时返回 NaN"""
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return float("nan")
+    
+    def __len__(self) -> int:
+        return len(self.t)
+    
+    def __getitem__(self, key):
+        """切片返回视图；整数索引返回单条K线字典"""
+        if isinstance(key, slice):
+            return KlineFrame(*(getattr(self, f)[key] for f in self.FIELDS))
+        return {
+            "t": int(self.t[key]),
+            **{f: float(getattr(self, f)[key]) for f in self.FIELDS[1:]}
+        }
+    
+    def tail(self, n: int) -> "KlineFrame":
+        """最近 n 条K线（视图）"""
+        return self[-n:] if n > 0 else self[0:0]
+    
+    def take(self, indices: np.ndarray) -> "KlineFrame":
+        """按位置取出K线（副本）"""
+        return KlineFrame(*(getattr(self, f)[indices] for f in self.FIELDS))
+    
+    def concat(self, other: "KlineFrame") -> "KlineFrame":
+        """拼接另一段时间更晚的K线（调用方保证时间顺序）"""
+        return KlineFrame(*(
+            np.concatenate([getattr(self, f), getattr(other, f)]) for f in self.FIELDS
+        ))
+    
+    def merge(self, other: "KlineFrame") -> "KlineFrame":
+        """
+        合并两段K线，按时间排序，时间戳相同时以 other 为准
+        """
+        if len(self) == 0:
+            return other
+        if len(other) == 0:
+            return self
+        if other.t[0] > self.t[-1]:
+            return self.concat(other)
+        return KlineFrame.combine([self, other])
+    
+    @classmethod
+    def combine(cls, frames: List["KlineFrame"]) -> "KlineFrame":
+        """
+        一次合并多段K线，按时间排序，时间戳相同时以靠后的一段为准
+        """
+        frames = [frame for frame in frames if len(frame) > 0]
+        if not frames:
+            return cls.empty()
+        
+        combined = cls(*(np.concatenate([getattr(frame, f) for frame in frames]) for f in cls.FIELDS))
+        order = np.argsort(combined.t, kind="stable")
+        t = combined.t[order]
+        keep = order[np.append(t[1:] != t[:-1], True)]
+        return cls(*(getattr(combined, f)[keep] for f in cls.FIELDS))
+    
+    def between(self, start: Optional[int] = None, end: Optional[int] = None) -> "KlineFrame":
+        """时间范围 [start, end] 内的K线（视图）"""
+        lo = 0 if start is None else int(np.searchsorted(self.t, start, side="left"))
+        hi = len(self) if end is None else int(np.searchsorted(self.t, end, side="right"))
+        return self[lo:hi]
+    
+    def to_records(self) -> List[Dict[str, Any]]:
+        """转换回 iTick 的K线字典列表格式"""
+        columns = [self.t.tolist()] + [getattr(self, f).tolist() for f in self.FIELDS[1:]]
+        return [dict(zip(self.FIELDS, row)) for row in zip(*columns)]
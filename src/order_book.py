@@ -0,0 +1,199 @@
+"""
+Order Book - 盘口模型与微观结构指标
+把 iTick 盘口数据解析为按档位排列的价格/挂单量/订单数数组，
+向量化计算价差、中间价、微观价格、累计深度、委比（买卖挂单不平衡）及按挂单吃单的成交均价和滑点
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+
+# 计算委比的档位数（超过实际档位数时按实际档位）
+IMBALANCE_LEVELS = (1, 5, 10)
+
+
+def parse_levels(levels: Optional[List[Dict[str, Any]]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    解析一侧盘口
+    
+    Args:
+        levels: iTick 盘口档位 [{po: 档位, p: 价格, v: 挂单量, o: 订单数}]
+    
+    Returns:
+        (价格, 挂单量, 订单数)，按档位排序，去掉无价格或无挂单的档位
+    """
+    rows = [
+        (level.get("po") or 0, level.get("p"), level.get("v"), level.get("o") or 0)
+        for level in levels or []
+        if level.get("p") and level.get("v")
+    ]
+    rows.sort(key=lambda row: row[0])
+    if not rows:
+        return np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+    _, price, volume, orders = zip(*rows)
+    return (
+        np.array(price, dtype=np.float64),
+        np.array(volume, dtype=np.float64),
+        np.array(orders, dtype=np.int64)
+    )
+
+
+class OrderBook:
+    """
+    单只股票的盘口
+    
+    买卖两侧各为等长的价格、挂单量、订单数数组，下标 0 为最优价（买一/卖一）。
+    """
+    
+    __slots__ = ("bid_price", "bid_volume", "bid_orders", "ask_price", "ask_volume", "ask_orders")
+    
+    def __init__(
+        self,
+        bid_price: np.ndarray,
+        bid_volume: np.ndarray,
+        bid_orders: np.ndarray,
+        ask_price: np.ndarray,
+        ask_volume: np.ndarray,
+        ask_orders: np.ndarray
+    ):
+        self.bid_price = bid_price
+        self.bid_volume = bid_volume
+        self.bid_orders = bid_orders
+        self.ask_price = ask_price
+        self.ask_volume = ask_volume
+        self.ask_orders = ask_orders
+    
+    @classmethod
+    def from_depth(cls, data: Optional[Dict[str, Any]]) -> "OrderBook":
+        """由 iTick 盘口数据 {a: [...], b: [...]} 创建"""
+        data = data or {}
+        return cls(*parse_levels(data.get("b")), *parse_levels(data.get("a")))
+    
+    def side(self, side: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """一侧的 (价格, 挂单量, 订单数)，side 为 bid 或 ask"""
+        if side == "bid":
+            return self.bid_price, self.bid_volume, self.bid_orders
+        return self.ask_price, self.ask_volume, self.ask_orders
+    
+    @property
+    def empty(self) -> bool:
+        return len(self.bid_price) == 0 and len(self.ask_price) == 0
+    
+    @property
+    def two_sided(self) -> bool:
+        """买卖两侧都有挂单（涨跌停时可能只有一侧）"""
+        return len(self.bid_price) > 0 and len(self.ask_price) > 0
+    
+    @property
+    def spread(self) -> Optional[float]:
+        return float(self.ask_price[0] - self.bid_price[0]) if self.two_sided else None
+    
+    @property
+    def mid(self) -> Optional[float]:
+        return float(self.ask_price[0] + self.bid_price[0]) / 2 if self.two_sided else None
+    
+    @property
+    def microprice(self) -> Optional[float]:
+        """按买一/卖一挂单量加权的中间价（买盘挂单多时偏向卖一）"""
+        if not self.two_sided:
+            return None
+        bid_volume, ask_volume = self.bid_volume[0], self.ask_volume[0]
+        return float(
+            (self.bid_price[0] * ask_volume + self.ask_price[0] * bid_volume) / (bid_volume + ask_volume)
+        )
+    
+    def imbalance(self, levels: int) -> Optional[float]:
+        """
+        前 levels 档的委比：(买量 - 卖量) / (买量 + 卖量)，范围 -1 ~ 1
+        
+        Args:
+            levels: 档位数
+        """
+        bid = self.bid_volume[:levels].sum()
+        ask = self.ask_volume[:levels].sum()
+        return float((bid - ask) / (bid + ask)) if bid + ask > 0 else None
+    
+    def sweep(self, side: str, size: float) -> Dict[str, Any]:
+        """
+        按当前挂单估算市价单的成交情况（不考虑隐藏单和撤单）
+        
+        Args:
+            side: buy（吃卖盘）或 sell（吃买盘）
+            size: 委托数量
+        
+        Returns:
+            {side, size, filled, vwap, worst_price, levels, cost, slippage_bps}，
+            slippage_bps 为成交均价相对中间价的不利偏离（基点），挂单不足时 filled < size
+        """
+        price, volume, _ = self.side("ask" if side == "buy" else "bid")
+        cumulative = np.cumsum(volume)
+        filled = float(min(size, cumulative[-1])) if len(cumulative) else 0.0
+        result = {
+            "side": side,
+            "size": size,
+            "filled": filled,
+            "vwap": None,
+            "worst_price": None,
+            "levels": 0,
+            "cost": 0.0,
+            "slippage_bps": None
+        }
+        if filled <= 0:
+            return result
+        
+        # 每档成交量 = 该档挂单量与剩余数量中的较小者
+        taken = np.clip(filled - (cumulative - volume), 0, volume)
+        levels = int(np.searchsorted(cumulative, filled, side="left")) + 1
+        cost = float(taken @ price)
+        vwap = cost / filled
+        result.update(
+            vwap=vwap,
+            worst_price=float(price[levels - 1]),
+            levels=levels,
+            cost=cost
+        )
+        mid = self.mid
+        if mid:
+            direction = 1 if side == "buy" else -1
+            result["slippage_bps"] = direction * (vwap / mid - 1) * 10000
+        return result
+    
+    def metrics(self, order_size: Optional[float] = None) -> Dict[str, Any]:
+        """
+        盘口指标汇总
+        
+        Args:
+            order_size: 估算买入/卖出滑点的委托数量，为空时不估算
+        
+        Returns:
+            {best_bid, best_ask, spread, spread_bps, mid, microprice, bid_depth, ask_depth,
+             bid_notional, ask_notional, imbalance: [{levels, bid_volume, ask_volume, imbalance}],
+             buy, sell}
+        """
+        mid = self.mid
+        spread = self.spread
+        depth_levels = max(len(self.bid_price), len(self.ask_price))
+        imbalance = [
+            {
+                "levels": levels,
+                "bid_volume": float(self.bid_volume[:levels].sum()),
+                "ask_volume": float(self.ask_volume[:levels].sum()),
+                "imbalance": self.imbalance(levels)
+            }
+            for levels in sorted({min(n, depth_levels) for n in IMBALANCE_LEVELS} - {0})
+        ]
+        
+        return {
+            "best_bid": float(self.bid_price[0]) if len(self.bid_price) else None,
+            "best_ask": float(self.ask_price[0]) if len(self.ask_price) else None,
+            "spread": spread,
+            "spread_bps": spread / mid * 10000 if mid else None,
+            "mid": mid,
+            "microprice": self.microprice,
+            "bid_depth": float(self.bid_volume.sum()),
+            "ask_depth": float(self.ask_volume.sum()),
+            "bid_notional": float(self.bid_price @ self.bid_volume),
+            "ask_notional": float(self.ask_price @ self.ask_volume),
+            "imbalance": imbalance,
+            "buy": self.sweep("buy", order_size) if order_size else None,
+            "sell": self.sweep("sell", order_size) if order_size else None
+        }
@@ -0,0 +1,162 @@
+"""
+Output Format - 机器可读输出
+工具数据以列表示（列名 -> NumPy数组/列表），直接按列编码为 JSON/CSV，不逐行构建字典；
+同时生成 MCP structuredContent 及对应的 outputSchema
+"""
+from typing import Any, Callable, Dict, List, Optional
+import csv
+import io
+import json
+import math
+import numpy as np
+from .kline_frame import KlineFrame
+
+
+OUTPUT_FORMATS = ("markdown", "json", "csv", "columnar-json")
+
+# 各工具 parameters 中的 output_format 参数
+OUTPUT_FORMAT_PARAM = {
+    "type": "string",
+    "description": "输出格式。markdown=可读报告(默认), json={列名, 行数组}, csv=带表头的CSV, columnar-json={列名: 值数组}（按列存放，数据量大时最紧凑）。所有格式均同时返回 structuredContent（按列，最多包含最新的 1000 行）",
+    "enum": list(OUTPUT_FORMATS),
+    "default": "markdown"
+}
+
+# structuredContent 默认最多包含的行数（保留最新的行），长序列不随每次调用全部返回
+STRUCTURED_ROWS = 1000
+
+# K线列及其 JSON 类型（t 为 Unix 毫秒时间戳）
+FRAME_COLUMNS = {
+    "t": "integer",
+    "o": "number",
+    "h": "number",
+    "l": "number",
+    "c": "number",
+    "v": "number",
+    "tu": "number"
+}
+
+
+def column_list(values: Any) -> List[Any]:
+    """列转为可 JSON 序列化的列表（NaN/inf 转为 None）"""
+    if isinstance(values, np.ndarray):
+        if values.dtype.kind == "f":
+            finite = np.isfinite(values)
+            if not finite.all():
+                return np.where(finite, values, None).tolist()
+        return values.tolist()
+    return [None if isinstance(v, float) and not math.isfinite(v) else v for v in values]
+
+
+def frame_columns(frame: KlineFrame) -> Dict[str, np.ndarray]:
+    """K线数据的各列"""
+    return {name: getattr(frame, name) for name in FRAME_COLUMNS}
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def encode(meta: Dict[str, Any], columns: Dict[str, List[Any]], output_format: str) -> str:
+    """
+    按格式编码数据表
+    
+    Args:
+        meta: 表外的描述字段（代码、周期等），csv 格式不输出
+        columns: 列名 -> 值列表（已经过 column_list）
+        output_format: json / csv / columnar-json
+    
+    Returns:
+        编码后的文本
+    """
+    names = list(columns)
+    if output_format == "columnar-json":
+        return _dumps({**meta, "data": columns})
+    if output_format == "json":
+        return _dumps({**meta, "columns": names, "rows": list(zip(*columns.values()))})
+    if output_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(names)
+        writer.writerows(zip(*columns.values()))
+        return buffer.getvalue()
+    raise ValueError(f"不支持的输出格式: {output_format}（可用: {', '.join(OUTPUT_FORMATS)}）")
+
+
+def table_result(
+    meta: Dict[str, Any],
+    columns: Dict[str, Any],
+    output_format: str,
+    markdown: Callable[[], str],
+    rows: Optional[int] = STRUCTURED_ROWS
+) -> Dict[str, Any]:
+    """
+    构建工具返回值：content 为所选格式的文本，structuredContent 为 {**meta, data: {列名: 值数组}, rows, truncated}
+    
+    Args:
+        meta: 表外的描述字段
+        columns: 列名 -> NumPy数组/列表
+        output_format: 输出格式（json/csv/columnar-json 的文本包含全部行）
+        markdown: 生成 markdown 报告的函数（仅 markdown 格式时调用）
+        rows: structuredContent 最多包含的行数（保留最新的行），None 表示不限制
+    
+    Returns:
+        MCP 工具结果
+    """
+    total = len(next(iter(columns.values()), []))
+    keep = total if rows is None else min(total, rows)
+    data = {name: column_list(values[total - keep:]) for name, values in columns.items()}
+    if output_format == "markdown":
+        text = markdown()
+    else:
+        full = data if keep == total else {name: column_list(values) for name, values in columns.items()}
+        text = encode(meta, full, output_format)
+    return {
+        "content": [{
+            "type": "text",
+            "text": text
+        }],
+        "structuredContent": {**meta, "data": data, "rows": total, "truncated": keep < total}
+    }
+
+
+def table_schema(meta: Dict[str, Dict[str, Any]], columns: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    生成 table_result 的 outputSchema
+    
+    Args:
+        meta: 描述字段名 -> JSON Schema
+        columns: 列名 -> 元素的 JSON 类型（字符串或类型列表）
+    
+    Returns:
+        JSON Schema
+    """
+    def items(kind):
+        kinds = kind if isinstance(kind, list) else [kind]
+        return {"type": kinds + ["null"]}
+    
+    return {
+        "type": "object",
+        "properties": {
+            **meta,
+            "data": {
+                "type": "object",
+                "description": "按列存放的数据，各列等长",
+                "properties": {
+                    name: {"type": "array", "items": items(kind)}
+                    for name, kind in columns.items()
+                },
+                "required": list(columns)
+            },
+            "rows": {"type": "integer", "description": "数据总行数"},
+            "truncated": {"type": "boolean", "description": "data 是否只包含最新的部分行"}
+        },
+        "required": list(meta) + ["data", "rows", "truncated"]
+    }
+
+
+def validate_format(output_format: Any) -> Optional[str]:
+    """检查输出格式，不支持时返回错误信息"""
+    if output_format not in OUTPUT_FORMATS:
+        return f"❌ 不支持的输出格式: {output_format}（可用: {', '.join(OUTPUT_FORMATS)}）"
+    return None
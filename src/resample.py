@@ -0,0 +1,261 @@
+"""
+Kline Resampling - K线周期合成
+用本地已有的细粒度K线按交易时段合成更大周期（5/15/30/60分钟、日、周、月），
+也用于把逐笔成交合成秒级K线
+"""
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+import numpy as np
+import pytz
+from .kline_frame import KlineFrame
+
+
+DAY_MS = 86400000
+
+# 分钟级周期的分钟数
+INTRADAY_MINUTES = {
+    "1min": 1,
+    "5min": 5,
+    "15min": 15,
+    "30min": 30,
+    "60min": 60
+}
+
+# 秒级周期的秒数（由逐笔成交合成，iTick 不提供）
+SECOND_PERIODS = {
+    "1s": 1,
+    "5s": 5,
+    "15s": 15,
+    "30s": 30
+}
+
+CALENDAR_PERIODS = ("day", "week", "month")
+
+# 周期从细到粗排列
+PERIOD_ORDER = ["1min", "5min", "15min", "30min", "60min", "day", "week", "month"]
+
+# 各市场时区与连续交易时段（当地时间，自零点起的分钟数）
+# 未列出的市场按 UTC 全天处理
+MARKET_SESSIONS: Dict[str, Tuple[str, List[Tuple[int, int]]]] = {
+    "SH": ("Asia/Shanghai", [(570, 690), (780, 900)]),      # 09:30-11:30, 13:00-15:00
+    "SZ": ("Asia/Shanghai", [(570, 690), (780, 900)]),
+    "HK": ("Asia/Hong_Kong", [(570, 720), (780, 960)]),     # 09:30-12:00, 13:00-16:00
+    "US": ("America/New_York", [(570, 960)]),               # 09:30-16:00
+    "JP": ("Asia/Tokyo", [(540, 690), (750, 930)]),         # 09:00-11:30, 12:30-15:30
+    "TW": ("Asia/Taipei", [(540, 810)]),                    # 09:00-13:30
+    "SG": ("Asia/Singapore", [(540, 720), (780, 1020)]),    # 09:00-12:00, 13:00-17:00
+    "KR": ("Asia/Seoul", [(540, 930)]),                     # 09:00-15:30
+    "IN": ("Asia/Kolkata", [(555, 930)]),                   # 09:15-15:30
+    "TH": ("Asia/Bangkok", [(600, 750), (870, 990)]),       # 10:00-12:30, 14:30-16:30
+    "DE": ("Europe/Berlin", [(540, 1050)]),                 # 09:00-17:30
+    "GB": ("Europe/London", [(480, 990)]),                  # 08:00-16:30
+}
+
+DEFAULT_SESSION = ("UTC", [(0, 1440)])
+
+
+def market_session(region: str) -> Tuple[str, List[Tuple[int, int]]]:
+    """获取市场的时区和交易时段"""
+    return MARKET_SESSIONS.get(region.upper(), DEFAULT_SESSION)
+
+
+def index_region(code: str) -> str:
+    """
+    推断指数所属市场（指数API统一使用 region='GB'，无法直接得知交易时段）
+    
+    纯数字代码视为A股指数，HS 开头视为恒生系列，其余按美股处理。
+    """
+    if code.isdigit():
+        return "SH"
+    if code.upper().startswith("HS"):
+        return "HK"
+    return "US"
+
+
+def can_resample(source: str, target: str) -> bool:
+    """判断 source 周期能否合成 target 周期"""
+    if source not in PERIOD_ORDER or target not in PERIOD_ORDER:
+        return False
+    if PERIOD_ORDER.index(source) >= PERIOD_ORDER.index(target):
+        return False
+    if source in INTRADAY_MINUTES and target in INTRADAY_MINUTES:
+        return INTRADAY_MINUTES[target] % INTRADAY_MINUTES[source] == 0
+    # 周线跨月，不能合成月线
+    return source != "week"
+
+
+def source_periods(target: str) -> List[str]:
+    """可用于合成 target 的周期，按从粗到细排列（越粗数据量越小）"""
+    return [p for p in reversed(PERIOD_ORDER) if can_resample(p, target)]
+
+
+def local_offsets(t: np.ndarray, tz_name: str) -> np.ndarray:
+    """
+    计算每个时间戳的当地时区偏移（毫秒）
+    
+    只对出现过的 UTC 日期逐一查询时区（取当日 12:00 UTC，避开夏令时切换时刻），
+    再广播回每根K线。
+    """
+    if tz_name == "UTC" or len(t) == 0:
+        return np.zeros(len(t), dtype=np.int64)
+    
+    tz = pytz.timezone(tz_name)
+    days, inverse = np.unique(t // DAY_MS, return_inverse=True)
+    offsets = np.array([
+        int(datetime.fromtimestamp(int(day) * 86400 + 43200, tz).utcoffset().total_seconds()) * 1000
+        for day in days
+    ], dtype=np.int64)
+    return offsets[inverse]
+
+
+def session_seconds(sessions: List[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """交易时段的起止时刻（当地时间，自零点起的秒数）"""
+    return (
+        np.array([s * 60 for s, _ in sessions], dtype=np.int64),
+        np.array([e * 60 for _, e in sessions], dtype=np.int64)
+    )
+
+
+def bucket_labels(t: np.ndarray, period: str, region: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算每根K线所属目标周期的标签（当地时间毫秒）
+    
+    分钟级周期按交易时段开盘对齐（如A股60分钟为 09:30/10:30/13:00/14:00），
+    时段外的K线（集合竞价、收盘时刻）归入最近的时段。
+    K线时间戳按周期起始时间处理。
+    
+    秒级周期的输入为逐笔成交，时间戳是成交时刻：开盘前的成交归入第一个周期，
+    时段结束后（午休、收盘集合竞价）的成交归入该时段的最后一个周期。
+    
+    Args:
+        t: K线时间戳（UTC毫秒，升序）
+        period: 目标周期
+        region: 市场代码
+    
+    Returns:
+        (当地时间标签, 时区偏移)
+    """
+    tz_name, sessions = market_session(region)
+    offsets = local_offsets(t, tz_name)
+    local = t + offsets
+    local_day = local // DAY_MS
+    
+    if period in INTRADAY_MINUTES:
+        size = INTRADAY_MINUTES[period]
+        starts = np.array([s for s, _ in sessions])
+        ends = np.array([e for _, e in sessions])
+        minute = (local - local_day * DAY_MS) // 60000
+        
+        index = np.minimum(np.searchsorted(ends, minute, side="right"), len(sessions) - 1)
+        offset = np.clip(minute - starts[index], 0, ends[index] - starts[index] - 1)
+        bucket = starts[index] + offset // size * size
+        return local_day * DAY_MS + bucket * 60000, offsets
+    
+    if period in SECOND_PERIODS:
+        size = SECOND_PERIODS[period]
+        starts, ends = session_seconds(sessions)
+        second = (local - local_day * DAY_MS) // 1000
+        
+        index = np.maximum(np.searchsorted(starts, second, side="right") - 1, 0)
+        offset = np.clip(second - starts[index], 0, ends[index] - starts[index] - 1)
+        bucket = starts[index] + offset // size * size
+        return local_day * DAY_MS + bucket * 1000, offsets
+    
+    if period == "day":
+        return local_day * DAY_MS, offsets
+    
+    if period == "week":
+        # 1970-01-01 是周四，按周一对齐
+        return (local_day - (local_day + 3) % 7) * DAY_MS, offsets
+    
+    if period == "month":
+        month = local_day.astype("datetime64[D]").astype("datetime64[M]")
+        return month.astype("datetime64[D]").astype(np.int64) * DAY_MS, offsets
+    
+    raise ValueError(f"不支持的周期: {period}")
+
+
+def resample(frame: KlineFrame, period: str, region: str) -> KlineFrame:
+    """
+    将K线合成为更大周期
+    
+    Args:
+        frame: 细粒度K线
+        period: 目标周期
+        region: 市场代码（决定时区和交易时段）
+    
+    Returns:
+        合成后的K线，时间戳为各周期起始时间（UTC毫秒）
+    """
+    return _resample(frame, period, region)[0]
+
+
+def _resample(frame: KlineFrame, period: str, region: str) -> Tuple[KlineFrame, int]:
+    """合成K线，同时返回最后一个周期在源数据中的首条时间戳"""
+    if len(frame) == 0:
+        return KlineFrame.empty(), 0
+    
+    labels, offsets = bucket_labels(frame.t, period, region)
+    starts = np.flatnonzero(np.diff(labels, prepend=labels[0] - 1))
+    ends = np.append(starts[1:], len(frame)) - 1
+    
+    return KlineFrame(
+        labels[starts] - offsets[starts],
+        frame.o[starts],
+        np.maximum.reduceat(frame.h, starts),
+        np.minimum.reduceat(frame.l, starts),
+        frame.c[ends],
+        np.add.reduceat(frame.v, starts),
+        np.add.reduceat(frame.tu, starts)
+    ), int(frame.t[starts[-1]])
+
+
+class Resampler:
+    """
+    增量合成器
+    
+    缓存每个序列已合成的结果，源数据追加新K线时只重算最后一个（可能未完结的）周期之后的部分。
+    """
+    
+    def __init__(self):
+        # (序列键, 目标周期) -> (合成结果, 源数据首个时间戳, 最后一个周期在源数据中的首个时间戳)
+        self._cache: Dict[Tuple, Tuple[KlineFrame, int, int]] = {}
+    
+    def invalidate(self, key: Tuple, before: Optional[int] = None):
+        """
+        源数据变动时使缓存失效
+        
+        Args:
+            key: 源序列键
+            before: 变动的最早时间戳，只有变动早于缓存末尾周期时才需要全量重算
+        """
+        for cache_key in [k for k in self._cache if k[0] == key]:
+            _, _, last_start = self._cache[cache_key]
+            if before is None or before < last_start:
+                del self._cache[cache_key]
+    
+    def resample(self, key: Tuple, source: KlineFrame, period: str, region: str) -> KlineFrame:
+        """
+        合成 source 为 period 周期，复用上次结果
+        
+        Args:
+            key: 源序列键（用于缓存）
+            source: 源K线
+            period: 目标周期
+            region: 市场代码
+        """
+        if len(source) == 0:
+            return KlineFrame.empty()
+        
+        entry = self._cache.get((key, period))
+        if entry is not None and len(entry[0]) > 0 and entry[1] == source.t[0]:
+            cached, _, last_start = entry
+            # 从缓存的最后一个周期开始重算，之前的周期已完结
+            start = int(np.searchsorted(source.t, last_start, side="left"))
+            tail, last_start = _resample(source[start:], period, region)
+            result = cached[:-1].concat(tail)
+        else:
+            result, last_start = _resample(source, period, region)
+        
+        self._cache[(key, period)] = (result, int(source.t[0]), last_start)
+        return result
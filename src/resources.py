@@ -0,0 +1,382 @@
+"""
+MCP Resources - 本地数据集资源
+把 Bar Store 中缓存的K线序列和逐笔成交记录以 MCP 资源暴露（如 itick://kline/SH/600519/day），
+读取时支持时间范围、列选择和分页，新K线写入时向订阅的客户端推送 resources/updated 通知
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+from datetime import datetime
+import asyncio
+import logging
+import time
+import uuid
+from .config import settings
+from .bar_store import SeriesKey, get_bar_store
+from .itick_client import date_range_ms
+from .kline_frame import KlineFrame
+from .output_format import FRAME_COLUMNS, column_list, encode
+from .resample import index_region
+from .tick_feed import valid_symbol
+from .tick_recorder import get_tick_recorder
+
+logger = logging.getLogger(__name__)
+
+
+# URI 主机部分 -> 序列类型
+KLINE_RESOURCES = {
+    "kline": "stock",
+    "index-kline": "index"
+}
+
+# 逐笔成交记录的 URI 主机部分及列
+TICK_RESOURCE = "tick"
+TICK_COLUMNS = ("t", "price", "volume", "side")
+
+RESOURCE_TYPES = (*KLINE_RESOURCES, TICK_RESOURCE)
+
+# 资源内容的编码格式及 MIME 类型
+RESOURCE_FORMATS = {
+    "columnar-json": "application/json",
+    "json": "application/json",
+    "csv": "text/csv"
+}
+
+
+class ResourceError(Exception):
+    """资源不存在或读取参数无效"""
+    
+    # JSON-RPC 错误码（MCP 规定资源不存在为 -32002）
+    NOT_FOUND = -32002
+    INVALID_PARAMS = -32602
+    
+    def __init__(self, code: int, message: str):
+        self.code = code
+        self.message = message
+        super().__init__(message)
+
+
+def series_uri(key: SeriesKey) -> str:
+    """序列键对应的资源 URI"""
+    kind, region, code, period = key
+    host = next(host for host, k in KLINE_RESOURCES.items() if k == kind)
+    return f"itick://{host}/{region}/{code}/{period}"
+
+
+def tick_uri(region: str, code: str) -> str:
+    """逐笔成交记录对应的资源 URI"""
+    return f"itick://{TICK_RESOURCE}/{region}/{code}"
+
+
+def parse_uri(uri: str) -> Tuple[str, List[str], Dict[str, str]]:
+    """
+    解析资源 URI
+    
+    Args:
+        uri: 如 itick://kline/SH/600519/day?start=20240101&columns=t,c
+    
+    Returns:
+        (资源类型, 路径各段, 查询参数)
+    """
+    parts = urlsplit(uri)
+    segments = [s for s in parts.path.split("/") if s]
+    expected = 2 if parts.netloc == TICK_RESOURCE else 3
+    if parts.scheme != "itick" or parts.netloc not in RESOURCE_TYPES or len(segments) != expected:
+        raise ResourceError(ResourceError.NOT_FOUND, f"资源不存在: {uri}")
+    # 市场和代码用于构建本地文件路径
+    if not valid_symbol(segments[0], segments[1]):
+        raise ResourceError(ResourceError.NOT_FOUND, f"资源不存在: {uri}")
+    
+    query = {name: values[-1] for name, values in parse_qs(parts.query).items()}
+    segments[0] = segments[0].upper()
+    return parts.netloc, segments, query
+
+
+def _parse_time(value: Optional[str], region: str, end: bool = False) -> Optional[int]:
+    """时间参数：8位为 YYYYMMDD（市场当地日期），其余按毫秒时间戳"""
+    if not value:
+        return None
+    if len(value) == 8 and value.isdigit():
+        start_ms, end_ms = date_range_ms(value, value, region)
+        return end_ms if end else start_ms
+    try:
+        return int(value)
+    except ValueError:
+        raise ResourceError(ResourceError.INVALID_PARAMS, f"无效的时间参数: {value}（应为 YYYYMMDD 或毫秒时间戳）")
+
+
+def _format_time(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000).strftime("%Y-%m-%d %H:%M")
+
+
+class ResourceHub:
+    """
+    资源目录、读取与订阅
+    
+    订阅按会话（Mcp-Session-Id，由 initialize 分配）记录；每个会话可打开一个 SSE 流接收通知，
+    未打开流的会话的通知直接丢弃。空闲超过 ttl 且未打开流的会话过期。
+    """
+    
+    # 单页最多返回的K线条数，超出时在内容中给出下一页的 URI
+    PAGE_SIZE = 5000
+    
+    # resources/list 每页的资源数
+    LIST_PAGE_SIZE = 100
+    
+    # 每个会话缓存的未发送通知上限
+    QUEUE_SIZE = 1000
+    
+    def __init__(self, ttl: int = 3600):
+        """
+        初始化资源中心
+        
+        Args:
+            ttl: 会话空闲过期时长（秒）
+        """
+        self.ttl = ttl
+        self._sessions: Dict[str, float] = {}
+        self._subscriptions: Dict[str, Dict[str, SeriesKey]] = {}
+        self._streams: Dict[str, asyncio.Queue] = {}
+    
+    def open_session(self) -> str:
+        """分配新会话 ID（initialize 时调用）"""
+        self._expire()
+        session = uuid.uuid4().hex
+        self._sessions[session] = time.monotonic()
+        return session
+    
+    def touch(self, session: Optional[str]) -> bool:
+        """刷新会话的最后活动时间，会话不存在或已过期时返回 False"""
+        self._expire()
+        if not session or session not in self._sessions:
+            return False
+        self._sessions[session] = time.monotonic()
+        return True
+    
+    def _expire(self):
+        """清除空闲超时且未打开通知流的会话"""
+        deadline = time.monotonic() - self.ttl
+        for session in [s for s, seen in self._sessions.items() if seen < deadline and s not in self._streams]:
+            logger.info(f"[Resources] 会话已过期: session={session}")
+            self.end_session(session)
+    
+    @staticmethod
+    def list_resources(cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        本地已有的K线序列和逐笔成交记录（分页，只读取元数据，不加载数据）
+        
+        Args:
+            cursor: 上一页返回的 nextCursor，为空时从第一页开始
+        
+        Returns:
+            (本页资源, 下一页的 cursor，没有更多时为 None)
+        """
+        try:
+            offset = int(cursor) if cursor else 0
+        except ValueError:
+            offset = -1
+        if offset < 0:
+            raise ResourceError(ResourceError.INVALID_PARAMS, f"无效的 cursor: {cursor}")
+        
+        store = get_bar_store()
+        entries: List[Tuple[str, Any]] = [("kline", key) for key in sorted(store.keys())]
+        if settings.tick_recorder_enabled:
+            entries.extend(("tick", symbol) for symbol in get_tick_recorder().symbols())
+        
+        end = offset + ResourceHub.LIST_PAGE_SIZE
+        resources = []
+        for entry_type, key in entries[offset:end]:
+            if entry_type == "tick":
+                region, code = key
+                ring = get_tick_recorder().ring(region, code)
+                if ring is None:
+                    continue
+                resources.append({
+                    "uri": tick_uri(region, code),
+                    "name": f"{region}.{code} 逐笔成交",
+                    "description": f"本地记录的逐笔成交，{len(ring)} 笔（最多保留 {ring.capacity} 笔）",
+                    "mimeType": RESOURCE_FORMATS["columnar-json"]
+                })
+                continue
+            
+            summary = store.summary(key)
+            kind, region, code, period = key
+            description = f"{'指数' if kind == 'index' else '股票'}K线"
+            if summary is not None:
+                count, coverage = summary
+                spans = "、".join(f"{_format_time(start)} ~ {_format_time(end)}" for start, end in coverage)
+                description += f"，{count} 条，完整覆盖 {spans}"
+            resources.append({
+                "uri": series_uri(key),
+                "name": f"{region}.{code} {period}",
+                "description": description,
+                "mimeType": RESOURCE_FORMATS["columnar-json"]
+            })
+        return resources, (str(end) if end < len(entries) else None)
+    
+    @staticmethod
+    def list_templates() -> List[Dict[str, Any]]:
+        """资源 URI 模板"""
+        query = "{?start,end,columns,format,limit}"
+        description = (
+            "本地缓存的K线。start/end 为 YYYYMMDD 或毫秒时间戳；columns 为逗号分隔的列（t,o,h,l,c,v,tu）；"
+            f"format 为 columnar-json(默认)/json/csv；limit 为单页条数（默认 {ResourceHub.PAGE_SIZE}），"
+            "未读完时内容中的 next 为下一页 URI"
+        )
+        return [
+            {
+                "uriTemplate": "itick://kline/{region}/{code}/{period}" + query,
+                "name": "股票K线",
+                "description": description,
+                "mimeType": RESOURCE_FORMATS["columnar-json"]
+            },
+            {
+                "uriTemplate": "itick://index-kline/{region}/{code}/{period}" + query,
+                "name": "指数K线",
+                "description": description,
+                "mimeType": RESOURCE_FORMATS["columnar-json"]
+            },
+            {
+                "uriTemplate": "itick://tick/{region}/{code}" + query,
+                "name": "逐笔成交记录",
+                "description": (
+                    "本地记录的逐笔成交（需开启逐笔成交记录）。列为 t,price,volume,side"
+                    "（side: 1=主动买, -1=主动卖, 0=未知），其余参数同K线资源；不支持订阅"
+                ),
+                "mimeType": RESOURCE_FORMATS["columnar-json"]
+            }
+        ]
+    
+    @staticmethod
+    def read(uri: str) -> List[Dict[str, Any]]:
+        """
+        读取资源（只读本地数据，不请求 iTick）
+        
+        Args:
+            uri: 资源 URI（可带查询参数）
+        
+        Returns:
+            resources/read 的 contents
+        """
+        kind, segments, query = parse_uri(uri)
+        if kind == TICK_RESOURCE:
+            region, code = segments
+            ring = get_tick_recorder().ring(region, code) if settings.tick_recorder_enabled else None
+            if ring is None:
+                raise ResourceError(ResourceError.NOT_FOUND, f"资源不存在: {uri}")
+            base_uri = tick_uri(region, code)
+            available = TICK_COLUMNS
+            session_region = region
+            select = ring.between
+            column = lambda rows, name: rows[name]
+        else:
+            key = (KLINE_RESOURCES[kind], *segments)
+            frame = get_bar_store().get(key)
+            if frame is None:
+                raise ResourceError(ResourceError.NOT_FOUND, f"资源不存在: {uri}")
+            base_uri = series_uri(key)
+            available = tuple(FRAME_COLUMNS)
+            session_region = index_region(key[2]) if key[0] == "index" else key[1]
+            select = frame.between
+            column = getattr
+        
+        output_format = query.get("format", "columnar-json")
+        if output_format not in RESOURCE_FORMATS:
+            raise ResourceError(
+                ResourceError.INVALID_PARAMS,
+                f"不支持的格式: {output_format}（可用: {', '.join(RESOURCE_FORMATS)}）"
+            )
+        
+        columns = query["columns"].split(",") if query.get("columns") else list(available)
+        unknown = [c for c in columns if c not in available]
+        if unknown:
+            raise ResourceError(ResourceError.INVALID_PARAMS, f"未知的列: {', '.join(unknown)}")
+        
+        try:
+            limit = max(1, int(query.get("limit", ResourceHub.PAGE_SIZE)))
+        except ValueError:
+            raise ResourceError(ResourceError.INVALID_PARAMS, f"无效的 limit: {query['limit']}")
+        
+        start = _parse_time(query.get("start"), session_region)
+        end = _parse_time(query.get("end"), session_region, end=True)
+        selected = select(start, end)
+        
+        # 按时间分页：下一页从本页之后的第一条开始
+        next_uri = None
+        if len(selected) > limit:
+            next_uri = base_uri + "?" + urlencode({
+                **query,
+                "start": str(int(column(selected, "t")[limit]))
+            })
+            selected = selected[:limit]
+        
+        meta = {"uri": uri, "count": len(selected), "next": next_uri}
+        data = {name: column_list(column(selected, name)) for name in columns}
+        content = {
+            "uri": uri,
+            "mimeType": RESOURCE_FORMATS[output_format],
+            "text": encode(meta, data, output_format)
+        }
+        if next_uri:
+            content["_meta"] = {"next": next_uri}
+        return [content]
+    
+    def subscribe(self, session: str, uri: str):
+        """订阅K线资源更新（URI 中的查询参数不影响匹配）"""
+        kind, segments, _ = parse_uri(uri)
+        if kind == TICK_RESOURCE:
+            raise ResourceError(ResourceError.INVALID_PARAMS, f"逐笔成交资源不支持订阅: {uri}")
+        self._subscriptions.setdefault(session, {})[uri] = (KLINE_RESOURCES[kind], *segments)
+    
+    def unsubscribe(self, session: str, uri: str):
+        """取消订阅"""
+        self._subscriptions.get(session, {}).pop(uri, None)
+    
+    def open_stream(self, session: str) -> asyncio.Queue:
+        """打开会话的通知流（替换该会话之前的流）"""
+        queue: asyncio.Queue = asyncio.Queue(self.QUEUE_SIZE)
+        self._streams[session] = queue
+        return queue
+    
+    def close_stream(self, session: str, queue: asyncio.Queue):
+        """关闭会话的通知流（已被新流替换时不处理），会话从此时开始计算空闲时间"""
+        if self._streams.get(session) is queue:
+            del self._streams[session]
+            if session in self._sessions:
+                self._sessions[session] = time.monotonic()
+    
+    def end_session(self, session: str):
+        """结束会话，清除订阅"""
+        self._sessions.pop(session, None)
+        self._subscriptions.pop(session, None)
+        self._streams.pop(session, None)
+    
+    def on_bars(self, key: SeriesKey, frame: KlineFrame, since: int):
+        """Bar Store 写入回调：向订阅了该序列的会话推送更新通知"""
+        for session, subscriptions in self._subscriptions.items():
+            queue = self._streams.get(session)
+            if queue is None:
+                continue
+            for uri, subscribed in subscriptions.items():
+                if subscribed != key:
+                    continue
+                try:
+                    queue.put_nowait({
+                        "jsonrpc": "2.0",
+                        "method": "notifications/resources/updated",
+                        "params": {"uri": uri}
+                    })
+                except asyncio.QueueFull:
+                    logger.warning(f"[Resources] 通知队列已满，丢弃: session={session}, uri={uri}")
+
+
+# 全局资源实例
+_hub: Optional[ResourceHub] = None
+
+
+def get_resource_hub() -> ResourceHub:
+    """获取全局资源实例（首次调用时订阅 Bar Store 写入）"""
+    global _hub
+    if _hub is None:
+        _hub = ResourceHub(settings.mcp_session_ttl)
+        get_bar_store().add_listener(_hub.on_bars)
+    return _hub
@@ -0,0 +1,243 @@
+"""
+Sector Stream - 实时板块聚合
+订阅成分的行情和逐笔成交，增量维护每个内置板块的涨跌、成交额和资金流向汇总，
+板块内领涨/领跌排名用带惰性删除的堆维护，查询无需请求上游
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import heapq
+from .tick_feed import Tick, get_tick_feed
+from .tick_flow import session_bounds, trade_side
+from .sectors import get_sector_scheduler, load_registry
+
+
+class SectorBook:
+    """
+    单个板块的增量汇总
+    
+    成分每次更新 O(1) 调整各项合计，并向最大/最小堆压入新值（O(log n)）；
+    旧值留在堆中，查询时按版本号跳过。堆中过期元素过多时整体重建。
+    """
+    
+    __slots__ = (
+        "name", "members", "count",
+        "sum_change", "sum_turnover", "sum_flow",
+        "_versions", "_max_heap", "_min_heap", "_serial"
+    )
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.members: Dict[str, Tuple[float, float, float]] = {}
+        self.count = 0
+        self.sum_change = 0.0
+        self.sum_turnover = 0.0
+        self.sum_flow = 0.0
+        self._versions: Dict[str, int] = {}
+        self._max_heap: List[Tuple[float, int, str]] = []
+        self._min_heap: List[Tuple[float, int, str]] = []
+        self._serial = 0
+    
+    def update(self, member: str, change: float, turnover: float, flow: float):
+        """更新一个成分的涨跌幅(%)、成交额和资金净流入"""
+        old = self.members.get(member)
+        if old is None:
+            self.count += 1
+        else:
+            self.sum_change -= old[0]
+            self.sum_turnover -= old[1]
+            self.sum_flow -= old[2]
+        
+        self.members[member] = (change, turnover, flow)
+        self.sum_change += change
+        self.sum_turnover += turnover
+        self.sum_flow += flow
+        
+        self._serial += 1
+        self._versions[member] = self._serial
+        heapq.heappush(self._max_heap, (-change, self._serial, member))
+        heapq.heappush(self._min_heap, (change, self._serial, member))
+        
+        if len(self._max_heap) > 4 * self.count + 16:
+            self._rebuild()
+    
+    def _rebuild(self):
+        """丢弃堆中的过期元素，并重新求和消除浮点累计误差"""
+        self._max_heap = [(-v[0], self._versions[m], m) for m, v in self.members.items()]
+        self._min_heap = [(v[0], self._versions[m], m) for m, v in self.members.items()]
+        heapq.heapify(self._max_heap)
+        heapq.heapify(self._min_heap)
+        self.sum_change = sum(v[0] for v in self.members.values())
+        self.sum_turnover = sum(v[1] for v in self.members.values())
+        self.sum_flow = sum(v[2] for v in self.members.values())
+    
+    def _top(self, heap: List[Tuple[float, int, str]], n: int) -> List[str]:
+        """从堆中取出前 n 个有效成分（取出后放回有效元素，过期元素丢弃）"""
+        result = []
+        valid = []
+        while heap and len(result) < n:
+            item = heapq.heappop(heap)
+            if self._versions.get(item[2]) == item[1]:
+                result.append(item[2])
+                valid.append(item)
+        for item in valid:
+            heapq.heappush(heap, item)
+        return result
+    
+    def leaders(self, n: int = 1) -> List[str]:
+        """涨幅最大的 n 个成分"""
+        return self._top(self._max_heap, n)
+    
+    def laggards(self, n: int = 1) -> List[str]:
+        """涨幅最小的 n 个成分"""
+        return self._top(self._min_heap, n)
+    
+    @property
+    def avg_change(self) -> float:
+        return self.sum_change / self.count if self.count else 0.0
+
+
+class MemberState:
+    """单只成分的当日状态"""
+    
+    __slots__ = ("day_start", "day_end", "prev_close", "price", "change", "turnover", "flow", "side")
+    
+    def __init__(self, day_start: int, day_end: int, prev_close: float):
+        self.day_start = day_start
+        self.day_end = day_end
+        self.prev_close = prev_close
+        self.price = prev_close
+        self.change = 0.0
+        self.turnover = 0.0
+        self.flow = 0.0
+        self.side = 0
+
+
+class SectorStreamEngine:
+    """
+    实时板块聚合引擎
+    
+    行情更新（如板块快照刷新时获取的行情）提供昨收、涨跌幅和累计成交额；
+    逐笔成交在两次行情之间按成交价推算涨跌幅，累加成交额，
+    并按 tick rule 判断主动买卖方向累计资金净流入。进入新的交易日时清零。
+    """
+    
+    def __init__(self, registry: Dict[str, Dict[str, Any]]):
+        """
+        初始化引擎
+        
+        Args:
+            registry: 板块注册表 {板块名称: {members: [{region, code, name}]}}
+        """
+        self.books: Dict[str, SectorBook] = {name: SectorBook(name) for name in registry}
+        self.names: Dict[str, str] = {}
+        self._sectors: Dict[Tuple[str, str], List[str]] = {}
+        self._state: Dict[Tuple[str, str], MemberState] = {}
+        
+        for name, sector in registry.items():
+            for member in sector["members"]:
+                key = (member["region"].upper(), str(member["code"]))
+                self._sectors.setdefault(key, []).append(name)
+                self.names[f"{key[0]}.{key[1]}"] = member.get("name", member["code"])
+    
+    def symbols(self) -> List[Tuple[str, str]]:
+        """所有板块成分"""
+        return list(self._sectors)
+    
+    def _publish(self, key: Tuple[str, str], state: MemberState):
+        """把成分的最新值推送到所属的各个板块"""
+        member = f"{key[0]}.{key[1]}"
+        for name in self._sectors[key]:
+            self.books[name].update(member, state.change, state.turnover, state.flow)
+    
+    def _state_for(self, key: Tuple[str, str], t: int) -> Optional[MemberState]:
+        """取得成分状态，跨交易日时以上一日最新价为昨收并清零累计值；早于当日的数据返回 None"""
+        state = self._state.get(key)
+        if state is None or t >= state.day_end:
+            prev_close = state.price if state is not None else 0.0
+            state = MemberState(*session_bounds(t, key[0]), prev_close)
+            self._state[key] = state
+        elif t < state.day_start:
+            return None
+        return state
+    
+    def on_quote(self, region: str, code: str, quote: Dict[str, Any]):
+        """处理一次行情更新（以行情的涨跌幅和累计成交额为准）"""
+        key = (region.upper(), str(code))
+        price = quote.get("ld")
+        if key not in self._sectors or not price or not quote.get("t"):
+            return
+        
+        state = self._state_for(key, int(quote["t"]))
+        if state is None:
+            return
+        
+        if quote.get("ch") is not None:
+            state.prev_close = price - quote["ch"]
+        state.price = price
+        if quote.get("chp") is not None:
+            state.change = quote["chp"]
+        elif state.prev_close:
+            state.change = (price / state.prev_close - 1) * 100
+        state.turnover = quote.get("tu") or state.turnover
+        self._publish(key, state)
+    
+    def on_tick(self, tick: Tick):
+        """处理一笔成交"""
+        key = (tick.region, tick.code)
+        if key not in self._sectors:
+            return
+        
+        state = self._state_for(key, tick.t)
+        if state is None:
+            return
+        
+        amount = tick.price * tick.volume
+        state.side = trade_side(tick.price, state.price or None, state.side)
+        state.price = tick.price
+        if state.prev_close:
+            state.change = (tick.price / state.prev_close - 1) * 100
+        state.turnover += amount
+        state.flow += state.side * amount
+        self._publish(key, state)
+    
+    def ranking(self, names: Optional[List[str]] = None, top_n: int = 3) -> List[Dict[str, Any]]:
+        """
+        按平均涨跌幅排列板块
+        
+        Args:
+            names: 板块名称，为空时为全部有数据的板块
+            top_n: 每个板块返回的领涨/领跌成分数量
+        
+        Returns:
+            [{name, count, avg_change, turnover, flow, leaders, laggards}]，
+            leaders/laggards 为 [(成分名称, 涨跌幅)]
+        """
+        result = []
+        for name in names or list(self.books):
+            book = self.books.get(name)
+            if book is None or book.count == 0:
+                continue
+            result.append({
+                "name": name,
+                "count": book.count,
+                "avg_change": book.avg_change,
+                "turnover": book.sum_turnover,
+                "flow": book.sum_flow,
+                "leaders": [(self.names.get(m, m), book.members[m][0]) for m in book.leaders(top_n)],
+                "laggards": [(self.names.get(m, m), book.members[m][0]) for m in book.laggards(top_n)]
+            })
+        result.sort(key=lambda s: s["avg_change"], reverse=True)
+        return result
+
+
+# 全局引擎实例
+_engine: Optional[SectorStreamEngine] = None
+
+
+def get_sector_stream() -> SectorStreamEngine:
+    """获取全局实时板块聚合引擎（首次调用时订阅逐笔成交和板块快照行情）"""
+    global _engine
+    if _engine is None:
+        _engine = SectorStreamEngine(load_registry())
+        get_tick_feed().add_listener(_engine.on_tick)
+        get_sector_scheduler().add_quote_listener(_engine.on_quote)
+    return _engine
@@ -0,0 +1,256 @@
+"""
+Sector Registry - 板块注册表
+从 src/data/sectors.json 加载命名板块（以板块ETF为成分），
+后台按交易时段预计算板块汇总（平均涨跌、成交额、资金评分、龙头）
+"""
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from pathlib import Path
+from functools import lru_cache
+import asyncio
+import json
+import time
+from .config import settings
+from .itick_client import ItickAPIError
+from .kline_frame import KlineFrame
+from .index_snapshots import SnapshotScheduler, market_state
+
+
+SECTOR_FILE = Path(__file__).parent / "data" / "sectors.json"
+
+
+@lru_cache(maxsize=None)
+def load_registry() -> Dict[str, Dict[str, Any]]:
+    """读取板块注册表（结果缓存）: {板块名称: {name, market, members}}"""
+    with open(SECTOR_FILE, encoding="utf-8") as f:
+        return {sector["name"]: sector for sector in json.load(f)["sectors"]}
+
+
+def list_sectors(market: Optional[str] = None) -> Dict[str, List[Dict[str, str]]]:
+    """
+    列出板块及成分
+    
+    Args:
+        market: 只列出该市场的板块（如 "A股"、"港股"），为空时列出全部
+    
+    Returns:
+        {板块名称: [{region, code, name}, ...]}
+    """
+    return {
+        name: [dict(member) for member in sector["members"]]
+        for name, sector in load_registry().items()
+        if market is None or sector.get("market") == market
+    }
+
+
+def get_sector(name: str) -> Dict[str, Any]:
+    """获取板块定义，未知板块抛出 ValueError"""
+    registry = load_registry()
+    if name not in registry:
+        raise ValueError(f"未知的板块: {name}（可用: {', '.join(registry)}）")
+    return registry[name]
+
+
+def etf_flow(quote: Dict[str, Any], frame: KlineFrame, days: int = 5) -> Dict[str, Any]:
+    """
+    由行情和日K线估算单只板块ETF的资金流向
+    
+    Args:
+        quote: 实时行情
+        frame: 日K线（至少2条）
+        days: 近期涨跌的统计天数
+    
+    Returns:
+        涨跌幅、量能比、近期涨跌、资金评分(0-100)、资金状态和估算净流入
+    """
+    change_pct = quote.get('chp', 0) or 0
+    turnover = quote.get('tu', 0) or 0
+    
+    # 量能比（今日 vs 昨日）
+    volume_ratio = float(frame.v[-1] / frame.v[-2]) if frame.v[-2] else 1.0
+    
+    # 近N日涨跌
+    period_change = 0.0
+    if len(frame) >= days and frame.c[-days]:
+        period_change = float((frame.c[-1] - frame.c[-days]) / frame.c[-days] * 100)
+    
+    # 资金流向评分：涨跌幅权重50%，量能比权重30%，近期趋势20%，归一化到0-100
+    score = (
+        (change_pct * 10) * 0.5 +
+        ((volume_ratio - 1) * 100) * 0.3 +
+        (period_change * 2) * 0.2
+    )
+    score = max(0, min(100, score + 50))
+    
+    if change_pct > 2 and volume_ratio > 1.2:
+        flow_status = "🔥 强势流入"
+    elif change_pct > 0.5 and volume_ratio > 1:
+        flow_status = "🟢 持续流入"
+    elif change_pct > 0:
+        flow_status = "✅ 小幅流入"
+    elif change_pct > -0.5:
+        flow_status = "⚪ 震荡整理"
+    elif change_pct > -2:
+        flow_status = "🔴 小幅流出"
+    else:
+        flow_status = "❌ 大幅流出"
+    
+    # 估算净流入金额（简化算法，实际应使用逐笔成交的买卖盘数据）
+    if change_pct > 0 and volume_ratio > 1:
+        net_inflow = turnover * (change_pct / 100) * volume_ratio
+    else:
+        net_inflow = -turnover * abs(change_pct / 100) * 0.5
+    
+    return {
+        "price": quote.get('ld', 0),
+        "change_pct": change_pct,
+        "volume": quote.get('v', 0),
+        "turnover": turnover,
+        "volume_ratio": volume_ratio,
+        "period_change": period_change,
+        "score": score,
+        "flow_status": flow_status,
+        "net_inflow": net_inflow
+    }
+
+
+def summarize_sector(members: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    板块汇总
+    
+    Args:
+        members: 各成分的 etf_flow 结果（含 name）
+    
+    Returns:
+        avg_change, avg_score, total_turnover, net_inflow, leader, verdict
+    """
+    count = len(members)
+    avg_change = sum(m['change_pct'] for m in members) / count
+    avg_score = sum(m['score'] for m in members) / count
+    
+    if avg_change > 1 and avg_score > 60:
+        verdict = "🔥 强势板块，资金大幅流入"
+    elif avg_change > 0 and avg_score > 50:
+        verdict = "🟢 活跃板块，资金持续流入"
+    elif avg_change > -0.5:
+        verdict = "⚪ 震荡板块，资金观望"
+    else:
+        verdict = "🔴 弱势板块，资金流出"
+    
+    return {
+        "avg_change": avg_change,
+        "avg_score": avg_score,
+        "total_turnover": sum(m['turnover'] for m in members),
+        "net_inflow": sum(m['net_inflow'] for m in members),
+        "leader": max(members, key=lambda m: m['change_pct']),
+        "verdict": verdict
+    }
+
+
+class SectorSnapshot(NamedTuple):
+    """板块快照"""
+    name: str
+    members: List[Dict[str, Any]]   # 各成分的 etf_flow 结果
+    failures: List[str]             # 获取失败的成分
+    summary: Dict[str, Any]         # summarize_sector 结果
+    fetched_at: float               # 刷新时间（Unix 秒）
+
+
+class SectorSnapshotScheduler(SnapshotScheduler):
+    """
+    板块快照调度器
+    
+    刷新节奏与指数快照相同，按板块成分所在市场的交易时段判断；
+    每次刷新并发获取板块内所有成分的行情和日K线。
+    """
+    
+    # 单只成分（行情+K线）的获取时限（秒）
+    FETCH_TIMEOUT = 10.0
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._quote_listeners: List[Callable[[str, str, Dict[str, Any]], None]] = []
+    
+    def add_quote_listener(self, listener: Callable[[str, str, Dict[str, Any]], None]):
+        """注册成分行情回调 (region, code, quote)，每次获取到成分行情时调用"""
+        self._quote_listeners.append(listener)
+    
+    def session(self, code: str, now: float) -> Tuple[bool, float]:
+        """板块以首个成分的市场判断交易时段"""
+        return market_state(get_sector(code)["members"][0]["region"], now)
+    
+    async def fetch_member(self, client, member: Dict[str, str]) -> Dict[str, Any]:
+        """获取单只成分并估算资金流向"""
+        quote, frame = await asyncio.wait_for(
+            asyncio.gather(
+                client.get_stock_quote(member["region"], member["code"]),
+                client.get_stock_kline_frame(
+                    region=member["region"],
+                    code=member["code"],
+                    period="day",
+                    limit=self.days + 1
+                )
+            ),
+            timeout=self.FETCH_TIMEOUT
+        )
+        if not quote:
+            raise Exception("获取行情失败")
+        for listener in self._quote_listeners:
+            listener(member["region"], member["code"], quote)
+        if len(frame) < 2:
+            raise Exception("获取K线失败")
+        
+        return {
+            "name": member.get("name", member["code"]),
+            "code": f"{member['region']}.{member['code']}",
+            **etf_flow(quote, frame, self.days)
+        }
+    
+    async def fetch(self, code: str, client) -> Optional[SectorSnapshot]:
+        """并发获取板块全部成分，全部失败时抛出汇总的错误"""
+        members = get_sector(code)["members"]
+        results = await asyncio.gather(
+            *[self.fetch_member(client, member) for member in members],
+            return_exceptions=True
+        )
+        
+        valid = []
+        failures = []
+        for member, result in zip(members, results):
+            if isinstance(result, asyncio.TimeoutError):
+                failures.append(f"{member.get('name', member['code'])}: 请求超时（>{self.FETCH_TIMEOUT}秒）")
+            elif isinstance(result, ItickAPIError):
+                failures.append(f"{member.get('name', member['code'])}: [{result.code}] {result.message}")
+            elif isinstance(result, Exception):
+                failures.append(f"{member.get('name', member['code'])}: {result}")
+            else:
+                valid.append(result)
+        
+        if not valid:
+            raise Exception("; ".join(failures))
+        return SectorSnapshot(code, valid, failures, summarize_sector(valid), time.time())
+    
+    async def get_or_fetch(self, code: str, client) -> SectorSnapshot:
+        """返回新鲜的快照，没有时立即获取并缓存"""
+        snapshot = self._snapshots.get(code)
+        if snapshot is not None and self.is_fresh(code, snapshot, time.time()):
+            return snapshot
+        
+        snapshot = await self.fetch(code, client)
+        self._snapshots[code] = snapshot
+        return snapshot
+
+
+# 全局调度器实例
+_scheduler: Optional[SectorSnapshotScheduler] = None
+
+
+def get_sector_scheduler() -> SectorSnapshotScheduler:
+    """获取全局板块快照调度器"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = SectorSnapshotScheduler(
+            list(load_registry()),
+            settings.sector_snapshot_interval,
+            settings.sector_snapshot_days
+        )
+    return _scheduler
@@ -3,22 +3,40 @@ iTick MCP Server - FastAPI Implementation
 基于 FastAPI 的 MCP 服务器，对接 iTick API
 """
 from fastapi import FastAPI, Request, HTTPException, Header
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Dict, Any, Optional
+import asyncio
+import json
 import logging
 
 from .config import settings
+from .compute import get_executor
+from .itick_client import close_clients
+from .tick_feed import get_tick_feed
+from .tick_bars import get_tick_bars
+from .bar_store import get_bar_store
+from .tick_flow import get_flow_engine
+from .tick_recorder import get_tick_recorder
+from .depth_book import get_depth_engine
+from .index_snapshots import get_snapshot_scheduler
+from .sectors import get_sector_scheduler
+from .sector_stream import get_sector_stream
+from .resources import ResourceError, get_resource_hub
 from .tools import (
     StockQuoteTool,
     StockKlineTool,
     StockTickTool,
     StockDepthTool,
+    DepthHistoryTool,
     TimestampTool,
     TechnicalIndicatorsTool,
+    BatchIndicatorsTool,
     MoneyFlowTool,
+    MoneyFlowRankTool,
     IndexAnalysisTool,
-    SectorAnalysisTool
+    SectorAnalysisTool,
+    SectorRotationTool
 )
 
 # 配置日志
@@ -50,13 +68,36 @@ TOOLS = [
     StockKlineTool,
     StockTickTool,
     StockDepthTool,
+    DepthHistoryTool,
     TimestampTool,
     TechnicalIndicatorsTool,
+    BatchIndicatorsTool,
     MoneyFlowTool,
+    MoneyFlowRankTool,
     IndexAnalysisTool,
-    SectorAnalysisTool
+    SectorAnalysisTool,
+    SectorRotationTool
 ]
 
+# 支持的 MCP 协议版本（首个为最新；structuredContent/outputSchema 自 2025-06-18 起）
+PROTOCOL_VERSIONS = ["2025-06-18", "2025-03-26", "2024-11-05"]
+
+# 通知流无消息时的保活间隔（秒）
+SSE_KEEPALIVE = 15.0
+
+
+def tool_definition(tool) -> Dict[str, Any]:
+    """工具的 MCP 定义，声明了 output_schema 的工具附带 outputSchema"""
+    definition = {
+        "name": tool.name,
+        "description": tool.description,
+        "inputSchema": tool.parameters
+    }
+    output_schema = getattr(tool, "output_schema", None)
+    if output_schema:
+        definition["outputSchema"] = output_schema
+    return definition
+
 
 def extract_api_key_from_header(request: Request) -> Optional[str]:
     """
@@ -82,6 +123,82 @@ def extract_api_key_from_header(request: Request) -> Optional[str]:
     return settings.itick_api_key or None
 
 
+def session_error(request: Request, request_id: Any = None) -> Optional[JSONResponse]:
+    """
+    检查请求是否属于有效会话
+    
+    Returns:
+        未携带 Mcp-Session-Id 时返回 400，会话不存在或已过期时返回 404（客户端应重新 initialize），有效时返回 None
+    """
+    session = request.headers.get("Mcp-Session-Id")
+    if not session:
+        code, message = 400, "缺少 Mcp-Session-Id，请使用 initialize 返回的会话 ID"
+    elif not get_resource_hub().touch(session):
+        code, message = 404, f"会话不存在或已过期: {session}，请重新 initialize"
+    else:
+        return None
+    return JSONResponse({
+        "jsonrpc": "2.0",
+        "error": {
+            "code": -32600,
+            "message": message
+        },
+        "id": request_id
+    }, status_code=code)
+
+
+@app.on_event("startup")
+async def startup_event():
+    """启动后台任务：逐笔成交采集、记录与秒级K线合成，盘口记录（关注列表非空或启用板块实时汇总时）、指数和板块快照刷新（启用时）"""
+    get_resource_hub()
+    
+    feed = get_tick_feed()
+    if settings.tick_recorder_enabled:
+        get_tick_recorder()
+    if settings.depth_recorder_enabled:
+        get_depth_engine()
+    if settings.sector_stream_enabled:
+        for region, code in get_sector_stream().symbols():
+            feed.subscribe(region, code)
+    
+    if feed.symbols:
+        get_flow_engine()
+        get_tick_bars()
+        feed.start()
+        logger.info(f"📡 逐笔成交采集已启动: {len(feed.symbols)} 只股票")
+        if settings.tick_recorder_enabled:
+            logger.info(f"💾 逐笔成交记录已启用: {settings.tick_recorder_dir}")
+        if settings.depth_recorder_enabled:
+            logger.info(f"💾 盘口记录已启用: {settings.depth_recorder_dir}")
+    
+    if settings.index_snapshot_enabled:
+        scheduler = get_snapshot_scheduler()
+        scheduler.start(settings.itick_api_key or None)
+        logger.info(f"🗓️ 指数快照刷新已启动: {len(scheduler.codes)} 个指数")
+    
+    if settings.sector_snapshot_enabled:
+        scheduler = get_sector_scheduler()
+        scheduler.start(settings.itick_api_key or None)
+        logger.info(f"🗓️ 板块快照刷新已启动: {len(scheduler.codes)} 个板块")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """停止后台任务，写回逐笔成交记录、秒级K线（包括尚未写入文件的）和盘口日志，关闭计算执行器"""
+    await get_tick_feed().stop()
+    await get_tick_bars().stop()
+    get_tick_bars().flush()
+    await get_bar_store().save_dirty()
+    if settings.tick_recorder_enabled:
+        get_tick_recorder().close()
+    if settings.depth_recorder_enabled:
+        get_depth_engine().close()
+    await get_snapshot_scheduler().stop()
+    await get_sector_scheduler().stop()
+    await close_clients()
+    get_executor().shutdown()
+
+
 @app.get("/health")
 async def health_check():
     """健康检查端点"""
@@ -105,14 +222,24 @@ async def mcp_endpoint(request: Request):
         
         logger.info(f"[MCP] 收到请求: method={method}, id={request_id}")
         
+        # 携带会话 ID 的请求刷新会话的活动时间
+        get_resource_hub().touch(request.headers.get("Mcp-Session-Id"))
+        
         # 处理 initialize 请求
         if method == "initialize":
+            # 客户端请求的版本受支持时沿用，否则返回最新版本
+            requested = body.get("params", {}).get("protocolVersion")
+            # 分配会话 ID，资源订阅和通知流按会话区分
             return JSONResponse({
                 "jsonrpc": "2.0",
                 "result": {
-                    "protocolVersion": "2024-11-05",
+                    "protocolVersion": requested if requested in PROTOCOL_VERSIONS else PROTOCOL_VERSIONS[0],
                     "capabilities": {
-                        "tools": {}
+                        "tools": {},
+                        "resources": {
+                            "subscribe": True,
+                            "listChanged": False
+                        }
                     },
                     "serverInfo": {
                         "name": "iTick MCP Server",
@@ -120,7 +247,7 @@ async def mcp_endpoint(request: Request):
                     }
                 },
                 "id": request_id
-            })
+            }, headers={"Mcp-Session-Id": get_resource_hub().open_session()})
         
         # 处理通知（没有 id 的消息，不需要响应）
         elif method == "notifications/initialized":
@@ -129,14 +256,7 @@ async def mcp_endpoint(request: Request):
         
         # 处理 tools/list 请求
         elif method == "tools/list":
-            tools_list = [
-                {
-                    "name": tool.name,
-                    "description": tool.description,
-                    "inputSchema": tool.parameters
-                }
-                for tool in TOOLS
-            ]
+            tools_list = [tool_definition(tool) for tool in TOOLS]
             
             return JSONResponse({
                 "jsonrpc": "2.0",
@@ -196,16 +316,74 @@ async def mcp_endpoint(request: Request):
                     "id": request_id
                 }, status_code=400)
         
-        # 不支持的资源和提示（返回空列表）
+        # 资源：本地缓存的K线序列（分页）
         elif method == "resources/list":
+            cursor = body.get("params", {}).get("cursor")
+            try:
+                resources, next_cursor = get_resource_hub().list_resources(cursor)
+            except ResourceError as e:
+                return JSONResponse({
+                    "jsonrpc": "2.0",
+                    "error": {
+                        "code": e.code,
+                        "message": e.message
+                    },
+                    "id": request_id
+                }, status_code=400)
+            
+            result = {"resources": resources}
+            if next_cursor:
+                result["nextCursor"] = next_cursor
+            return JSONResponse({
+                "jsonrpc": "2.0",
+                "result": result,
+                "id": request_id
+            })
+        
+        elif method == "resources/templates/list":
             return JSONResponse({
                 "jsonrpc": "2.0",
                 "result": {
-                    "resources": []
+                    "resourceTemplates": get_resource_hub().list_templates()
                 },
                 "id": request_id
             })
         
+        elif method in ("resources/read", "resources/subscribe", "resources/unsubscribe"):
+            uri = body.get("params", {}).get("uri", "")
+            hub = get_resource_hub()
+            # 订阅按会话记录，须携带 initialize 分配的会话 ID
+            if method != "resources/read":
+                error = session_error(request, request_id)
+                if error is not None:
+                    return error
+            try:
+                if method == "resources/read":
+                    result = {"contents": hub.read(uri)}
+                elif method == "resources/subscribe":
+                    hub.subscribe(request.headers["Mcp-Session-Id"], uri)
+                    result = {}
+                else:
+                    hub.unsubscribe(request.headers["Mcp-Session-Id"], uri)
+                    result = {}
+            except ResourceError as e:
+                return JSONResponse({
+                    "jsonrpc": "2.0",
+                    "error": {
+                        "code": e.code,
+                        "message": e.message,
+                        "data": {"uri": uri}
+                    },
+                    "id": request_id
+                }, status_code=400)
+            
+            return JSONResponse({
+                "jsonrpc": "2.0",
+                "result": result,
+                "id": request_id
+            })
+        
+        # 不支持的提示（返回空列表）
         elif method == "prompts/list":
             return JSONResponse({
                 "jsonrpc": "2.0",
@@ -239,6 +417,45 @@ async def mcp_endpoint(request: Request):
         }, status_code=500)
 
 
+@app.get("/mcp")
+async def mcp_stream(request: Request):
+    """
+    MCP 通知流（SSE）- 推送已订阅资源的 notifications/resources/updated
+    
+    须携带 initialize 分配的 Mcp-Session-Id，每个会话同时只有一个通知流。
+    """
+    error = session_error(request)
+    if error is not None:
+        return error
+    session = request.headers["Mcp-Session-Id"]
+    hub = get_resource_hub()
+    queue = hub.open_stream(session)
+    
+    async def events():
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: message\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+        finally:
+            hub.close_stream(session, queue)
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.delete("/mcp")
+async def mcp_end_session(request: Request):
+    """结束 MCP 会话，清除其资源订阅"""
+    error = session_error(request)
+    if error is not None:
+        return error
+    get_resource_hub().end_session(request.headers["Mcp-Session-Id"])
+    return JSONResponse({}, status_code=200)
+
+
 @app.get("/")
 async def root():
     """根路径 - 服务信息"""
@@ -0,0 +1,330 @@
+"""
+Tick Bars - 秒级K线合成
+由逐笔成交实时合成 1s/5s/15s/30s K线：每笔成交 O(1) 更新各周期正在形成的K线，
+完结的K线由后台任务定期批量写入 Bar Store；查询时可由逐笔成交记录回补引擎启动前的K线
+"""
+from typing import Dict, List, Optional, Tuple
+from bisect import bisect_right
+import asyncio
+import logging
+import numpy as np
+from .config import settings
+from .bar_store import get_bar_store
+from .kline_frame import KlineFrame
+from .resample import DAY_MS, SECOND_PERIODS, bucket_labels, local_offsets, market_session, resample, session_seconds
+from .tick_feed import Tick, get_tick_feed
+from .tick_recorder import get_tick_recorder
+
+logger = logging.getLogger(__name__)
+
+
+class BarBuilder:
+    """
+    单个周期正在形成的K线
+    
+    第一根K线开始于引擎收到第一笔成交的时刻，之前的成交没有观察到，因此丢弃；
+    since 为第一根完整K线的起始时间，即本地数据完整覆盖的起点。
+    """
+    
+    __slots__ = ("start", "o", "h", "l", "c", "v", "tu", "since", "flushed", "pending")
+    
+    def __init__(self):
+        self.start: Optional[int] = None
+        self.o = self.h = self.l = self.c = 0.0
+        self.v = self.tu = 0.0
+        self.since: Optional[int] = None
+        self.flushed: Optional[int] = None
+        self.pending: List[Tuple[int, float, float, float, float, float, float]] = []
+    
+    def add(self, start: int, price: float, volume: float):
+        """
+        计入一笔成交
+        
+        Args:
+            start: 成交所属K线的起始时间（毫秒）
+            price: 成交价
+            volume: 成交量
+        """
+        if start == self.start:
+            if price > self.h:
+                self.h = price
+            elif price < self.l:
+                self.l = price
+            self.c = price
+            self.v += volume
+            self.tu += price * volume
+            return
+        
+        if self.start is not None:
+            # 早于当前K线的成交（乱序）无法再计入
+            if start < self.start:
+                return
+            if self.since is None:
+                self.since = start
+            else:
+                self.pending.append(self.bar())
+        
+        self.start = start
+        self.o = self.h = self.l = self.c = price
+        self.v = volume
+        self.tu = price * volume
+    
+    def bar(self) -> Tuple[int, float, float, float, float, float, float]:
+        """正在形成的K线"""
+        return (self.start, self.o, self.h, self.l, self.c, self.v, self.tu)
+    
+    def frame(self, forming: bool = True) -> KlineFrame:
+        """尚未写入 Bar Store 的已完结K线，forming 为 True 时包括正在形成的一根"""
+        rows = self.pending + ([self.bar()] if forming and self.start is not None else [])
+        if not rows:
+            return KlineFrame.empty()
+        columns = list(zip(*rows))
+        return KlineFrame(
+            np.array(columns[0], dtype=np.int64),
+            *(np.array(column, dtype=np.float64) for column in columns[1:])
+        )
+
+
+class SymbolBars:
+    """单只股票各秒级周期的K线状态"""
+    
+    __slots__ = ("utc_day", "offset", "builders")
+    
+    def __init__(self):
+        self.utc_day = -1
+        self.offset = 0
+        self.builders: Dict[str, BarBuilder] = {period: BarBuilder() for period in SECOND_PERIODS}
+
+
+def ticks_to_bars(ticks: np.ndarray, period: str, region: str) -> KlineFrame:
+    """
+    把一段逐笔成交（TickRing 记录）合成为秒级K线
+    
+    Args:
+        ticks: 按时间升序的成交记录（t, price, volume 字段）
+        period: 秒级周期
+        region: 市场代码（决定时区和交易时段）
+    """
+    price = ticks["price"].astype(np.float64)
+    volume = ticks["volume"].astype(np.float64)
+    frame = KlineFrame(ticks["t"].astype(np.int64), price, price, price, price, volume, price * volume)
+    return resample(frame, period, region)
+
+
+class TickBarEngine:
+    """
+    秒级K线合成引擎
+    
+    订阅逐笔成交数据源。每笔成交只做常数次运算：时区偏移每个 UTC 日计算一次，
+    交易时段定位为几次比较，各周期只更新正在形成的一根K线。
+    完结的K线先缓存在内存，由后台任务每 FLUSH_INTERVAL 毫秒合并到 Bar Store，
+    文件写入交给计算执行器，成交回调和查询都不写文件。
+    写入的序列键为 ("stock", 市场, 代码, "5s") 等。
+    """
+    
+    # 完结K线写入 Bar Store 的间隔（毫秒）
+    FLUSH_INTERVAL = 30000
+    
+    def __init__(self):
+        self._symbols: Dict[Tuple[str, str], SymbolBars] = {}
+        self._sessions: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        # 已回补的成交时间范围: (市场, 代码, 周期) -> (最早成交时间, 结束时间)
+        self._backfilled: Dict[Tuple[str, str, str], Tuple[int, int]] = {}
+    
+    def _session_seconds(self, region: str) -> Tuple[List[int], List[int]]:
+        sessions = self._sessions.get(region)
+        if sessions is None:
+            starts, ends = session_seconds(market_session(region)[1])
+            sessions = (starts.tolist(), ends.tolist())
+            self._sessions[region] = sessions
+        return sessions
+    
+    def on_tick(self, tick: Tick):
+        """数据源回调：计入一笔成交"""
+        key = (tick.region, tick.code)
+        state = self._symbols.get(key)
+        if state is None:
+            state = SymbolBars()
+            self._symbols[key] = state
+        
+        utc_day = tick.t // DAY_MS
+        if utc_day != state.utc_day:
+            tz_name = market_session(tick.region)[0]
+            state.offset = int(local_offsets(np.array([tick.t], dtype=np.int64), tz_name)[0])
+            state.utc_day = utc_day
+        
+        # 与 bucket_labels 的秒级周期规则一致：时段外的成交归入前一个（或第一个）时段的边界K线
+        local = tick.t + state.offset
+        local_day = local // DAY_MS * DAY_MS
+        second = (local - local_day) // 1000
+        starts, ends = self._session_seconds(tick.region)
+        index = max(bisect_right(starts, second) - 1, 0)
+        offset = min(max(second - starts[index], 0), ends[index] - starts[index] - 1)
+        base = local_day - state.offset + starts[index] * 1000
+        
+        for period, builder in state.builders.items():
+            size = SECOND_PERIODS[period]
+            builder.add(base + offset // size * size * 1000, tick.price, tick.volume)
+        
+        if self._task is None:
+            self.start()
+    
+    def _flush_symbol(self, key: Tuple[str, str], state: SymbolBars, persist: bool = True):
+        """把一只股票已完结的K线写入 Bar Store（persist 为 False 时只更新内存，见 BarStore.put）"""
+        store = get_bar_store()
+        for period, builder in state.builders.items():
+            if not builder.pending:
+                continue
+            frame = builder.frame(forming=False)
+            start = builder.since if builder.flushed is None else builder.flushed + 1
+            builder.flushed = builder.start - 1
+            builder.pending = []
+            store.put(("stock", *key, period), frame, start, builder.flushed, persist=persist)
+    
+    def flush(self, region: Optional[str] = None, code: Optional[str] = None):
+        """
+        立即写入已完结的K线（同步写文件，用于停止服务时）
+        
+        Args:
+            region: 市场代码，为空时写入全部股票
+            code: 股票代码
+        """
+        if region is None:
+            for key, state in self._symbols.items():
+                self._flush_symbol(key, state)
+            return
+        key = (region.upper(), str(code))
+        if key in self._symbols:
+            self._flush_symbol(key, self._symbols[key])
+    
+    async def _run(self):
+        """后台写入循环：完结的K线合并到 Bar Store，文件由计算执行器写入"""
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL / 1000)
+            try:
+                for key, state in list(self._symbols.items()):
+                    self._flush_symbol(key, state, persist=False)
+                await get_bar_store().save_dirty()
+            except Exception as e:
+                logger.error(f"[TickBars] 写入K线失败: {str(e)}")
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def start(self):
+        """启动后台写入（已运行或不在事件循环中时忽略）"""
+        if self.running:
+            return
+        try:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        except RuntimeError:
+            pass
+    
+    async def stop(self):
+        """停止后台写入（之后调用 flush 写入剩余的K线）"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def backfill(self, region: str, code: str, period: str):
+        """
+        由逐笔成交记录合成引擎开始合成之前的K线并写入 Bar Store（本地已完整覆盖时不处理）
+        
+        先按环形文件的首尾时间检查覆盖情况，已回补过或 Bar Store 已覆盖时不读取成交。
+        环形文件已覆盖过最早记录时，第一根K线可能缺少成交，不计入。
+        """
+        if not settings.tick_recorder_enabled:
+            return
+        ring = get_tick_recorder().ring(region, code)
+        if ring is None or len(ring) == 0:
+            return
+        
+        # 只回补引擎已完整覆盖的起点之前的成交
+        state = self._symbols.get((region, code))
+        until = None
+        if state is not None and state.builders[period].start is not None:
+            builder = state.builders[period]
+            until = (builder.since or builder.start) - 1
+        
+        first = int(ring.first()["t"])
+        end = int(ring.last()["t"]) if until is None else until
+        if first > end:
+            return
+        
+        # 成交范围在之前回补过的范围内时无需重复合成
+        key = ("stock", region, code, period)
+        done = self._backfilled.get(key[1:])
+        if done is not None and done[0] <= first and done[1] >= end:
+            return
+        
+        store = get_bar_store()
+        labels, offsets = bucket_labels(np.array([first], dtype=np.int64), period, region)
+        if store.covers(key, int(labels[0] - offsets[0]), end):
+            self._backfilled[key[1:]] = (first, end)
+            return
+        
+        ticks = ring.between(None, until)
+        bars = ticks_to_bars(ticks, period, region)
+        if ring.written > ring.capacity:
+            bars = bars[1:]
+        if len(bars) > 0 and not store.covers(key, int(bars.t[0]), end):
+            store.put(key, bars, int(bars.t[0]), end)
+        self._backfilled[key[1:]] = (first, end)
+    
+    def query(
+        self,
+        region: str,
+        code: str,
+        period: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> KlineFrame:
+        """
+        获取秒级K线（本地数据，包括尚未写入 Bar Store 的K线和正在形成的最新一根，不触发写入）
+        
+        Args:
+            region: 市场代码
+            code: 股票代码
+            period: 秒级周期
+            start: 起始时间（毫秒）
+            end: 结束时间（毫秒）
+            limit: 返回最近的条数
+        
+        Returns:
+            KlineFrame，没有数据时为空
+        """
+        if period not in SECOND_PERIODS:
+            raise ValueError(f"不支持的秒级周期: {period}（可用: {', '.join(SECOND_PERIODS)}）")
+        region, code = region.upper(), str(code)
+        self.backfill(region, code, period)
+        
+        frame = get_bar_store().get(("stock", region, code, period))
+        if frame is None:
+            frame = KlineFrame.empty()
+        
+        state = self._symbols.get((region, code))
+        if state is not None:
+            frame = frame.merge(state.builders[period].frame())
+        
+        selected = frame.between(start, end)
+        return selected.tail(limit) if limit else selected
+
+
+# 全局引擎实例
+_engine: Optional[TickBarEngine] = None
+
+
+def get_tick_bars() -> TickBarEngine:
+    """获取全局秒级K线合成引擎（首次调用时订阅逐笔成交数据源）"""
+    global _engine
+    if _engine is None:
+        _engine = TickBarEngine()
+        get_tick_feed().add_listener(_engine.on_tick)
+    return _engine
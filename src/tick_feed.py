@@ -0,0 +1,243 @@
+"""
+Tick Feed - 逐笔成交数据源
+按关注列表轮询 iTick 最新成交，并分发给订阅者（资金流引擎、Tick记录器等）；
+有盘口订阅者时同时轮询盘口。工具调用发起的临时采集有时限和数量上限
+"""
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+import asyncio
+import logging
+import re
+import time
+from .config import settings
+from .itick_client import get_client, ItickAPIError
+
+logger = logging.getLogger(__name__)
+
+
+class Tick(NamedTuple):
+    """单笔成交"""
+    region: str
+    code: str
+    t: int          # 成交时间戳（毫秒）
+    price: float    # 成交价
+    volume: float   # 成交量
+
+
+# 支持的市场代码（与各工具 region 参数的 enum 一致）
+REGIONS = ("HK", "US", "SH", "SZ", "SG", "JP", "TW", "IN", "TH", "DE", "MX", "MY", "TR", "ES", "NL", "GB", "ID", "VN", "KR")
+
+# 股票代码只能包含字母、数字和点，且以字母或数字开头（代码用作本地记录的文件名，不能含路径分隔符）
+CODE_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9.]*")
+
+
+def valid_symbol(region: str, code: str) -> bool:
+    """市场代码和股票代码是否有效（可用于构建本地记录的文件路径）"""
+    return str(region).upper() in REGIONS and CODE_PATTERN.fullmatch(str(code)) is not None
+
+
+def parse_watchlist(value: str) -> List[Tuple[str, str]]:
+    """
+    解析关注列表配置
+    
+    Args:
+        value: 逗号分隔的 "市场.代码"，如 "SH.600519,HK.700"
+    
+    Returns:
+        [(市场, 代码), ...]
+    """
+    symbols = []
+    for item in value.split(","):
+        item = item.strip()
+        if "." in item:
+            region, code = item.split(".", 1)
+            symbols.append((region.strip().upper(), code.strip()))
+    return symbols
+
+
+class TickFeed:
+    """
+    逐笔成交数据源
+    
+    轮询只能取到每次请求时的最新一笔成交；接入推送源时调用 publish 即可，
+    订阅者无需区分数据来源。同一股票时间戳不增加的成交会被丢弃（重复轮询到同一笔）。
+    
+    关注列表分两类：subscribe 加入的常驻股票（配置的关注列表、板块成分股），
+    和 watch 加入的临时股票（工具调用发起，TICK_WATCH_TTL 秒内未再查询即移出）。
+    轮询只使用服务端配置的 API Key。
+    """
+    
+    def __init__(self, interval: float = 1.0):
+        """
+        初始化数据源
+        
+        Args:
+            interval: 轮询间隔（秒）
+        """
+        self.interval = interval
+        self.symbols: Set[Tuple[str, str]] = set()
+        self._listeners: List[Callable[[Tick], None]] = []
+        self._depth_listeners: List[Callable[[str, str, Dict[str, Any]], None]] = []
+        self._watched: Dict[Tuple[str, str], float] = {}
+        self._last_t: Dict[Tuple[str, str], int] = {}
+        self._task: Optional[asyncio.Task] = None
+    
+    def subscribe(self, region: str, code: str):
+        """加入关注列表"""
+        self.symbols.add((region.upper(), str(code)))
+    
+    def unsubscribe(self, region: str, code: str):
+        """移出关注列表（包括临时采集）"""
+        key = (region.upper(), str(code))
+        self.symbols.discard(key)
+        self._watched.pop(key, None)
+    
+    def watch(self, region: str, code: str, api_key: Optional[str] = None) -> Optional[str]:
+        """
+        临时采集一只股票（工具调用发起）；已在临时采集时续期
+        
+        调用方使用服务端以外的 API Key 时不发起采集，避免用一个用户的 Key 轮询其他人关注的股票。
+        
+        Args:
+            region: 市场代码
+            code: 股票代码
+            api_key: 调用方的 API Key
+        
+        Returns:
+            不能采集的原因，已在采集时为 None
+        """
+        key = (region.upper(), str(code))
+        if key in self.symbols:
+            return None
+        if not settings.itick_api_key:
+            return "服务端未配置 ITICK_API_KEY，不能后台采集逐笔成交"
+        if api_key and api_key != settings.itick_api_key:
+            return "后台采集只使用服务端的 API Key，使用其他 API Key 的请求不能发起采集；请让管理员把股票加入 TICK_WATCHLIST"
+        
+        self._expire()
+        if key not in self._watched and len(self._watched) >= settings.tick_watch_max:
+            return f"临时采集的股票已达上限（{settings.tick_watch_max} 只），请稍后再试或让管理员把股票加入 TICK_WATCHLIST"
+        if key not in self._watched:
+            logger.info(f"[TickFeed] 开始临时采集: {key[0]}.{key[1]}")
+        self._watched[key] = time.monotonic() + settings.tick_watch_ttl
+        self.start()
+        return None
+    
+    def watching(self, region: str, code: str) -> bool:
+        """是否在采集（常驻或未过期的临时采集）"""
+        key = (region.upper(), str(code))
+        return key in self.symbols or self._watched.get(key, 0) > time.monotonic()
+    
+    def _expire(self):
+        """移出过期的临时采集"""
+        now = time.monotonic()
+        for key in [key for key, expiry in self._watched.items() if expiry <= now]:
+            del self._watched[key]
+            logger.info(f"[TickFeed] 临时采集已过期: {key[0]}.{key[1]}")
+    
+    @property
+    def active(self) -> Set[Tuple[str, str]]:
+        """当前轮询的全部股票"""
+        return self.symbols | set(self._watched)
+    
+    def add_listener(self, listener: Callable[[Tick], None]):
+        """注册成交回调"""
+        self._listeners.append(listener)
+    
+    def add_depth_listener(self, listener: Callable[[str, str, Dict[str, Any]], None]):
+        """注册盘口回调 (region, code, depth)，注册后每次轮询同时获取关注列表的盘口"""
+        self._depth_listeners.append(listener)
+    
+    def publish(self, tick: Tick) -> bool:
+        """
+        分发一笔成交
+        
+        Returns:
+            是否为新成交（重复的成交不分发）
+        """
+        key = (tick.region, tick.code)
+        if tick.t <= self._last_t.get(key, 0):
+            return False
+        self._last_t[key] = tick.t
+        
+        for listener in self._listeners:
+            try:
+                listener(tick)
+            except Exception as e:
+                logger.error(f"[TickFeed] 回调处理失败: {tick.region}.{tick.code}, error={str(e)}")
+        return True
+    
+    async def poll_once(self):
+        """轮询一次关注列表中所有股票的最新成交（及盘口）"""
+        self._expire()
+        client = get_client(settings.itick_api_key or None)
+        symbols = list(self.active)
+        requests = [client.get_stock_tick(region, code) for region, code in symbols]
+        if self._depth_listeners:
+            requests += [client.get_stock_depth(region, code) for region, code in symbols]
+        responses = await asyncio.gather(*requests, return_exceptions=True)
+        
+        for (region, code), data in zip(symbols, responses[len(symbols):]):
+            if isinstance(data, ItickAPIError):
+                logger.warning(f"[TickFeed] 获取盘口失败: {region}.{code}, error={data.message}")
+                continue
+            if isinstance(data, Exception) or not data:
+                continue
+            for listener in self._depth_listeners:
+                try:
+                    listener(region, code, data)
+                except Exception as e:
+                    logger.error(f"[TickFeed] 盘口回调处理失败: {region}.{code}, error={str(e)}")
+        
+        for (region, code), data in zip(symbols, responses):
+            if isinstance(data, ItickAPIError):
+                logger.warning(f"[TickFeed] 获取Tick失败: {region}.{code}, error={data.message}")
+                continue
+            if isinstance(data, Exception) or not data:
+                continue
+            
+            price, volume, t = data.get("ld"), data.get("v"), data.get("t")
+            if price and volume and t:
+                self.publish(Tick(region, code, int(t), float(price), float(volume)))
+    
+    async def _run(self):
+        """轮询循环"""
+        while True:
+            if self.symbols or self._watched:
+                try:
+                    await self.poll_once()
+                except Exception as e:
+                    logger.error(f"[TickFeed] 轮询失败: {str(e)}")
+            await asyncio.sleep(self.interval)
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def start(self):
+        """启动后台轮询（已运行时忽略），使用服务端配置的 API Key"""
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        """停止后台轮询"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# 全局数据源实例
+_feed: Optional[TickFeed] = None
+
+
+def get_tick_feed() -> TickFeed:
+    """获取全局逐笔成交数据源"""
+    global _feed
+    if _feed is None:
+        _feed = TickFeed(settings.tick_poll_interval)
+        for region, code in parse_watchlist(settings.tick_watchlist):
+            _feed.subscribe(region, code)
+    return _feed
@@ -0,0 +1,236 @@
+"""
+Tick Flow Engine - 逐笔资金流向引擎
+按单笔成交额划分资金级别，按价格相对前一笔成交/盘口推断主动买卖方向，
+维护每只股票当日的累计资金流向
+"""
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import time
+import pytz
+from .resample import market_session
+from .tick_feed import Tick, get_tick_feed
+
+
+# 单笔成交额分级 (级别, 最低成交额)，从大到小排列
+ORDER_LEVELS = [
+    ("super_large", 500000),   # 超大单 ≥50万
+    ("large", 200000),         # 大单 20-50万
+    ("medium", 50000),         # 中单 5-20万
+    ("small", 0),              # 小单 <5万
+]
+
+LEVELS = tuple(level for level, _ in ORDER_LEVELS)
+
+
+def classify_notional(amount: float) -> int:
+    """
+    按单笔成交额划分资金级别
+    
+    Returns:
+        ORDER_LEVELS 中的级别序号
+    """
+    for index, (_, threshold) in enumerate(ORDER_LEVELS):
+        if amount >= threshold:
+            return index
+    return len(ORDER_LEVELS) - 1
+
+
+def trade_side(
+    price: float,
+    prev_price: Optional[float],
+    prev_side: int,
+    bid: Optional[float] = None,
+    ask: Optional[float] = None
+) -> int:
+    """
+    推断成交的主动方向（Lee-Ready 算法）
+    
+    有盘口时与买卖中间价比较，高于中间价为主动买、低于为主动卖；
+    无盘口或恰好等于中间价时使用 tick rule：高于前一笔为买、低于为卖，
+    价格不变时沿用前一笔的方向。
+    
+    Returns:
+        1=主动买入, -1=主动卖出, 0=无法判断
+    """
+    if bid and ask and ask >= bid:
+        mid = (bid + ask) / 2
+        if price > mid:
+            return 1
+        if price < mid:
+            return -1
+    
+    if prev_price is None:
+        return 0
+    if price > prev_price:
+        return 1
+    if price < prev_price:
+        return -1
+    return prev_side
+
+
+def session_bounds(t: int, region: str) -> Tuple[int, int]:
+    """获取时间戳所在的当地自然日区间（UTC毫秒）"""
+    tz = pytz.timezone(market_session(region)[0])
+    local = datetime.fromtimestamp(t / 1000, tz)
+    day = datetime(local.year, local.month, local.day)
+    start = tz.localize(day)
+    end = tz.localize(day + timedelta(days=1))
+    return int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+
+
+class FlowAccumulator:
+    """单只股票当日的累计资金流向"""
+    
+    __slots__ = (
+        "day_start", "day_end", "inflow", "outflow", "neutral",
+        "buy_volume", "sell_volume", "trades", "first_t", "last_t"
+    )
+    
+    def __init__(self, day_start: int, day_end: int):
+        self.day_start = day_start
+        self.day_end = day_end
+        self.inflow = [0.0] * len(ORDER_LEVELS)
+        self.outflow = [0.0] * len(ORDER_LEVELS)
+        self.neutral = 0.0
+        self.buy_volume = 0.0
+        self.sell_volume = 0.0
+        self.trades = 0
+        self.first_t = 0
+        self.last_t = 0
+    
+    def add(self, t: int, price: float, volume: float, side: int):
+        """累加一笔成交"""
+        amount = price * volume
+        level = classify_notional(amount)
+        if side > 0:
+            self.inflow[level] += amount
+            self.buy_volume += volume
+        elif side < 0:
+            self.outflow[level] += amount
+            self.sell_volume += volume
+        else:
+            self.neutral += amount
+        
+        self.trades += 1
+        if not self.first_t:
+            self.first_t = t
+        self.last_t = t
+    
+    def snapshot(self) -> Dict[str, object]:
+        """
+        导出累计结果
+        
+        Returns:
+            与 MoneyFlowTool.analyze_flow 相同结构的总流入/流出和各级别 (流入, 流出)，
+            另含中性成交额、主动买卖量、成交笔数和时间范围
+        """
+        result: Dict[str, object] = {
+            "total_inflow": sum(self.inflow),
+            "total_outflow": sum(self.outflow)
+        }
+        for index, level in enumerate(LEVELS):
+            result[level] = (self.inflow[index], self.outflow[index])
+        
+        result.update({
+            "neutral": self.neutral,
+            "buy_volume": self.buy_volume,
+            "sell_volume": self.sell_volume,
+            "trades": self.trades,
+            "first_t": self.first_t,
+            "last_t": self.last_t
+        })
+        return result
+
+
+class TickFlowEngine:
+    """
+    逐笔资金流向引擎
+    
+    每笔成交 O(1) 更新对应股票的累计值，查询时直接返回累计结果。
+    进入新的交易日时自动清零。
+    """
+    
+    def __init__(self, quote_ttl: int = 5000):
+        """
+        初始化引擎
+        
+        Args:
+            quote_ttl: 盘口报价的有效期（毫秒），超过后回退到 tick rule
+        """
+        self.quote_ttl = quote_ttl
+        self._accumulators: Dict[Tuple[str, str], FlowAccumulator] = {}
+        self._last_trade: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self._quotes: Dict[Tuple[str, str], Tuple[float, float, int]] = {}
+    
+    def update_quote(self, region: str, code: str, bid: float, ask: float, t: int):
+        """
+        更新最优买卖价（供 Lee-Ready 判断方向）
+        
+        Args:
+            region: 市场代码
+            code: 股票代码
+            bid: 买一价
+            ask: 卖一价
+            t: 报价时间戳（毫秒）
+        """
+        self._quotes[(region.upper(), str(code))] = (bid, ask, t)
+    
+    def on_tick(self, tick: Tick):
+        """处理一笔成交"""
+        key = (tick.region, tick.code)
+        
+        accumulator = self._accumulators.get(key)
+        if accumulator is None or tick.t >= accumulator.day_end:
+            accumulator = FlowAccumulator(*session_bounds(tick.t, tick.region))
+            self._accumulators[key] = accumulator
+        elif tick.t < accumulator.day_start:
+            return
+        
+        bid = ask = None
+        quote = self._quotes.get(key)
+        if quote is not None and abs(tick.t - quote[2]) <= self.quote_ttl:
+            bid, ask = quote[0], quote[1]
+        
+        prev_price, prev_side = self._last_trade.get(key, (None, 0))
+        side = trade_side(tick.price, prev_price, prev_side, bid, ask)
+        self._last_trade[key] = (tick.price, side)
+        
+        accumulator.add(tick.t, tick.price, tick.volume, side)
+    
+    def snapshot(self, region: str, code: str, now: Optional[int] = None) -> Optional[Dict[str, object]]:
+        """
+        获取股票当日累计资金流向
+        
+        Args:
+            region: 市场代码
+            code: 股票代码
+            now: 当前时间（毫秒），默认为系统时间
+        
+        Returns:
+            累计结果，未采集到成交或累计的不是当日（如采集已停止）时返回 None
+        """
+        region = region.upper()
+        accumulator = self._accumulators.get((region, str(code)))
+        if accumulator is None or accumulator.trades == 0:
+            return None
+        day_start, _ = session_bounds(int(time.time() * 1000) if now is None else now, region)
+        if accumulator.last_t < day_start:
+            return None
+        return accumulator.snapshot()
+    
+    def symbols(self) -> List[Tuple[str, str]]:
+        """已有累计数据的股票"""
+        return list(self._accumulators)
+
+
+# 全局引擎实例
+_engine: Optional[TickFlowEngine] = None
+
+
+def get_flow_engine() -> TickFlowEngine:
+    """获取全局逐笔资金流向引擎（首次调用时订阅逐笔成交数据源）"""
+    global _engine
+    if _engine is None:
+        _engine = TickFlowEngine()
+        get_tick_feed().add_listener(_engine.on_tick)
+    return _engine
@@ -0,0 +1,292 @@
+"""
+Tick Recorder - 逐笔成交记录器
+把逐笔成交数据源分发的成交写入每只股票一个的定长内存映射环形文件，
+按时间二分查找，读取结果为映射文件上的 NumPy 视图（不复制）
+"""
+from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+from datetime import datetime
+import logging
+import mmap
+import numpy as np
+import pytz
+from .config import settings
+from .resample import market_session
+from .tick_feed import Tick, get_tick_feed, valid_symbol
+from .tick_flow import trade_side
+
+logger = logging.getLogger(__name__)
+
+
+# 单条成交记录（紧凑排列，25字节）
+RECORD_DTYPE = np.dtype([
+    ("t", "<i8"),           # 成交时间戳（毫秒）
+    ("price", "<f8"),       # 成交价
+    ("volume", "<f8"),      # 成交量
+    ("side", "i1")          # 1=主动买入, -1=主动卖出, 0=无法判断
+])
+
+# 文件头（64字节）
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("capacity", "<i8"),    # 环形容量（条）
+    ("written", "<i8"),     # 累计写入条数
+    ("reserved", "<i8", (5,))
+])
+
+MAGIC = b"ITKTICK1"
+
+
+class TickRing:
+    """
+    单只股票的环形成交文件
+    
+    写满后覆盖最早的记录。成交按时间递增写入（不递增的成交被丢弃），
+    因此环中的数据从最早一条起按时间有序，最多分为两段连续的内存。
+    """
+    
+    def __init__(self, path: Path, capacity: int, writable: bool = True):
+        """
+        打开或创建环形文件
+        
+        Args:
+            path: 文件路径
+            capacity: 新建文件的容量（已有文件沿用文件头中的容量）
+            writable: 是否可写；只读打开时不创建文件，文件不存在或损坏时抛出 ValueError
+        
+        Raises:
+            ValueError: 只读打开的文件不存在或损坏
+        """
+        self.path = path
+        self.writable = writable
+        size = HEADER_DTYPE.itemsize + capacity * RECORD_DTYPE.itemsize
+        
+        fresh = True
+        if path.is_file():
+            with open(path, "rb") as f:
+                raw = f.read(HEADER_DTYPE.itemsize)
+            header = np.frombuffer(raw, dtype=HEADER_DTYPE) if len(raw) == HEADER_DTYPE.itemsize else []
+            if len(header) == 1 and header[0]["magic"] == MAGIC:
+                existing = int(header[0]["capacity"])
+                if path.stat().st_size == HEADER_DTYPE.itemsize + existing * RECORD_DTYPE.itemsize:
+                    size = HEADER_DTYPE.itemsize + existing * RECORD_DTYPE.itemsize
+                    fresh = False
+            if fresh and writable:
+                logger.warning(f"[TickRecorder] 文件损坏，重新创建: {path}")
+        
+        if not writable:
+            if fresh:
+                raise ValueError(f"环形文件不存在或已损坏: {path}")
+            self._file = open(path, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if fresh:
+                with open(path, "wb") as f:
+                    f.truncate(size)
+            self._file = open(path, "r+b")
+            self._mmap = mmap.mmap(self._file.fileno(), size)
+        self._header = np.frombuffer(self._mmap, dtype=HEADER_DTYPE, count=1)
+        if fresh:
+            self._header[0] = (MAGIC, capacity, 0, np.zeros(5))
+        self.capacity = int(self._header[0]["capacity"])
+        self._records = np.frombuffer(
+            self._mmap, dtype=RECORD_DTYPE, count=self.capacity, offset=HEADER_DTYPE.itemsize
+        )
+    
+    @property
+    def written(self) -> int:
+        return int(self._header[0]["written"])
+    
+    def __len__(self) -> int:
+        return min(self.written, self.capacity)
+    
+    def first(self) -> Optional[np.void]:
+        """最早一条记录"""
+        written = self.written
+        if not written:
+            return None
+        return self._records[written % self.capacity if written > self.capacity else 0]
+    
+    def last(self) -> Optional[np.void]:
+        """最新一条记录"""
+        written = self.written
+        return self._records[(written - 1) % self.capacity] if written else None
+    
+    def append(self, t: int, price: float, volume: float, side: int) -> bool:
+        """
+        写入一条成交
+        
+        Returns:
+            是否写入（时间戳不晚于最新记录时丢弃）
+        """
+        last = self.last()
+        if last is not None and t <= last["t"]:
+            return False
+        written = self.written
+        self._records[written % self.capacity] = (t, price, volume, side)
+        self._header[0]["written"] = written + 1
+        return True
+    
+    def segments(self) -> List[np.ndarray]:
+        """按时间顺序的连续段（视图）：未写满时一段，写满后两段"""
+        written = self.written
+        if written <= self.capacity:
+            return [self._records[:written]]
+        head = written % self.capacity
+        return [self._records[head:], self._records[:head]]
+    
+    @staticmethod
+    def _join(parts: List[np.ndarray]) -> np.ndarray:
+        """只有一段非空时直接返回视图，跨越环形末尾时拼接（复制）"""
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+    
+    def tail(self, n: int) -> np.ndarray:
+        """最近 n 条成交"""
+        parts = []
+        for segment in reversed(self.segments()):
+            if n <= 0:
+                break
+            parts.insert(0, segment[-n:])
+            n -= len(segment)
+        return self._join(parts)
+    
+    def between(self, start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+        """时间范围 [start, end] 内的成交（每段内二分查找）"""
+        parts = []
+        for segment in self.segments():
+            times = segment["t"]
+            lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+            hi = len(segment) if end is None else int(np.searchsorted(times, end, side="right"))
+            parts.append(segment[lo:hi])
+        return self._join(parts)
+    
+    def flush(self):
+        if self.writable:
+            self._mmap.flush()
+    
+    def close(self):
+        """关闭映射（仍有外部视图引用时由垃圾回收释放）"""
+        self._header = self._records = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+
+class TickRecorder:
+    """
+    逐笔成交记录器
+    
+    订阅逐笔成交数据源，每只股票一个环形文件（目录/市场/代码.ticks）。
+    数据在映射文件中，常驻内存只有各文件的映射句柄，股票数量和记录时长不会让内存无限增长。
+    主动买卖方向按 tick rule 由环中上一笔成交推断。
+    """
+    
+    def __init__(self, directory: str, capacity: int = 100000):
+        """
+        初始化记录器
+        
+        Args:
+            directory: 环形文件目录
+            capacity: 每只股票保留的成交条数
+        """
+        self.directory = Path(directory)
+        self.capacity = capacity
+        self._rings: Dict[Tuple[str, str], TickRing] = {}
+    
+    def path(self, region: str, code: str) -> Optional[Path]:
+        """环形文件路径，代码无效时为 None"""
+        if not valid_symbol(region, code):
+            return None
+        return self.directory / region.upper() / f"{code}.ticks"
+    
+    def ring(self, region: str, code: str, create: bool = False) -> Optional[TickRing]:
+        """
+        获取股票的环形文件
+        
+        Args:
+            region: 市场代码
+            code: 股票代码
+            create: 不存在时是否创建（可写打开）；否则只读打开，不存在、损坏或代码无效时返回 None
+        """
+        key = (region.upper(), str(code))
+        path = self.path(*key)
+        if path is None:
+            return None
+        
+        # 查询时只读打开，记录器写入时再换为可写
+        ring = self._rings.get(key)
+        if ring is not None and create and not ring.writable:
+            ring.close()
+            ring = None
+        if ring is None and (create or path.is_file()):
+            try:
+                ring = TickRing(path, self.capacity, writable=create)
+            except ValueError as e:
+                logger.warning(f"[TickRecorder] {str(e)}")
+                return None
+            self._rings[key] = ring
+        return ring
+    
+    def on_tick(self, tick: Tick):
+        """数据源回调：写入一笔成交"""
+        ring = self.ring(tick.region, tick.code, create=True)
+        if ring is None:
+            return
+        last = ring.last()
+        if last is None:
+            side = trade_side(tick.price, None, 0)
+        else:
+            side = trade_side(tick.price, float(last["price"]), int(last["side"]))
+        ring.append(tick.t, tick.price, tick.volume, side)
+    
+    def symbols(self) -> List[Tuple[str, str]]:
+        """有记录的股票"""
+        if not self.directory.is_dir():
+            return []
+        return sorted((path.parent.name, path.stem) for path in self.directory.glob("*/*.ticks"))
+    
+    def close(self):
+        """写回并关闭所有环形文件"""
+        for ring in self._rings.values():
+            ring.flush()
+            ring.close()
+        self._rings.clear()
+
+
+def local_time_ms(region: str, date: str, time_str: str) -> int:
+    """
+    市场当地时间转换为毫秒时间戳
+    
+    Args:
+        region: 市场代码（决定时区）
+        date: 日期 YYYYMMDD
+        time_str: 时间 HH:MM 或 HH:MM:SS
+    """
+    tz = pytz.timezone(market_session(region)[0])
+    layout = "%Y%m%d %H:%M:%S" if time_str.count(":") == 2 else "%Y%m%d %H:%M"
+    return int(tz.localize(datetime.strptime(f"{date} {time_str}", layout)).timestamp() * 1000)
+
+
+def local_date(region: str, t: int) -> str:
+    """毫秒时间戳在市场当地的日期 YYYYMMDD"""
+    tz = pytz.timezone(market_session(region)[0])
+    return datetime.fromtimestamp(t / 1000, tz).strftime("%Y%m%d")
+
+
+# 全局记录器实例
+_recorder: Optional[TickRecorder] = None
+
+
+def get_tick_recorder() -> TickRecorder:
+    """获取全局逐笔成交记录器（首次调用时订阅逐笔成交数据源）"""
+    global _recorder
+    if _recorder is None:
+        _recorder = TickRecorder(settings.tick_recorder_dir, settings.tick_recorder_capacity)
+        get_tick_feed().add_listener(_recorder.on_tick)
+    return _recorder
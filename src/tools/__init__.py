@@ -6,20 +6,28 @@ from .stock_quote import StockQuoteTool
 from .stock_kline import StockKlineTool
 from .stock_tick import StockTickTool
 from .stock_depth import StockDepthTool
+from .depth_history import DepthHistoryTool
 from .timestamp import TimestampTool
 from .technical_indicators import TechnicalIndicatorsTool
+from .batch_indicators import BatchIndicatorsTool
 from .money_flow import MoneyFlowTool
+from .money_flow_rank import MoneyFlowRankTool
 from .index_analysis import IndexAnalysisTool
 from .sector_analysis import SectorAnalysisTool
+from .sector_rotation import SectorRotationTool
 
 __all__ = [
     "StockQuoteTool",
     "StockKlineTool",
     "StockTickTool",
     "StockDepthTool",
+    "DepthHistoryTool",
     "TimestampTool",
     "TechnicalIndicatorsTool",
+    "BatchIndicatorsTool",
     "MoneyFlowTool",
+    "MoneyFlowRankTool",
     "IndexAnalysisTool",
-    "SectorAnalysisTool"
+    "SectorAnalysisTool",
+    "SectorRotationTool"
 ]
@@ -0,0 +1,268 @@
+"""
+Batch Technical Indicators Tool - 批量技术指标工具
+一次计算多只个股的技术指标，并发获取K线并向量化计算，输出对比表
+"""
+from typing import Dict, Any, Optional, List
+from datetime import datetime
+import asyncio
+import numpy as np
+from ..itick_client import get_client, ItickAPIError
+from .. import indicators as ind
+from ..kline_frame import KlineFrame
+from ..compute import get_executor
+from .technical_indicators import TechnicalIndicatorsTool
+
+
+class BatchIndicatorsTool:
+    """批量技术指标工具 - 多只股票的指标横向对比"""
+    
+    name = "itick_technical_indicators_batch"
+    description = """批量计算【多只个股】的技术指标（MACD、RSI、KDJ、BOLL、MA），输出横向对比表。
+
+⚠️ **重要提示 - 工具适用范围**:
+- ✅ 适用于: 多只个股的选股筛选、横向对比（如"对比这20只股票的RSI"）
+- ❌ 单只个股的详细指标解读 → 请使用 itick_technical_indicators
+- ❌ 不适用于: 大盘指数 → 请使用 itick_index_analysis
+
+📊 **对比字段**:
+- 最新价、区间涨跌幅
+- MA5 / MA20 均线
+- RSI(14)
+- MACD 的 DIF、DEA 及金叉/死叉
+- KDJ 的 J 值
+- BOLL %B（价格在布林带中的位置，0=下轨，100=上轨）
+
+⚡ **性能说明**:
+- 所有股票的K线并发获取（受客户端限流保护）
+- 各股票的K线按序号右对齐成二维矩阵（不按时间戳合并，不同市场互不影响），一次向量化计算全部股票的指标
+- 单只股票获取失败不影响其他股票，失败原因会列出
+
+💡 **示例查询**:
+- "比较茅台、五粮液、泸州老窖的RSI和MACD"
+- "筛选这30只半导体股票中处于超卖区域的"
+"""
+
+    parameters = {
+        "type": "object",
+        "properties": {
+            "symbols": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "region": {
+                            "type": "string",
+                            "description": "市场代码。HK=香港, US=美国, SH=上海, SZ=深圳等"
+                        },
+                        "code": {
+                            "type": "string",
+                            "description": "股票代码（不含市场后缀）"
+                        },
+                        "name": {
+                            "type": "string",
+                            "description": "股票名称（可选，用于显示）"
+                        }
+                    },
+                    "required": ["region", "code"]
+                },
+                "description": "股票列表。例如: [{region:'SH', code:'600519', name:'茅台'}, {region:'HK', code:'700', name:'腾讯'}]",
+                "minItems": 1,
+                "maxItems": 100
+            },
+            "period": {
+                "type": "string",
+                "enum": ["1min", "5min", "15min", "30min", "60min", "day", "week", "month"],
+                "description": "K线周期",
+                "default": "day"
+            },
+            "precision": {
+                "type": "number",
+                "description": "EMA类指标（MACD）的收敛精度",
+                "default": 0.001,
+                "minimum": TechnicalIndicatorsTool.MIN_PRECISION,
+                "maximum": TechnicalIndicatorsTool.MAX_PRECISION
+            }
+        },
+        "required": ["symbols"]
+    }
+    
+    @staticmethod
+    def compute(series: List[KlineFrame]) -> Dict[str, np.ndarray]:
+        """
+        按K线序号右对齐多只股票的K线并一次性计算全部指标
+        
+        每只股票只使用自身的K线（不按时间戳合并），结果与单只股票的
+        itick_technical_indicators 一致，不受其他股票交易日历的影响。
+        
+        Args:
+            series: 各股票的K线数据
+        
+        Returns:
+            各指标的最新值数组（按 series 顺序）
+        """
+        closes = ind.align_right([s.c for s in series])
+        highs = ind.align_right([s.h for s in series])
+        lows = ind.align_right([s.l for s in series])
+        
+        macd = ind.macd(closes, *TechnicalIndicatorsTool.MACD_PARAMS)
+        boll = ind.boll(closes, TechnicalIndicatorsTool.BOLL_PERIOD)
+        kdj = ind.kdj(highs, lows, closes, TechnicalIndicatorsTool.KDJ_PERIOD)
+        
+        last = closes[:, -1]
+        first = np.array([s.c[0] if len(s) else np.nan for s in series])
+        upper, lower = boll["upper"][:, -1], boll["lower"][:, -1]
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change_pct = (last - first) / first * 100
+            percent_b = (last - lower) / (upper - lower) * 100
+        
+        return {
+            "last": last,
+            "change_pct": change_pct,
+            "ma5": ind.latest(ind.sma(closes, 5)),
+            "ma20": ind.latest(ind.sma(closes, 20)),
+            "rsi": ind.latest(ind.rsi(closes, TechnicalIndicatorsTool.RSI_PERIOD)),
+            "dif": ind.latest(macd["dif"]),
+            "dea": ind.latest(macd["dea"]),
+            "j": ind.latest(kdj["j"]),
+            "percent_b": percent_b
+        }
+    
+    @staticmethod
+    def _fmt(value: float, spec: str = ".2f") -> str:
+        """格式化数值，NaN 显示为 -"""
+        return "-" if value is None or np.isnan(value) else format(value, spec)
+    
+    @staticmethod
+    async def run(arguments: Dict[str, Any], api_key: Optional[str] = None) -> Dict[str, Any]:
+        """执行批量技术指标计算"""
+        try:
+            symbols = arguments.get("symbols", [])
+            period = arguments.get("period", "day")
+            precision = arguments.get("precision", 0.001)
+            
+            symbols = [s for s in symbols if s.get("region") and s.get("code")]
+            if not symbols:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": "❌ 缺少必需参数：symbols（股票列表）\n\n示例: [{\"region\": \"SH\", \"code\": \"600519\", \"name\": \"茅台\"}]"
+                    }],
+                    "isError": True
+                }
+            
+            precision_error = TechnicalIndicatorsTool.validate_precision(precision)
+            if precision_error:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": precision_error
+                    }],
+                    "isError": True
+                }
+            precision = float(precision)
+            
+            # 对比表需要 MACD 和 MA20，按全部指标规划K线条数
+            limit = TechnicalIndicatorsTool.plan_lookback(["all"], precision)
+            
+            # 并发获取所有股票的K线，限流由客户端统一控制
+            client = get_client(api_key)
+            responses = await asyncio.gather(*[
+                client.get_stock_kline_frame(
+                    region=str(s["region"]),
+                    code=str(s["code"]),
+                    period=period,
+                    limit=limit
+                )
+                for s in symbols
+            ], return_exceptions=True)
+            
+            valid = []
+            series = []
+            failures = []
+            
+            for symbol, response in zip(symbols, responses):
+                label = symbol.get("name") or f"{symbol['region']}.{symbol['code']}"
+                if isinstance(response, ItickAPIError):
+                    failures.append(f"{label}: [{response.code}] {response.message}")
+                elif isinstance(response, Exception):
+                    failures.append(f"{label}: {response}")
+                elif len(response) == 0:
+                    failures.append(f"{label}: 无K线数据")
+                else:
+                    valid.append(label)
+                    series.append(response)
+            
+            if not series:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": "❌ 未能获取任何股票的K线数据\n\n" + "\n".join(f"- {f}" for f in failures)
+                    }],
+                    "isError": True
+                }
+            
+            # 向量化计算释放 GIL，数据量大时放到线程池，避免阻塞事件循环
+            metrics = await get_executor().run(
+                BatchIndicatorsTool.compute,
+                series,
+                size=sum(len(s) for s in series)
+            )
+            fmt = BatchIndicatorsTool._fmt
+            
+            output = f"""## 📊 批量技术指标对比
+
+**周期**: {period} | **股票数量**: {len(valid)}/{len(symbols)}
+
+| 股票 | K线条数 | 最新价 | 区间涨跌 | MA5 | MA20 | RSI | DIF | DEA | MACD | KDJ-J | BOLL %B |
+|------|---------|--------|---------|-----|------|-----|-----|-----|------|-------|---------|
+"""
+
+            for i, label in enumerate(valid):
+                dif, dea = metrics["dif"][i], metrics["dea"][i]
+                if np.isnan(dif) or np.isnan(dea):
+                    cross = "-"
+                else:
+                    cross = "🟢金叉" if dif >= dea else "🔴死叉"
+                
+                output += (
+                    f"| {label} | {len(series[i])} | {fmt(metrics['last'][i])} | {fmt(metrics['change_pct'][i], '+.2f')}% "
+                    f"| {fmt(metrics['ma5'][i])} | {fmt(metrics['ma20'][i])} | {fmt(metrics['rsi'][i])} "
+                    f"| {fmt(dif, '.4f')} | {fmt(dea, '.4f')} | {cross} "
+                    f"| {fmt(metrics['j'][i])} | {fmt(metrics['percent_b'][i], '.1f')} |\n"
+                )
+            
+            if failures:
+                output += "\n**⚠️ 获取失败**:\n" + "\n".join(f"- {f}" for f in failures) + "\n"
+            
+            output += """
+---
+**📌 阅读提示**: RSI>70超买、<30超卖；KDJ-J>100超买、<0超卖；BOLL %B>100突破上轨、<0跌破下轨
+
+**⚠️ 风险提示**: 技术指标仅供参考，不构成投资建议。
+
+*计算时间: """ + datetime.now().strftime('%Y-%m-%d %H:%M:%S') + "*"
+
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": output
+                }]
+            }
+        
+        except ItickAPIError as e:
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": f"❌ iTick API 错误: [{e.code}] {e.message}"
+                }],
+                "isError": True
+            }
+        except Exception as e:
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": f"❌ 系统错误: {str(e)}"
+                }],
+                "isError": True
+            }
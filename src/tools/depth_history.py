@@ -0,0 +1,420 @@
+"""
+Depth History Tool - 盘口历史工具
+回放本地记录的盘口变化，分析一段时间内的价差、委比走势及某一价位挂单的持续情况
+"""
+from typing import Dict, Any, Optional, List, Tuple
+from datetime import datetime
+import time
+import numpy as np
+import pytz
+from ..config import settings
+from ..depth_book import ASK, BID, get_depth_engine, sample_grid
+from ..resample import market_session
+from ..tick_recorder import local_date, local_time_ms
+from ..output_format import OUTPUT_FORMAT_PARAM, table_result, table_schema, validate_format
+
+
+def _mean(values: np.ndarray) -> Optional[float]:
+    """忽略 NaN 的平均值，没有有效值时为 None"""
+    finite = values[np.isfinite(values)]
+    return float(finite.mean()) if len(finite) else None
+
+
+def _reduce(values: np.ndarray, reducer) -> Optional[float]:
+    """对有效值（非 NaN）求统计量，没有有效值时为 None"""
+    finite = values[np.isfinite(values)]
+    return float(reducer(finite)) if len(finite) else None
+
+
+def session_ranges(region: str, day: str) -> List[Tuple[int, int]]:
+    """
+    某日各交易时段的起止时间（毫秒时间戳，结束不含）
+    
+    Args:
+        region: 市场代码
+        day: 日期 YYYYMMDD
+    """
+    def at(minute: int) -> int:
+        if minute >= 1440:
+            return local_time_ms(region, day, "23:59:59") + 1000
+        return local_time_ms(region, day, f"{minute // 60:02d}:{minute % 60:02d}")
+    
+    return [(at(open_minute), at(close_minute)) for open_minute, close_minute in market_session(region)[1]]
+
+
+class DepthHistoryTool:
+    """盘口历史工具 - 价差/委比时间序列与价位挂单持续性"""
+    
+    name = "itick_depth_history"
+    description = """回放【个股】本地记录的盘口历史，分析一段时间内买卖力量的变化。
+
+⚠️ **重要提示 - 使用前提**:
+- 需服务端开启盘口记录（DEPTH_RECORDER_ENABLED=true），且股票在采集列表（TICK_WATCHLIST）中
+- 只能查询开始记录之后的数据；当前盘口请使用 itick_stock_depth
+
+📊 **数据内容**:
+- 按时段（默认把区间等分为12段）的中间价、平均价差、委比均值及范围、买卖挂单量
+- 区间整体的价差和委比统计（按持续时间加权）
+- 指定 price 时：该价位挂单在区间内存在的时间占比、首次出现时间、持续存在的起始时间和挂单量变化
+
+💡 **主要用途**:
+- 判断大单托盘/压盘是否持续存在（如"1800元的买单墙是不是一上午都在"）
+- 观察买卖力量在盘中的此消彼长
+- 分析流动性（价差）在不同时段的变化
+
+💡 **示例查询**:
+- "茅台(600519.SH)今天上午1800元的买单一直都在吗？"
+- "腾讯(700.HK)今天10点到11点的委比变化"
+
+🧾 **输出格式** (output_format): markdown(默认) / json / csv / columnar-json，机器可读格式每个时段一行
+"""
+    
+    parameters = {
+        "type": "object",
+        "properties": {
+            "region": {
+                "type": "string",
+                "description": "股票所属市场代码。HK=香港, US=美国, SH=上海, SZ=深圳等",
+                "enum": ["HK", "US", "SH", "SZ", "SG", "JP", "TW", "IN", "TH", "DE", "MX", "MY", "TR", "ES", "NL", "GB", "ID", "VN", "KR"]
+            },
+            "code": {
+                "type": "string",
+                "description": "股票代码（不含市场后缀）。例如: 600519(茅台), 700(腾讯)"
+            },
+            "date": {
+                "type": "string",
+                "description": "日期 YYYYMMDD（可选，默认为最近一次盘口记录所在的交易日）",
+                "pattern": "^\\d{8}$"
+            },
+            "start_time": {
+                "type": "string",
+                "description": "起始时间，市场当地时间 HH:MM 或 HH:MM:SS（可选，默认从当日开盘或第一条记录开始，取较晚者）",
+                "pattern": "^\\d{2}:\\d{2}(:\\d{2})?$"
+            },
+            "end_time": {
+                "type": "string",
+                "description": "结束时间（含），市场当地时间 HH:MM 或 HH:MM:SS（可选，默认到当日收盘或最后一条记录，取较早者）。起止时间都不指定时只统计交易时段内（不含午休）",
+                "pattern": "^\\d{2}:\\d{2}(:\\d{2})?$"
+            },
+            "price": {
+                "type": "number",
+                "description": "关注的价位（可选）。返回该价位买盘/卖盘挂单在区间内的持续情况"
+            },
+            "levels": {
+                "type": "integer",
+                "description": "计算委比的档位数，默认5",
+                "default": 5,
+                "minimum": 1,
+                "maximum": 10
+            },
+            "windows": {
+                "type": "integer",
+                "description": "把区间等分的时段数，默认12",
+                "default": 12,
+                "minimum": 1,
+                "maximum": 48
+            },
+            "output_format": OUTPUT_FORMAT_PARAM
+        },
+        "required": ["region", "code"]
+    }
+    
+    # 机器可读输出的列：时段起止、时段末中间价、平均价差、委比均值/最低/最高、平均买卖挂单量、关注价位的平均挂单量
+    COLUMNS = {
+        "t": "integer",
+        "end": "integer",
+        "mid": "number",
+        "spread_bps": "number",
+        "imbalance": "number",
+        "imbalance_min": "number",
+        "imbalance_max": "number",
+        "bid_depth": "number",
+        "ask_depth": "number",
+        "price_volume": "number"
+    }
+    
+    output_schema = table_schema(
+        {
+            "region": {"type": "string"},
+            "code": {"type": "string"},
+            "levels": {"type": "integer"},
+            "start": {"type": "integer", "description": "区间起始（毫秒时间戳）"},
+            "end": {"type": "integer", "description": "区间结束（毫秒时间戳）"},
+            "events": {"type": "integer", "description": "区间内记录到的盘口变化次数"},
+            "price": {"type": ["number", "null"]},
+            "level": {
+                "type": ["object", "null"],
+                "description": "关注价位的持续情况：side, presence(存在时间占比), first_seen, present_since, volume_min, volume_max, volume_last"
+            }
+        },
+        COLUMNS
+    )
+    
+    @staticmethod
+    def level_summary(grid: np.ndarray, volume: np.ndarray, side: int) -> Dict[str, Any]:
+        """
+        价位挂单在采样网格上的持续情况
+        
+        Args:
+            grid: 网格时间戳
+            volume: 每个网格点该价位的挂单量
+            side: BID 或 ASK
+        """
+        present = volume > 0
+        absent = np.flatnonzero(~present)
+        since = None
+        if present[-1]:
+            since = int(grid[absent[-1] + 1]) if len(absent) else int(grid[0])
+        return {
+            "side": "bid" if side == BID else "ask",
+            "presence": float(present.mean()),
+            "first_seen": int(grid[np.argmax(present)]) if present.any() else None,
+            "present_since": since,
+            "volume_min": float(volume[present].min()) if present.any() else 0.0,
+            "volume_max": float(volume.max()),
+            "volume_last": float(volume[-1])
+        }
+    
+    @staticmethod
+    def format_markdown(
+        region: str,
+        code: str,
+        meta: Dict[str, Any],
+        columns: Dict[str, Any],
+        summary: Dict[str, Any]
+    ) -> str:
+        """生成盘口历史的 markdown 报告"""
+        tz = pytz.timezone(market_session(region)[0])
+        
+        def time_of(t: int, layout: str = "%H:%M:%S") -> str:
+            return datetime.fromtimestamp(t / 1000, tz).strftime(layout)
+        
+        def pct(value: Optional[float]) -> str:
+            return "—" if value is None or not np.isfinite(value) else f"{value * 100:+.1f}%"
+        
+        def num(value: Optional[float], layout: str = "{:.2f}") -> str:
+            return "—" if value is None or not np.isfinite(value) else layout.format(value)
+        
+        rows = "".join(
+            f"| {time_of(t, '%H:%M')}~{time_of(end, '%H:%M')} | {num(mid, '{:g}')} | {num(spread)} "
+            f"| {pct(imbalance)} | {pct(low)} ~ {pct(high)} | {num(bid, '{:,.0f}')} | {num(ask, '{:,.0f}')} |\n"
+            for t, end, mid, spread, imbalance, low, high, bid, ask in zip(
+                columns["t"], columns["end"], columns["mid"], columns["spread_bps"], columns["imbalance"],
+                columns["imbalance_min"], columns["imbalance_max"], columns["bid_depth"], columns["ask_depth"]
+            )
+        )
+        
+        level_text = ""
+        level = meta["level"]
+        if meta["price"] is not None:
+            if level is None:
+                level_text = f"\n**价位 {meta['price']:g}**\n- ❌ 区间内买卖盘的可见档位中都没有出现过该价位\n"
+            else:
+                side = "买盘" if level["side"] == "bid" else "卖盘"
+                lines = [f"- 出现在{side}的时间占比: {level['presence'] * 100:.1f}%"]
+                if level["presence"] >= 1:
+                    lines.append("- ✅ 整个区间内一直存在")
+                elif level["present_since"] is not None:
+                    lines.append(
+                        f"- 首次出现: {time_of(level['first_seen'])}，自 {time_of(level['present_since'])} 起持续存在至区间结束"
+                    )
+                else:
+                    lines.append(f"- 首次出现: {time_of(level['first_seen'])}，区间结束时已不在盘口")
+                lines.append(
+                    f"- 挂单量: {level['volume_min']:,.0f} ~ {level['volume_max']:,.0f}，区间结束时 {level['volume_last']:,.0f}"
+                )
+                level_text = f"\n**价位 {meta['price']:g}**\n" + "\n".join(lines) + "\n"
+        
+        return f"""## 📚 盘口历史
+
+**股票信息**
+- 📌 代码: {code}
+- 🌍 市场: {region}
+- ⏰ 时间范围: {time_of(meta['start'], '%Y-%m-%d %H:%M:%S')} ~ {time_of(meta['end'])}（当地时间）
+- 🧾 盘口变化: {meta['events']} 次
+
+**区间概况**（按持续时间加权）
+- 价差: 平均 {num(summary['spread_mean'])} bp | 最小 {num(summary['spread_min'])} bp | 最大 {num(summary['spread_max'])} bp
+- 前{meta['levels']}档委比: 平均 {pct(summary['imbalance_mean'])} | 最低 {pct(summary['imbalance_min'])} | 最高 {pct(summary['imbalance_max'])} | 结束时 {pct(summary['imbalance_last'])}
+- 中间价: {num(summary['mid_first'], '{:g}')} → {num(summary['mid_last'], '{:g}')}
+{level_text}
+**分时段**
+
+| 时段 | 中间价 | 价差(bp) | 委比均值 | 委比范围 | 买量均值 | 卖量均值 |
+|------|--------|----------|----------|----------|----------|----------|
+{rows}
+---
+*数据来源: 本地盘口记录（只含可见档位，价位移出可见档位与撤单无法区分）*
+*说明: 委比 = (买量 - 卖量) / (买量 + 卖量)，正值表示买盘挂单多于卖盘*
+"""
+    
+    @staticmethod
+    async def run(arguments: Dict[str, Any], api_key: Optional[str] = None) -> Dict[str, Any]:
+        """执行盘口历史查询"""
+        try:
+            region = arguments.get("region")
+            code = arguments.get("code")
+            date = arguments.get("date")
+            start_time = arguments.get("start_time")
+            end_time = arguments.get("end_time")
+            price = arguments.get("price")
+            levels = int(arguments.get("levels", 5))
+            windows = int(arguments.get("windows", 12))
+            output_format = arguments.get("output_format", "markdown")
+            
+            if not region or not code:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": "❌ 缺少必需参数：region（市场代码）和 code（股票代码）"
+                    }],
+                    "isError": True
+                }
+            
+            format_error = validate_format(output_format)
+            if format_error:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": format_error
+                    }],
+                    "isError": True
+                }
+            
+            region_str = str(region).upper()
+            code_str = str(code)
+            
+            if not settings.depth_recorder_enabled:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": "❌ 服务端未开启盘口记录，无法查询盘口历史\n\n请设置 DEPTH_RECORDER_ENABLED=true，并把股票加入 TICK_WATCHLIST"
+                    }],
+                    "isError": True
+                }
+            
+            engine = get_depth_engine()
+            log = engine.log(region_str, code_str)
+            if log is None or not log.last_t:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": f"❌ 本地没有 {region_str}.{code_str} 的盘口记录\n\n请把该股票加入 TICK_WATCHLIST（如 {region_str}.{code_str}）后等待采集"
+                    }],
+                    "isError": True
+                }
+            
+            day = str(date) if date else local_date(region_str, log.last_t)
+            day_start = local_time_ms(region_str, day, "00:00")
+            day_end = local_time_ms(region_str, day, "23:59:59") + 999
+            start = local_time_ms(region_str, day, str(start_time)) if start_time else day_start
+            end = local_time_ms(region_str, day, str(end_time)) if end_time else day_end
+            no_records = {
+                "content": [{
+                    "type": "text",
+                    "text": f"❌ {day} 所选时间段内没有 {region_str}.{code_str} 的盘口记录"
+                }],
+                "isError": True
+            }
+            
+            # 从关键帧开始读取，关键帧可能早于当日；默认区间只看当日的记录
+            history = engine.history(region_str, code_str, min(start, day_start), max(end, day_end))
+            if history is None or len(history) == 0:
+                return no_records
+            day_t = history.t[(history.t >= day_start) & (history.t <= day_end)]
+            if len(day_t) == 0:
+                return no_records
+            
+            # 未指定时默认为交易时段内有记录的部分；交易时段内没有记录时为当日第一条到最后一条记录
+            sessions = session_ranges(region_str, day)
+            opening, closing = sessions[0][0], sessions[-1][1] - 1
+            in_session = day_t[(day_t >= opening) & (day_t <= closing)]
+            if not start_time:
+                start = max(opening, int(day_t[0])) if len(in_session) else int(day_t[0])
+            if not end_time:
+                end = min(closing, int(day_t[-1])) if len(in_session) else int(day_t[-1])
+            
+            # 当日第一条记录之前的盘口来自之前的交易日，区间结束不晚于当前时间
+            start = max(start, int(day_t[0]))
+            end = min(end, int(time.time() * 1000))
+            if end <= start:
+                return no_records
+            
+            series = history.series(levels)
+            grid, index = sample_grid(series["t"], start, end)
+            step = int(grid[1] - grid[0]) if len(grid) > 1 else 1000
+            if not start_time and not end_time:
+                # 只统计交易时段（不含午休和盘前盘后）
+                keep = np.zeros(len(grid), dtype=bool)
+                for session_start, session_end in sessions:
+                    keep |= (grid >= session_start) & (grid < session_end)
+                if keep.any():
+                    grid, index = grid[keep], index[keep]
+            sampled = {name: values[index] for name, values in series.items() if name != "t"}
+            
+            # 关注价位：取存在时间更长的一侧
+            level = None
+            volume = np.full(len(grid), np.nan)
+            if price is not None:
+                best = None
+                for side in (BID, ASK):
+                    side_volume = history.level(side, float(price))[index]
+                    if (side_volume > 0).any() and (best is None or (side_volume > 0).mean() > (best[1] > 0).mean()):
+                        best = (side, side_volume)
+                if best is not None:
+                    level = DepthHistoryTool.level_summary(grid, best[1], best[0])
+                    volume = best[1]
+            
+            # 按网格点等分时段（网格等间隔，即按交易时间等分），各时段内按网格点求平均（即按持续时间加权）
+            parts: List[np.ndarray] = [part for part in np.array_split(np.arange(len(grid)), windows) if len(part)]
+            bounds = [(int(grid[part[0]]), min(int(grid[part[-1]]) + step, end)) for part in parts]
+            columns = {
+                "t": [window_start for window_start, _ in bounds],
+                "end": [window_end for _, window_end in bounds],
+                "mid": [_reduce(sampled["mid"][part], lambda v: v[-1]) for part in parts],
+                "spread_bps": [_mean(sampled["spread_bps"][part]) for part in parts],
+                "imbalance": [_mean(sampled["imbalance"][part]) for part in parts],
+                "imbalance_min": [_reduce(sampled["imbalance"][part], np.min) for part in parts],
+                "imbalance_max": [_reduce(sampled["imbalance"][part], np.max) for part in parts],
+                "bid_depth": [_mean(sampled["bid_depth"][part]) for part in parts],
+                "ask_depth": [_mean(sampled["ask_depth"][part]) for part in parts],
+                "price_volume": [_mean(volume[part]) for part in parts]
+            }
+            
+            summary = {
+                "spread_mean": _mean(sampled["spread_bps"]),
+                "spread_min": _reduce(sampled["spread_bps"], np.min),
+                "spread_max": _reduce(sampled["spread_bps"], np.max),
+                "imbalance_mean": _mean(sampled["imbalance"]),
+                "imbalance_min": _reduce(sampled["imbalance"], np.min),
+                "imbalance_max": _reduce(sampled["imbalance"], np.max),
+                "imbalance_last": float(sampled["imbalance"][-1]),
+                "mid_first": _reduce(sampled["mid"], lambda v: v[0]),
+                "mid_last": _reduce(sampled["mid"], lambda v: v[-1])
+            }
+            
+            meta = {
+                "region": region_str,
+                "code": code_str,
+                "levels": levels,
+                "start": start,
+                "end": end,
+                "events": int(np.count_nonzero((series["t"] >= start) & (series["t"] <= end))),
+                "price": float(price) if price is not None else None,
+                "level": level
+            }
+            return table_result(
+                meta,
+                columns,
+                output_format,
+                lambda: DepthHistoryTool.format_markdown(region_str, code_str, meta, columns, summary)
+            )
+        
+        except Exception as e:
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": f"❌ 系统错误: {str(e)}"
+                }],
+                "isError": True
+            }
@@ -4,7 +4,16 @@ Index Analysis Tool - 指数分析工具
 """
 from typing import Dict, Any, Optional, List
 from datetime import datetime
+import asyncio
+import numpy as np
 from ..itick_client import get_client, ItickAPIError
+from ..kline_frame import KlineFrame
+from ..downsample import downsample
+from ..compute import get_executor
+from ..index_snapshots import get_snapshot_scheduler
+from .. import indicators as ind
+from .. import volatility as vol
+from ..resample import index_region
 
 
 class IndexAnalysisTool:
@@ -42,8 +51,8 @@ class IndexAnalysisTool:
 
 💡 **核心功能**:
 - 实时指数行情（最新点位、涨跌幅）
-- 历史走势分析（区间涨跌、波动率）
-- 多指数对比（强弱排名、相关性）
+- 历史走势分析（区间涨跌、年化波动率：收盘价/EWMA/Parkinson/Garman-Klass）
+- 多指数对比（强弱排名、收益率相关性、相对基准的Beta和滚动相对强弱）
 - 市场情绪判断（牛熊态势、风险评估）
 - 成交量能分析（量价配合、资金活跃度）
 
@@ -84,6 +93,10 @@ class IndexAnalysisTool:
 - "分析标普500和纳斯达克的走势"
 - "对比A股、港股、美股三大市场"
 
+🧭 **走势序列**: 指定 max_points 时每个指数附上收盘价走势（按 LTTB 降采样到不超过该点数）
+
+⚡ **快照加速**: 服务端开启指数快照后，常用指数直接使用后台定时刷新的行情（报告中标注刷新时间）
+
 ⚠️ **注意事项**:
 - 指数代码不需要市场前缀（直接用000001，不是SH.000001）
 - region参数会被自动设置为'GB'（指数API的标准）
@@ -133,6 +146,23 @@ class IndexAnalysisTool:
                 "type": "boolean",
                 "description": "是否进行多指数对比分析",
                 "default": True
+            },
+            "benchmark": {
+                "type": "string",
+                "description": "对比分析的基准指数代码（用于计算Beta和相对强弱），默认为列表中第一个指数"
+            },
+            "rs_window": {
+                "type": "integer",
+                "description": "滚动相对强弱的窗口（K线数）",
+                "default": 20,
+                "minimum": 2,
+                "maximum": 120
+            },
+            "max_points": {
+                "type": "integer",
+                "description": "在报告中附上每个指数的走势序列，最多该点数（可选）。K线更多时按收盘价 LTTB 降采样，保留走势形状",
+                "minimum": 5,
+                "maximum": 250
             }
         },
         "required": ["indices"]
@@ -156,6 +186,12 @@ class IndexAnalysisTool:
         "道琼斯": {"region": "US", "code": "DJI"},
     }
     
+    # 同时获取的指数数量上限
+    MAX_CONCURRENT_INDICES = 16
+    
+    # 单个指数（行情+K线）的获取超时（秒）
+    FETCH_TIMEOUT = 10.0
+    
     @staticmethod
     def judge_market_sentiment(change_pct: float, volume_ratio: float = 1.0) -> str:
         """
@@ -190,27 +226,283 @@ class IndexAnalysisTool:
         else:
             return "🔴 大幅下跌(市场恐慌，规避风险)"
     
+    # 滚动波动率窗口（K线数，不超过已有的收益率个数）
+    VOL_WINDOW = 20
+    
+    @staticmethod
+    def calculate_volatility(frame: KlineFrame, period: str = "day", region: str = "SH") -> Dict[str, float]:
+        """
+        计算年化波动率（%）
+        
+        Args:
+            frame: K线数据
+            period: K线周期（决定年化因子）
+            region: 指数所属市场
+        
+        Returns:
+            period: 整个区间的收盘价波动率; close/ewma/parkinson/garman_klass: 各估计量的最新值;
+            window: 滚动窗口
+        """
+        if len(frame) < 3:
+            return {"period": 0.0, "window": 0}
+        
+        window = min(IndexAnalysisTool.VOL_WINDOW, len(frame) - 1)
+        series = vol.frame_volatility(frame, period, region, window)
+        whole = vol.close_to_close(frame.c[None, :], len(frame) - 1)[0, -1]
+        scale = np.sqrt(vol.periods_per_year(period, region)) * 100
+        
+        result = {name: float(values[-1]) for name, values in series.items()}
+        result["period"] = float(whole * scale)
+        result["window"] = window
+        return result
+    
+    @staticmethod
+    def compare_matrix(frames: List[KlineFrame], benchmark: int, window: int) -> Dict[str, np.ndarray]:
+        """
+        多指数收益率相关性、Beta 和滚动相对强弱
+        
+        各指数收盘价按时间戳对齐成矩阵，以矩阵运算一次得到所有指数对的结果。
+        
+        Args:
+            frames: 各指数的K线
+            benchmark: 基准指数在 frames 中的位置
+            window: 滚动相对强弱窗口
+        
+        Returns:
+            corr: 相关系数矩阵; beta: 各指数相对基准的Beta;
+            rs: 最新相对强弱(%); rs_prev: 5期前的相对强弱(%); samples: 与基准的共同样本数
+        """
+        _, filled, returns, mask = ind.aligned_returns([f.t for f in frames], [f.c for f in frames])
+        corr, beta = ind.pairwise_corr_beta(returns, mask)
+        rs = ind.relative_strength(filled, benchmark, window)
+        
+        return {
+            "corr": corr,
+            "beta": beta[:, benchmark],
+            "rs": ind.latest(rs),
+            "rs_prev": rs[:, -6] if rs.shape[1] > 5 else np.full(len(frames), np.nan),
+            "samples": (mask & mask[benchmark]).sum(axis=1)
+        }
+    
+    @staticmethod
+    async def fetch_index(client, index_info: Dict[str, Any], period: str, days: int) -> Dict[str, Any]:
+        """
+        并发获取单个指数的实时行情和历史K线
+        
+        Args:
+            client: iTick 客户端
+            index_info: 指数信息 {code, region, name}
+            period: K线周期
+            days: K线数量
+        
+        Returns:
+            指数分析结果；行情获取失败或超时时包含 error，仅K线失败时包含 history_error
+        """
+        code = index_info.get("code")
+        region = index_info.get("region", "")  # region现在是可选的，仅用于显示
+        name = index_info.get("name", code)  # 默认用代码作为名称
+        
+        # 后台快照新鲜时直接使用，日线且条数足够时K线也取自快照
+        snapshot = get_snapshot_scheduler().get(str(code))
+        
+        async def quote() -> Dict[str, Any]:
+            if snapshot is not None:
+                return snapshot.quote
+            # 注意：iTick的指数API统一使用region='GB'
+            return await client.get_index_quote(code=str(code), region="GB")
+        
+        async def kline() -> KlineFrame:
+            if snapshot is not None and period == "day" and len(snapshot.frame) >= days:
+                return snapshot.frame.tail(days)
+            return await client.get_index_kline_frame(
+                code=str(code),
+                region="GB",
+                period=period,
+                limit=days
+            )
+        
+        timeout = IndexAnalysisTool.FETCH_TIMEOUT
+        try:
+            # 行情和K线分别限时，K线超时不影响已获取的行情
+            quote_data, frame = await asyncio.gather(
+                asyncio.wait_for(quote(), timeout=timeout),
+                asyncio.wait_for(kline(), timeout=timeout),
+                return_exceptions=True
+            )
+            
+            if isinstance(quote_data, Exception):
+                raise quote_data
+            
+            # 检查quote_data是否为None或空
+            if not quote_data:
+                raise Exception(f"API返回空数据，可能是指数代码不正确")
+            
+            history_error = None
+            if isinstance(frame, asyncio.TimeoutError):
+                history_error = f"请求超时（>{timeout}秒）"
+                frame = KlineFrame.empty()
+            elif isinstance(frame, Exception):
+                history_error = frame.message if isinstance(frame, ItickAPIError) else str(frame)
+                frame = KlineFrame.empty()
+            
+            result = IndexAnalysisTool.build_result(name, region, code, quote_data, frame, period)
+            if history_error:
+                result["history_error"] = history_error
+            if snapshot is not None:
+                result["snapshot_at"] = snapshot.fetched_at
+            return result
+        
+        except asyncio.TimeoutError:
+            error = f"请求超时（>{timeout}秒）"
+        except ItickAPIError as e:
+            error = f"[{e.code}] {e.message}"
+        except Exception as e:
+            error = str(e)
+        
+        return {
+            "name": name,
+            "region": region,
+            "code": code,
+            "error": error
+        }
+    
     @staticmethod
-    def calculate_volatility(kline_data: List[Dict[str, Any]]) -> float:
-        """计算波动率（标准差）"""
-        if len(kline_data) < 2:
-            return 0.0
+    def build_result(
+        name: str,
+        region: str,
+        code: str,
+        quote_data: Dict[str, Any],
+        frame: KlineFrame,
+        period: str = "day"
+    ) -> Dict[str, Any]:
+        """由行情和K线整理单个指数的分析结果"""
+        # 提取关键数据
+        latest_price = quote_data.get('ld', 0)
+        open_price = quote_data.get('o', 0)
+        high_price = quote_data.get('h', 0)
+        low_price = quote_data.get('l', 0)
+        volume = quote_data.get('v', 0)
+        turnover = quote_data.get('tu', 0)
+        change = quote_data.get('ch', 0)
+        change_pct = quote_data.get('chp', 0)
         
-        changes = []
-        for i in range(1, len(kline_data)):
-            prev_close = float(kline_data[i-1].get('c', 0))
-            curr_close = float(kline_data[i].get('c', 0))
-            if prev_close:
-                change = (curr_close - prev_close) / prev_close * 100
-                changes.append(change)
+        # 时间戳
+        timestamp = quote_data.get('t', 0)
+        if timestamp:
+            time_str = datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            time_str = 'N/A'
+        
+        # 计算历史数据
+        period_change = 0
+        volatility = {"period": 0.0, "window": 0}
+        
+        if len(frame) >= 2:
+            first_close = float(frame.c[0])
+            last_close = float(frame.c[-1])
+            period_change = (last_close - first_close) / first_close * 100
+            
+            # 计算波动率
+            volatility = IndexAnalysisTool.calculate_volatility(frame, period, index_region(str(code)))
         
-        if not changes:
-            return 0.0
+        # 判断市场情绪
+        sentiment = IndexAnalysisTool.judge_market_sentiment(change_pct, 1.0)
         
-        # 计算标准差
-        mean = sum(changes) / len(changes)
-        variance = sum((x - mean) ** 2 for x in changes) / len(changes)
-        return variance ** 0.5
+        return {
+            "name": name,
+            "region": region,
+            "code": code,
+            "latest_price": latest_price,
+            "open_price": open_price,
+            "high_price": high_price,
+            "low_price": low_price,
+            "volume": volume,
+            "turnover": turnover,
+            "change": change,
+            "change_pct": change_pct,
+            "time": time_str,
+            "period_change": period_change,
+            "volatility": volatility["period"],
+            "volatility_detail": volatility,
+            "sentiment": sentiment,
+            "kline_count": len(frame),
+            "frame": frame
+        }
+    
+    @staticmethod
+    def format_trend(frame: KlineFrame, period: str, max_points: int) -> str:
+        """
+        收盘价走势序列（超过 max_points 时按 LTTB 降采样）
+        
+        Args:
+            frame: K线数据
+            period: K线周期（决定日期格式）
+            max_points: 最多点数
+            
+        Returns:
+            如 "01-02 3050.12 → 01-05 3071.40 → ..."
+        """
+        sampled = downsample(frame, max_points, "lttb")
+        time_format = '%Y-%m' if period == "month" else '%m-%d'
+        points = " → ".join(
+            f"{datetime.fromtimestamp(t / 1000).strftime(time_format)} {c:.2f}"
+            for t, c in zip(sampled.t.tolist(), sampled.c.tolist())
+        )
+        note = f"（LTTB {len(frame)}→{len(sampled)}点）" if len(sampled) < len(frame) else ""
+        return points + note
+    
+    @staticmethod
+    def format_comparison(results: List[Dict[str, Any]], benchmark: int, window: int, stats: Dict[str, np.ndarray]) -> str:
+        """生成相关性矩阵和相对基准表现的报告段落"""
+        def cell(value: float, spec: str = ".2f") -> str:
+            return "-" if np.isnan(value) else format(value, spec)
+        
+        names = [str(r['name']) for r in results]
+        corr = stats["corr"]
+        
+        output = """### 🔗 收益率相关性矩阵
+
+| 指数 | """ + " | ".join(names) + " |\n|------|" + "|".join("------" for _ in names) + "|\n"
+        for i, name in enumerate(names):
+            output += f"| {name} | " + " | ".join(cell(v) for v in corr[i]) + " |\n"
+        
+        # 相关性最高/最低的指数对（上三角）
+        upper = np.triu_indices(len(names), k=1)
+        pairs = corr[upper]
+        if np.isfinite(pairs).any():
+            high = int(np.nanargmax(pairs))
+            low = int(np.nanargmin(pairs))
+            output += f"""
+- 🤝 联动最紧密: {names[upper[0][high]]} ↔ {names[upper[1][high]]} ({pairs[high]:.2f})
+- 🔀 联动最弱: {names[upper[0][low]]} ↔ {names[upper[1][low]]} ({pairs[low]:.2f})
+"""
+        
+        output += f"""
+### 📐 相对基准表现（基准: {names[benchmark]}）
+
+| 指数 | Beta | 相关系数 | {window}期相对强弱 | 强弱趋势 | 共同样本 |
+|------|------|---------|-------------------|---------|---------|
+"""
+        for i, name in enumerate(names):
+            if i == benchmark:
+                continue
+            rs, rs_prev = stats["rs"][i], stats["rs_prev"][i]
+            if np.isnan(rs) or np.isnan(rs_prev):
+                trend = "-"
+            else:
+                trend = "⬆️ 走强" if rs > rs_prev else "⬇️ 走弱" if rs < rs_prev else "➡️ 持平"
+            output += (
+                f"| {name} | {cell(stats['beta'][i])} | {cell(corr[i, benchmark])} "
+                f"| {cell(rs, '+.2f')}% | {trend} | {int(stats['samples'][i])} |\n"
+            )
+        
+        output += """
+**📌 说明**: 基于对数收益率；各市场交易日不同，只使用双方都有K线的交易日。Beta>1 表示波动大于基准，相对强弱>0 表示窗口内跑赢基准
+
+---
+
+"""
+        return output
     
     @staticmethod
     async def run(arguments: Dict[str, Any], api_key: Optional[str] = None) -> Dict[str, Any]:
@@ -220,6 +512,9 @@ class IndexAnalysisTool:
             period = arguments.get("period", "day")
             days = arguments.get("days", 30)
             compare = arguments.get("compare", True)
+            benchmark_code = arguments.get("benchmark")
+            rs_window = int(arguments.get("rs_window", 20))
+            max_points = arguments.get("max_points")
             
             if not indices:
                 return {
@@ -232,94 +527,16 @@ class IndexAnalysisTool:
             
             client = get_client(api_key)
             
-            # 收集所有指数数据
-            index_results = []
+            # 所有指数的行情和K线并发获取，单个指数失败或超时不影响其他指数
+            semaphore = asyncio.Semaphore(IndexAnalysisTool.MAX_CONCURRENT_INDICES)
             
-            for index_info in indices:
-                code = index_info.get("code")
-                region = index_info.get("region", "")  # region现在是可选的，仅用于显示
-                name = index_info.get("name", code)  # 默认用代码作为名称
-                
-                if not code:
-                    continue  # 只检查code，region不再必需
-                
-                try:
-                    # 获取实时行情 - 使用指数专用API
-                    # 注意：iTick的指数API统一使用region='GB'
-                    quote_data = await client.get_index_quote(code=str(code), region="GB")
-                    
-                    # 检查quote_data是否为None或空
-                    if not quote_data:
-                        raise Exception(f"API返回空数据，可能是指数代码不正确")
-                    
-                    # 获取历史K线 - 使用指数专用API
-                    kline_data = await client.get_index_kline(
-                        code=str(code),
-                        region="GB",
-                        period=period,
-                        limit=days
-                    )
-                    
-                    # 提取关键数据
-                    latest_price = quote_data.get('ld', 0)
-                    open_price = quote_data.get('o', 0)
-                    high_price = quote_data.get('h', 0)
-                    low_price = quote_data.get('l', 0)
-                    volume = quote_data.get('v', 0)
-                    turnover = quote_data.get('tu', 0)
-                    change = quote_data.get('ch', 0)
-                    change_pct = quote_data.get('chp', 0)
-                    
-                    # 时间戳
-                    timestamp = quote_data.get('t', 0)
-                    if timestamp:
-                        time_str = datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d %H:%M:%S')
-                    else:
-                        time_str = 'N/A'
-                    
-                    # 计算历史数据
-                    period_change = 0
-                    volatility = 0
-                    
-                    if kline_data and len(kline_data) >= 2:
-                        first_close = float(kline_data[0].get('c', 0))
-                        last_close = float(kline_data[-1].get('c', 0))
-                        
-                        if first_close:
-                            period_change = (last_close - first_close) / first_close * 100
-                        
-                        # 计算波动率
-                        volatility = IndexAnalysisTool.calculate_volatility(kline_data)
-                    
-                    # 判断市场情绪
-                    sentiment = IndexAnalysisTool.judge_market_sentiment(change_pct, 1.0)
-                    
-                    index_results.append({
-                        "name": name,
-                        "region": region,
-                        "code": code,
-                        "latest_price": latest_price,
-                        "open_price": open_price,
-                        "high_price": high_price,
-                        "low_price": low_price,
-                        "volume": volume,
-                        "turnover": turnover,
-                        "change": change,
-                        "change_pct": change_pct,
-                        "time": time_str,
-                        "period_change": period_change,
-                        "volatility": volatility,
-                        "sentiment": sentiment,
-                        "kline_count": len(kline_data) if kline_data else 0
-                    })
-                    
-                except Exception as e:
-                    index_results.append({
-                        "name": name,
-                        "region": region,
-                        "code": code,
-                        "error": str(e)
-                    })
+            async def fetch(index_info: Dict[str, Any]) -> Dict[str, Any]:
+                async with semaphore:
+                    return await IndexAnalysisTool.fetch_index(client, index_info, period, days)
+            
+            index_results = await asyncio.gather(*[
+                fetch(index_info) for index_info in indices if index_info.get("code")
+            ])
             
             if not index_results:
                 return {
@@ -335,7 +552,7 @@ class IndexAnalysisTool:
 
 **分析时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 **分析周期**: {period} × {days}天
-**指数数量**: {len(index_results)}
+**指数数量**: {sum(1 for r in index_results if "error" not in r)}/{len(index_results)}
 
 ---
 
@@ -359,6 +576,29 @@ class IndexAnalysisTool:
                     trend_icon = "➡️"
                     trend_color = "⚪"
                 
+                snapshot_note = ""
+                if result.get("snapshot_at"):
+                    age = max(0, int(datetime.now().timestamp() - result['snapshot_at']))
+                    snapshot_note = f"（快照，{datetime.fromtimestamp(result['snapshot_at']).strftime('%H:%M:%S')} 刷新，{age}秒前）"
+                
+                detail = result['volatility_detail']
+                volatility_note = ""
+                if detail.get("window"):
+                    def pct(value: float) -> str:
+                        return "N/A" if np.isnan(value) else f"{value:.2f}%"
+                    
+                    volatility_note = (
+                        f"\n- 📉 近{detail['window']}期波动率（年化）: 收盘价 {pct(detail['close'])}"
+                        f" | EWMA {pct(detail['ewma'])} | Parkinson {pct(detail['parkinson'])}"
+                        f" | Garman-Klass {pct(detail['garman_klass'])}"
+                    )
+                
+                history_note = ""
+                if result.get("history_error"):
+                    history_note = f"\n- ⚠️ 历史K线获取失败: {result['history_error']}"
+                elif max_points and result['kline_count'] >= 2:
+                    history_note = "\n- 🧭 走势: " + IndexAnalysisTool.format_trend(result['frame'], period, int(max_points))
+                
                 output += f"""### {i}. {trend_icon} {result['name']}
 
 **实时行情**
@@ -367,7 +607,7 @@ class IndexAnalysisTool:
 - 🔼 今开: {result['open_price']:.2f}
 - ⬆️  今高: {result['high_price']:.2f}
 - ⬇️  今低: {result['low_price']:.2f}
-- ⏰ 更新: {result['time']}
+- ⏰ 更新: {result['time']}{snapshot_note}
 
 **成交数据**
 - 📦 成交量: {result['volume']:,.0f}
@@ -375,8 +615,8 @@ class IndexAnalysisTool:
 
 **历史表现** (近{days}个交易日)
 - 📈 区间涨跌: {result['period_change']:+.2f}%
-- 📊 波动率: {result['volatility']:.2f}%
-- 😊 市场情绪: {result['sentiment']}
+- 📊 区间年化波动率: {result['volatility']:.2f}%{volatility_note}
+- 😊 市场情绪: {result['sentiment']}{history_note}
 
 ---
 
@@ -390,7 +630,7 @@ class IndexAnalysisTool:
                 if len(valid_results) > 1:
                     output += """### 📊 多指数对比分析
 
-| 指数名称 | 最新点位 | 今日涨跌 | 区间涨跌 | 波动率 | 市场情绪 |
+| 指数名称 | 最新点位 | 今日涨跌 | 区间涨跌 | 年化波动率 | 市场情绪 |
 |---------|---------|---------|---------|--------|---------|
 """
                     # 按涨跌幅排序
@@ -437,6 +677,21 @@ class IndexAnalysisTool:
 ---
 
 """
+                    
+                    # 相关性、Beta 与相对强弱（矩阵运算，数据量大时放到线程池）
+                    with_history = [r for r in valid_results if r['kline_count'] >= 3]
+                    if len(with_history) > 1:
+                        codes = [str(r['code']) for r in with_history]
+                        benchmark = codes.index(str(benchmark_code)) if str(benchmark_code) in codes else 0
+                        frames = [r['frame'] for r in with_history]
+                        stats = await get_executor().run(
+                            IndexAnalysisTool.compare_matrix,
+                            frames,
+                            benchmark,
+                            rs_window,
+                            size=sum(len(f) for f in frames) * len(frames)
+                        )
+                        output += IndexAnalysisTool.format_comparison(with_history, benchmark, rs_window, stats)
             
             # 投资建议
             output += """### 💡 投资建议
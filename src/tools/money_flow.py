@@ -2,9 +2,19 @@
 Money Flow Tool - 资金流向分析工具
 基于成交量和价格变化分析资金流入流出情况
 """
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime
+import numpy as np
+from ..config import settings
 from ..itick_client import get_client, ItickAPIError
+from ..kline_frame import KlineFrame
+from ..compute import get_executor
+from ..tick_feed import get_tick_feed
+from ..tick_flow import LEVELS, get_flow_engine
+from ..flow_aggregates import (
+    ORDER_SIZE_BANDS, FlowHistory, IntradayFlow, IntradayFlowTracker,
+    get_flow_history, get_intraday_tracker, level_ratios, summarize_records
+)
 
 
 class MoneyFlowTool:
@@ -39,12 +49,11 @@ class MoneyFlowTool:
 - 辅助买卖时机判断
 
 📍 **分析方法**:
-- 基于成交量和价格涨跌推算资金流向
-- 上涨时成交量视为流入，下跌时视为流出
-- 按成交额大小划分不同级别资金
-- 统计区间内各级别资金净流入
+- 逐笔模式: 按单笔成交额分级，按成交价相对盘口/前一笔成交判断主动买卖，统计当日累计
+- K线模式: 基于成交量和价格涨跌推算资金流向，上涨时成交量视为流入，下跌时视为流出
+- 已采集逐笔成交的股票查询日内（period=intraday）时默认使用逐笔的当日累计结果；日线/周线/月线始终按K线计算
 
-⏰ **分析周期**: 支持日线、周线、月线数据
+⏰ **分析周期**: 支持日内（5分钟/30分钟/当日累计）、日线、周线、月线数据
 
 🔔 **判断标准**:
 - 主力净流入>0且占比>5%: 强势吸筹
@@ -72,21 +81,33 @@ class MoneyFlowTool:
             },
             "period": {
                 "type": "string",
-                "enum": ["day", "week", "month"],
-                "description": "分析周期。day=日线, week=周线, month=月线",
+                "enum": ["intraday", "day", "week", "month"],
+                "description": "分析周期。intraday=日内(基于1分钟K线的5分钟/30分钟/当日累计), day=日线, week=周线, month=月线",
                 "default": "day"
             },
             "days": {
                 "type": "integer",
-                "description": "分析的交易日天数（建议5-30天）",
+                "description": "分析的K线数量（建议5-30，日线可查询更长区间判断中长期趋势）",
                 "default": 10,
                 "minimum": 1,
-                "maximum": 60
+                "maximum": 250
+            },
+            "source": {
+                "type": "string",
+                "enum": ["auto", "tick", "kline"],
+                "description": "数据来源。auto=日内周期且有逐笔累计数据时使用逐笔（当日累计），其余用K线估算; tick=逐笔成交的当日累计（忽略 period/days，未采集时开始采集）; kline=K线估算",
+                "default": "auto"
             }
         },
         "required": ["region", "code"]
     }
     
+    # 按成交均价分档的资金分布比例 (最低均价, 各级别占比)
+    ORDER_SIZE_BANDS = ORDER_SIZE_BANDS
+    
+    # 日内模式获取的1分钟K线条数（覆盖一个完整交易日）
+    INTRADAY_BARS = 400
+    
     @staticmethod
     def classify_order_size(turnover: float, volume: float) -> Dict[str, float]:
         """
@@ -95,7 +116,7 @@ class MoneyFlowTool:
         Args:
             turnover: 总成交额
             volume: 总成交量
-            
+        
         Returns:
             各级别资金占比
         """
@@ -112,28 +133,265 @@ class MoneyFlowTool:
         # 简化模型：假设成交分布
         # 实际应用中需要逐笔成交数据
         # 这里基于统计规律估算
+        for min_price, distribution in MoneyFlowTool.ORDER_SIZE_BANDS:
+            if avg_price >= min_price:
+                return dict(distribution)
+        return dict(MoneyFlowTool.ORDER_SIZE_BANDS[-1][1])
+    
+    @staticmethod
+    def analyze_flow(frame: KlineFrame) -> Dict[str, Any]:
+        """
+        按K线估算各级别资金流入流出
         
-        if avg_price >= 100:  # 高价股
-            return {
-                "super_large": 0.30,
-                "large": 0.25,
-                "medium": 0.25,
-                "small": 0.20
-            }
-        elif avg_price >= 50:  # 中价股
-            return {
-                "super_large": 0.25,
-                "large": 0.25,
-                "medium": 0.30,
-                "small": 0.20
-            }
-        else:  # 低价股
-            return {
-                "super_large": 0.20,
-                "large": 0.25,
-                "medium": 0.30,
-                "small": 0.25
+        上涨K线（收盘≥开盘）的成交额计为流入，下跌计为流出，
+        再按 classify_order_size 的比例拆分到各级别。
+        
+        Args:
+            frame: K线数据
+        
+        Returns:
+            总流入/流出、各级别 (流入, 流出) 以及逐K线明细
+        """
+        active = (frame.tu != 0) & (frame.v != 0)
+        o, c, tu, t = frame.o[active], frame.c[active], frame.tu[active], frame.t[active]
+        is_inflow = c >= o
+        
+        # 各级别占比：与 classify_order_size 使用同一价格分档
+        ratios = dict(zip(LEVELS, level_ratios(tu / frame.v[active])))
+        
+        result = {
+            "total_inflow": float(tu[is_inflow].sum()),
+            "total_outflow": float(tu[~is_inflow].sum())
+        }
+        for level, ratio in ratios.items():
+            amount = tu * ratio
+            result[level] = (float(amount[is_inflow].sum()), float(amount[~is_inflow].sum()))
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = np.where(o != 0, (c - o) / o * 100, 0.0)
+        main_flow = tu * (ratios["super_large"] + ratios["large"]) * np.where(is_inflow, 1, -1)
+        
+        result["daily"] = [
+            {
+                "date": date,
+                "trend": "📈" if up else "📉",
+                "change": chg,
+                "turnover": amount,
+                "main_flow": main
             }
+            for date, up, chg, amount, main in zip(
+                t.tolist(), is_inflow.tolist(), change.tolist(), tu.tolist(), main_flow.tolist()
+            )
+        ]
+        return result
+    
+    @staticmethod
+    def format_flow(flow: Dict[str, Any]) -> Tuple[str, float]:
+        """
+        生成资金流向汇总和分级资金流向表
+        
+        Args:
+            flow: analyze_flow 或逐笔引擎输出的资金流向
+        
+        Returns:
+            (Markdown 文本, 主力净占比)
+        """
+        total_inflow = flow["total_inflow"]
+        total_outflow = flow["total_outflow"]
+        super_large_inflow, super_large_outflow = flow["super_large"]
+        large_inflow, large_outflow = flow["large"]
+        medium_inflow, medium_outflow = flow["medium"]
+        small_inflow, small_outflow = flow["small"]
+        
+        # 计算净流入
+        net_inflow = total_inflow - total_outflow
+        super_large_net = super_large_inflow - super_large_outflow
+        large_net = large_inflow - large_outflow
+        medium_net = medium_inflow - medium_outflow
+        small_net = small_inflow - small_outflow
+        main_net = super_large_net + large_net  # 主力资金
+        
+        total_amount = total_inflow + total_outflow
+        
+        def ratio(value: float) -> float:
+            return (value / total_amount * 100) if total_amount else 0
+        
+        # 计算占比
+        net_ratio = ratio(net_inflow)
+        main_ratio = ratio(main_net)
+        
+        # 判断资金强度
+        if main_ratio > 10:
+            strength = "🔥 主力强势流入(大幅吸筹)"
+        elif main_ratio > 5:
+            strength = "📈 主力持续流入(稳步建仓)"
+        elif main_ratio > 0:
+            strength = "✅ 主力小幅流入(试探性买入)"
+        elif main_ratio > -5:
+            strength = "⚠️ 主力小幅流出(获利了结)"
+        elif main_ratio > -10:
+            strength = "📉 主力持续流出(减仓离场)"
+        else:
+            strength = "🔴 主力大幅流出(明显出货)"
+        
+        output = f"""### 📊 资金流向汇总
+
+**整体流向**
+- 💹 净流入: ¥{net_inflow/10000:.2f}万 ({net_ratio:+.2f}%)
+- 📈 总流入: ¥{total_inflow/100000000:.2f}亿
+- 📉 总流出: ¥{total_outflow/100000000:.2f}亿
+
+**主力资金** (超大单+大单)
+- 🎯 主力净额: ¥{main_net/10000:.2f}万 ({main_ratio:+.2f}%)
+- 💪 资金强度: {strength}
+
+---
+
+### 📈 分级资金流向
+
+| 资金类型 | 流入金额 | 流出金额 | 净流入 | 净占比 |
+|---------|---------|---------|--------|--------|
+| 🐋 超大单(≥50万) | ¥{super_large_inflow/10000:.2f}万 | ¥{super_large_outflow/10000:.2f}万 | ¥{super_large_net/10000:.2f}万 | {ratio(super_large_net):+.2f}% |
+| 🐘 大单(20-50万) | ¥{large_inflow/10000:.2f}万 | ¥{large_outflow/10000:.2f}万 | ¥{large_net/10000:.2f}万 | {ratio(large_net):+.2f}% |
+| 🐕 中单(5-20万) | ¥{medium_inflow/10000:.2f}万 | ¥{medium_outflow/10000:.2f}万 | ¥{medium_net/10000:.2f}万 | {ratio(medium_net):+.2f}% |
+| 🐁 小单(<5万) | ¥{small_inflow/10000:.2f}万 | ¥{small_outflow/10000:.2f}万 | ¥{small_net/10000:.2f}万 | {ratio(small_net):+.2f}% |
+"""
+        return output, main_ratio
+    
+    @staticmethod
+    def format_advice(main_ratio: float) -> str:
+        """根据主力净占比生成操作建议"""
+        output = """
+---
+
+### 💡 操作建议
+
+"""
+        
+        if main_ratio > 5:
+            output += """
+✅ **建议关注**
+- 主力资金持续流入，显示机构看好
+- 可考虑逢低布局或持股待涨
+- 注意配合技术指标确认买点
+"""
+        elif main_ratio < -5:
+            output += """
+⚠️ **风险提示**
+- 主力资金明显流出，需谨慎
+- 建议减仓或观望为主
+- 避免盲目抄底，等待企稳信号
+"""
+        else:
+            output += """
+➖ **中性观望**
+- 主力资金流向不明显
+- 可能处于横盘整理阶段
+- 建议等待明确信号再操作
+"""
+        return output
+    
+    @staticmethod
+    def format_tick_report(region: str, code: str, flow: Dict[str, Any]) -> str:
+        """生成逐笔资金流向报告"""
+        summary, main_ratio = MoneyFlowTool.format_flow(flow)
+        start = datetime.fromtimestamp(flow["first_t"] / 1000).strftime('%H:%M:%S')
+        end = datetime.fromtimestamp(flow["last_t"] / 1000).strftime('%H:%M:%S')
+        total_amount = flow["total_inflow"] + flow["total_outflow"] + flow["neutral"]
+        
+        output = f"""## 💰 资金流向分析报告（逐笔）
+
+**股票信息**
+- 📌 代码: {region}.{code}
+- ⏱️ 统计区间: 当日 {start} - {end}
+- 🧾 成交笔数: {flow['trades']}
+- 💵 总成交额: ¥{total_amount/10000:.2f}万
+
+---
+
+{summary}
+**主动买卖**
+- 🟢 主动买入量: {flow['buy_volume']:,.0f}
+- 🔴 主动卖出量: {flow['sell_volume']:,.0f}
+- ⚪ 方向不明成交额: ¥{flow['neutral']/10000:.2f}万
+"""
+        output += MoneyFlowTool.format_advice(main_ratio)
+        output += """
+
+### 📌 分析说明
+
+**计算方法**:
+- 按单笔成交额划分超大单/大单/中单/小单
+- 主动方向: 有盘口时与买卖中间价比较，否则与前一笔成交价比较（tick rule）
+- 主力资金 = 超大单 + 大单
+
+**注意事项**:
+1. 统计范围为开始采集后的当日成交，轮询模式下只采样到每次轮询时的最新一笔
+2. 资金流向仅供参考，需结合其他指标
+
+⚠️ **风险提示**: 本分析不构成投资建议，投资有风险，决策需谨慎。
+
+*分析时间: """ + datetime.now().strftime('%Y-%m-%d %H:%M:%S') + "*"
+        return output
+    
+    @staticmethod
+    def format_intraday_report(region: str, code: str, flow: IntradayFlow) -> str:
+        """生成日内资金流向报告"""
+        session_t, session = flow.latest("day")
+        summary, main_ratio = MoneyFlowTool.format_flow(session)
+        
+        output = f"""## 💰 日内资金流向分析报告
+
+**股票信息**
+- 📌 代码: {region}.{code}
+- 📅 交易日: {datetime.fromtimestamp(session_t/1000).strftime('%Y-%m-%d')}
+- 💵 当日成交额: ¥{(session['total_inflow'] + session['total_outflow'])/100000000:.2f}亿
+
+---
+
+### ⏱️ 实时资金节奏
+
+| 区间 | 起始时间 | 净流入 | 主力净额 | 主力净占比 |
+|------|---------|--------|---------|-----------|
+"""
+        
+        for label, period in (("最近5分钟", "5min"), ("最近30分钟", "30min"), ("当日累计", "day")):
+            t, bucket = flow.latest(period)
+            total = bucket["total_inflow"] + bucket["total_outflow"]
+            net = bucket["total_inflow"] - bucket["total_outflow"]
+            main_net = sum(bucket[level][0] - bucket[level][1] for level in ("super_large", "large"))
+            main_pct = (main_net / total * 100) if total else 0
+            output += f"| {label} | {datetime.fromtimestamp(t/1000).strftime('%m-%d' if period == 'day' else '%H:%M')} | ¥{net/10000:.2f}万 | ¥{main_net/10000:.2f}万 | {main_pct:+.2f}% |\n"
+        
+        output += f"""
+---
+
+{summary}
+---
+
+### 📅 近期5分钟主力资金
+
+"""
+        
+        for t, inflow, outflow in flow.buckets("5min")[-6:]:
+            main_net = float(inflow[:2].sum() - outflow[:2].sum())
+            trend = "📈" if main_net >= 0 else "📉"
+            output += f"- **{datetime.fromtimestamp(t/1000).strftime('%H:%M')}** {trend} 主力: ¥{main_net/10000:.2f}万 | 成交额: ¥{float(inflow.sum() + outflow.sum())/10000:.2f}万\n"
+        
+        output += MoneyFlowTool.format_advice(main_ratio)
+        output += """
+
+### 📌 分析说明
+
+**计算方法**:
+- 基于1分钟K线，上涨K线成交额计为流入，下跌计为流出
+- 按成交均价分档拆分各级别资金，主力资金 = 超大单 + 大单
+- 5分钟/30分钟按交易时段开盘对齐分桶
+
+⚠️ **风险提示**: 本分析不构成投资建议，投资有风险，决策需谨慎。
+
+*分析时间: """ + datetime.now().strftime('%Y-%m-%d %H:%M:%S') + "*"
+        return output
     
     @staticmethod
     async def run(arguments: Dict[str, Any], api_key: Optional[str] = None) -> Dict[str, Any]:
@@ -143,6 +401,7 @@ class MoneyFlowTool:
             code = arguments.get("code")
             period = arguments.get("period", "day")
             days = arguments.get("days", 10)
+            source = arguments.get("source", "auto")
             
             if not region or not code:
                 return {
@@ -153,16 +412,84 @@ class MoneyFlowTool:
                     "isError": True
                 }
             
-            # 获取K线数据
+            region, code = str(region).upper(), str(code)
+            
+            # 逐笔累计只有当日数据：明确指定或查询日内时使用
+            if source == "tick" or (source == "auto" and period == "intraday"):
+                engine = get_flow_engine()
+                tick_flow = engine.snapshot(region, code)
+                if tick_flow is None and source == "auto" and (region, code) in engine.symbols():
+                    # 之前采集过但累计的不是当日（临时采集已过期），重新发起采集，本次先使用分钟K线
+                    get_tick_feed().watch(region, code, api_key)
+                if tick_flow is not None:
+                    # 临时采集的股票每次查询续期
+                    feed = get_tick_feed()
+                    if feed.watching(region, code):
+                        feed.watch(region, code, api_key)
+                    return {
+                        "content": [{
+                            "type": "text",
+                            "text": MoneyFlowTool.format_tick_report(region, code, tick_flow)
+                        }]
+                    }
+                
+                if source == "tick":
+                    refused = get_tick_feed().watch(region, code, api_key)
+                    if refused:
+                        return {
+                            "content": [{
+                                "type": "text",
+                                "text": f"❌ 没有 {region}.{code} 的逐笔累计数据：{refused}"
+                            }],
+                            "isError": True
+                        }
+                    return {
+                        "content": [{
+                            "type": "text",
+                            "text": f"📡 已开始采集 {region}.{code} 的逐笔成交，累计数据将在成交发生后可用，请稍后再查询（{settings.tick_watch_ttl // 60} 分钟内未再查询将停止采集）。"
+                        }]
+                    }
+            
             client = get_client(api_key)
-            kline_data = await client.get_stock_kline(
-                region=str(region),
-                code=str(code),
+            
+            # 日内模式：1分钟K线写入本地存储时已增量更新分桶
+            if period == "intraday":
+                tracker = get_intraday_tracker()
+                await client.get_stock_kline_frame(
+                    region=region,
+                    code=code,
+                    period=IntradayFlowTracker.PERIOD,
+                    limit=MoneyFlowTool.INTRADAY_BARS
+                )
+                intraday = tracker.get(region, code)
+                if intraday is None or intraday.latest("day") is None:
+                    return {
+                        "content": [{
+                            "type": "text",
+                            "text": "❌ 未获取到分钟K线数据"
+                        }],
+                        "isError": True
+                    }
+                
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": MoneyFlowTool.format_intraday_report(region, code, intraday)
+                    }]
+                }
+            
+            # 日线资金流向在K线写入本地存储时已逐日记录，需先注册再获取K线
+            history = get_flow_history() if period == FlowHistory.PERIOD else None
+            
+            # 获取K线数据
+            frame = await client.get_stock_kline_frame(
+                region=region,
+                code=code,
                 period=period,
                 limit=days
             )
             
-            if not kline_data:
+            if len(frame) == 0:
                 return {
                     "content": [{
                         "type": "text",
@@ -171,125 +498,37 @@ class MoneyFlowTool:
                     "isError": True
                 }
             
-            # 分析资金流向
-            total_inflow = 0  # 总流入
-            total_outflow = 0  # 总流出
-            
-            super_large_inflow = 0
-            super_large_outflow = 0
-            large_inflow = 0
-            large_outflow = 0
-            medium_inflow = 0
-            medium_outflow = 0
-            small_inflow = 0
-            small_outflow = 0
-            
-            daily_analysis = []
-            
-            for i, kline in enumerate(kline_data):
-                open_price = float(kline.get('o', 0))
-                close_price = float(kline.get('c', 0))
-                volume = float(kline.get('v', 0))
-                turnover = float(kline.get('tu', 0))
-                
-                if turnover == 0 or volume == 0:
-                    continue
-                
-                # 判断资金流向：上涨为流入，下跌为流出
-                is_inflow = close_price >= open_price
-                
-                # 分类资金
-                distribution = MoneyFlowTool.classify_order_size(turnover, volume)
-                
-                super_large_amount = turnover * distribution["super_large"]
-                large_amount = turnover * distribution["large"]
-                medium_amount = turnover * distribution["medium"]
-                small_amount = turnover * distribution["small"]
-                
-                if is_inflow:
-                    total_inflow += turnover
-                    super_large_inflow += super_large_amount
-                    large_inflow += large_amount
-                    medium_inflow += medium_amount
-                    small_inflow += small_amount
-                    trend = "📈"
-                else:
-                    total_outflow += turnover
-                    super_large_outflow += super_large_amount
-                    large_outflow += large_amount
-                    medium_outflow += medium_amount
-                    small_outflow += small_amount
-                    trend = "📉"
-                
-                # 记录每日分析
-                change_pct = (close_price - open_price) / open_price * 100 if open_price else 0
-                daily_analysis.append({
-                    "date": kline.get('t', 0),
-                    "trend": trend,
-                    "change": change_pct,
-                    "turnover": turnover,
-                    "main_flow": (super_large_amount + large_amount) * (1 if is_inflow else -1)
-                })
-            
-            # 计算净流入
-            net_inflow = total_inflow - total_outflow
-            super_large_net = super_large_inflow - super_large_outflow
-            large_net = large_inflow - large_outflow
-            medium_net = medium_inflow - medium_outflow
-            small_net = small_inflow - small_outflow
-            main_net = super_large_net + large_net  # 主力资金
-            
-            total_amount = total_inflow + total_outflow
-            
-            # 计算占比
-            net_ratio = (net_inflow / total_amount * 100) if total_amount else 0
-            main_ratio = (main_net / total_amount * 100) if total_amount else 0
-            
-            # 判断资金强度
-            if main_ratio > 10:
-                strength = "🔥 主力强势流入(大幅吸筹)"
-            elif main_ratio > 5:
-                strength = "📈 主力持续流入(稳步建仓)"
-            elif main_ratio > 0:
-                strength = "✅ 主力小幅流入(试探性买入)"
-            elif main_ratio > -5:
-                strength = "⚠️ 主力小幅流出(获利了结)"
-            elif main_ratio > -10:
-                strength = "📉 主力持续流出(减仓离场)"
+            if history is not None:
+                # 按区间截取逐日记录后汇总
+                flow = summarize_records(history.query(region, code, limit=days))
             else:
-                strength = "🔴 主力大幅流出(明显出货)"
+                # 分析资金流向（按K线向量化计算）
+                flow = await get_executor().run(MoneyFlowTool.analyze_flow, frame, size=len(frame))
+            summary, main_ratio = MoneyFlowTool.format_flow(flow)
+            total_amount = flow["total_inflow"] + flow["total_outflow"]
+            
+            # 主力连续净流入/流出的K线数（从最近一根往前数）
+            main_days = [day["main_flow"] > 0 for day in flow["daily"]]
+            streak = 0
+            for is_inflow in reversed(main_days):
+                if is_inflow != main_days[-1]:
+                    break
+                streak += 1
             
             # 格式化输出
             output = f"""## 💰 资金流向分析报告
 
 **股票信息**
 - 📌 代码: {region}.{code}
-- 📅 分析周期: {period} × {len(kline_data)}天
+- 📅 分析周期: {period} × {len(flow['daily'])}天
 - 💵 总成交额: ¥{total_amount/100000000:.2f}亿
 
 ---
 
-### 📊 资金流向汇总
-
-**整体流向**
-- 💹 净流入: ¥{net_inflow/10000:.2f}万 ({net_ratio:+.2f}%)
-- 📈 总流入: ¥{total_inflow/100000000:.2f}亿
-- 📉 总流出: ¥{total_outflow/100000000:.2f}亿
-
-**主力资金** (超大单+大单)
-- 🎯 主力净额: ¥{main_net/10000:.2f}万 ({main_ratio:+.2f}%)
-- 💪 资金强度: {strength}
-
----
-
-### 📈 分级资金流向
-
-| 资金类型 | 流入金额 | 流出金额 | 净流入 | 净占比 |
-|---------|---------|---------|--------|--------|
-| 🐋 超大单(≥50万) | ¥{super_large_inflow/10000:.2f}万 | ¥{super_large_outflow/10000:.2f}万 | ¥{super_large_net/10000:.2f}万 | {(super_large_net/total_amount*100):+.2f}% |
-| 🐘 大单(20-50万) | ¥{large_inflow/10000:.2f}万 | ¥{large_outflow/10000:.2f}万 | ¥{large_net/10000:.2f}万 | {(large_net/total_amount*100):+.2f}% |
-| 🐕 中单(5-20万) | ¥{medium_inflow/10000:.2f}万 | ¥{medium_outflow/10000:.2f}万 | ¥{medium_net/10000:.2f}万 | {(medium_net/total_amount*100):+.2f}% |
-| 🐁 小单(<5万) | ¥{small_inflow/10000:.2f}万 | ¥{small_outflow/10000:.2f}万 | ¥{small_net/10000:.2f}万 | {(small_net/total_amount*100):+.2f}% |
+{summary}
+**趋势持续性**
+- 🔁 主力连续净{'流入' if main_days and main_days[-1] else '流出'}: {streak} 个周期
+- 📊 主力净流入周期数: {sum(main_days)}/{len(main_days)}
 
 ---
 
@@ -298,7 +537,7 @@ class MoneyFlowTool:
 """
             
             # 显示最近5天的详细数据
-            for day in daily_analysis[-5:]:
+            for day in flow["daily"][-5:]:
                 timestamp = day['date']
                 if timestamp:
                     date_str = datetime.fromtimestamp(timestamp/1000).strftime('%m-%d')
@@ -307,35 +546,7 @@ class MoneyFlowTool:
                 
                 output += f"- **{date_str}** {day['trend']} 涨跌: {day['change']:+.2f}% | 主力: ¥{day['main_flow']/10000:.2f}万 | 成交额: ¥{day['turnover']/100000000:.2f}亿\n"
             
-            output += f"""
----
-
-### 💡 操作建议
-
-"""
-            
-            if main_ratio > 5:
-                output += """
-✅ **建议关注**
-- 主力资金持续流入，显示机构看好
-- 可考虑逢低布局或持股待涨
-- 注意配合技术指标确认买点
-"""
-            elif main_ratio < -5:
-                output += """
-⚠️ **风险提示**
-- 主力资金明显流出，需谨慎
-- 建议减仓或观望为主
-- 避免盲目抄底，等待企稳信号
-"""
-            else:
-                output += """
-➖ **中性观望**
-- 主力资金流向不明显
-- 可能处于横盘整理阶段
-- 建议等待明确信号再操作
-"""
-            
+            output += MoneyFlowTool.format_advice(main_ratio)
             output += """
 
 ### 📌 分析说明
@@ -354,14 +565,14 @@ class MoneyFlowTool:
 ⚠️ **风险提示**: 本分析不构成投资建议，投资有风险，决策需谨慎。
 
 *分析时间: """ + datetime.now().strftime('%Y-%m-%d %H:%M:%S') + "*"
-            
+
             return {
                 "content": [{
                     "type": "text",
                     "text": output
                 }]
             }
-            
+        
         except ItickAPIError as e:
             return {
                 "content": [{
@@ -0,0 +1,330 @@
+"""
+Money Flow Rank Tool - 资金流向排名工具
+对股票池内的个股按区间主力资金流向排名，分批并发获取K线并向量化计算
+"""
+from typing import Dict, Any, Optional, List, Tuple
+from datetime import datetime
+import asyncio
+import heapq
+import numpy as np
+from ..itick_client import get_client, ItickAPIError
+from ..kline_frame import KlineFrame
+from ..compute import get_executor
+from ..flow_aggregates import level_ratios
+from ..tick_flow import LEVELS
+from ..universe import list_universes, load_universe
+
+
+class MoneyFlowRankTool:
+    """资金流向排名工具 - 在股票池中找出主力资金流入/流出最强的个股"""
+    
+    name = "itick_money_flow_rank"
+    description = """对【一组个股】按区间资金流向排名，找出主力资金流入最强和流出最强的股票。
+
+⚠️ **重要提示 - 工具适用范围**:
+- ✅ 适用于: 多只个股的资金流向横向排名（如"这300只股票里近5日主力流入最强的10只"）
+- ❌ 单只个股的详细资金流向 → 请使用 itick_money_flow
+- ❌ 板块/ETF资金流向 → 请使用 itick_sector_analysis
+
+📊 **股票池来源**（二选一）:
+- symbols: 直接传入股票列表
+- universe: 使用内置股票池名称（a_share_core=A股核心蓝筹, hk_core=港股核心权重, us_tech=美股科技龙头）
+
+📈 **排名指标**:
+- main_net: 主力净额（超大单+大单净流入）
+- main_ratio: 主力净占比（主力净额 / 区间成交额）
+- net: 整体净流入
+
+⚡ **性能说明**:
+- 分批并发获取K线（受客户端限流保护），不写入本地K线存储，每批计算完即释放，内存占用与股票池大小无关
+- 每批内所有股票一次向量化计算，用定长堆保留前N名
+- 单只股票获取失败会跳过，不影响排名
+
+💡 **示例查询**:
+- "A股核心蓝筹近5日主力资金流入前10名"
+- "这些港股中主力流出最多的5只"
+"""
+
+    parameters = {
+        "type": "object",
+        "properties": {
+            "symbols": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "region": {
+                            "type": "string",
+                            "description": "市场代码。HK=香港, US=美国, SH=上海, SZ=深圳等"
+                        },
+                        "code": {
+                            "type": "string",
+                            "description": "股票代码（不含市场后缀）"
+                        },
+                        "name": {
+                            "type": "string",
+                            "description": "股票名称（可选，用于显示）"
+                        }
+                    },
+                    "required": ["region", "code"]
+                },
+                "description": "股票列表（与 universe 二选一）",
+                "maxItems": 5000
+            },
+            "universe": {
+                "type": "string",
+                "description": "内置股票池名称（与 symbols 二选一）。a_share_core=A股核心蓝筹, hk_core=港股核心权重, us_tech=美股科技龙头"
+            },
+            "days": {
+                "type": "integer",
+                "description": "统计的交易日天数",
+                "default": 5,
+                "minimum": 1,
+                "maximum": 60
+            },
+            "metric": {
+                "type": "string",
+                "enum": ["main_net", "main_ratio", "net"],
+                "description": "排名指标。main_net=主力净额, main_ratio=主力净占比, net=整体净流入",
+                "default": "main_net"
+            },
+            "top_n": {
+                "type": "integer",
+                "description": "流入、流出各返回的股票数量",
+                "default": 10,
+                "minimum": 1,
+                "maximum": 50
+            }
+        }
+    }
+    
+    # 每批并发获取的股票数量
+    BATCH_SIZE = 200
+    
+    METRIC_LABELS = {
+        "main_net": "主力净额",
+        "main_ratio": "主力净占比",
+        "net": "整体净流入"
+    }
+    
+    @staticmethod
+    def compute(frames: List[KlineFrame], days: int) -> Dict[str, np.ndarray]:
+        """
+        计算一批股票最近 days 根K线的资金流向指标
+        
+        Args:
+            frames: 各股票的K线数据
+            days: 统计的K线条数
+        
+        Returns:
+            各指标数组（按 frames 顺序）
+        """
+        n = len(frames)
+        o, c, v, tu = (np.zeros((n, days)) for _ in range(4))
+        for i, frame in enumerate(frames):
+            tail = frame.tail(days)
+            k = len(tail)
+            o[i, days - k:], c[i, days - k:] = tail.o, tail.c
+            v[i, days - k:], tu[i, days - k:] = tail.v, tail.tu
+        
+        active = (tu != 0) & (v != 0)
+        avg_price = np.divide(tu, v, out=np.zeros_like(tu), where=active)
+        ratios = level_ratios(avg_price.ravel()).reshape(len(LEVELS), n, days)
+        main_ratio = ratios[LEVELS.index("super_large")] + ratios[LEVELS.index("large")]
+        
+        sign = np.where(c >= o, 1.0, -1.0) * active
+        main_daily = tu * main_ratio * sign
+        total = (tu * active).sum(axis=1)
+        
+        # 区间涨跌：首根K线开盘价到最后收盘价
+        first_open = np.array([f.tail(days).o[0] if len(f) else np.nan for f in frames])
+        last_close = np.array([f.c[-1] if len(f) else np.nan for f in frames])
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {
+                "net": (tu * sign).sum(axis=1),
+                "main_net": main_daily.sum(axis=1),
+                "main_ratio": np.where(total > 0, main_daily.sum(axis=1) / total * 100, np.nan),
+                "main_days": (main_daily > 0).sum(axis=1),
+                "active_days": active.sum(axis=1),
+                "turnover": total,
+                "change_pct": (last_close - first_open) / first_open * 100
+            }
+    
+    @staticmethod
+    def _push(heap: List[Tuple], item: Tuple, size: int):
+        """定长小顶堆：保留 size 个最大的元素"""
+        if len(heap) < size:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+    
+    @staticmethod
+    async def run(arguments: Dict[str, Any], api_key: Optional[str] = None) -> Dict[str, Any]:
+        """执行资金流向排名"""
+        try:
+            symbols = arguments.get("symbols") or []
+            universe = arguments.get("universe")
+            days = int(arguments.get("days", 5))
+            metric = arguments.get("metric", "main_net")
+            top_n = int(arguments.get("top_n", 10))
+            
+            if not symbols and universe:
+                try:
+                    symbols = load_universe(str(universe))
+                except ValueError as e:
+                    return {
+                        "content": [{
+                            "type": "text",
+                            "text": f"❌ {str(e)}"
+                        }],
+                        "isError": True
+                    }
+            
+            symbols = [s for s in symbols if s.get("region") and s.get("code")]
+            if not symbols:
+                available = "\n".join(f"- {name}: {desc}" for name, desc in list_universes().items())
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": f"❌ 缺少必需参数：symbols（股票列表）或 universe（股票池名称）\n\n**可用股票池**:\n{available}"
+                    }],
+                    "isError": True
+                }
+            
+            if metric not in MoneyFlowRankTool.METRIC_LABELS:
+                metric = "main_net"
+            
+            client = get_client(api_key)
+            executor = get_executor()
+            top: List[Tuple] = []
+            bottom: List[Tuple] = []
+            failures: List[str] = []
+            ranked = 0
+            
+            # 分批获取与计算，每批结束后K线即可释放（不写入本地K线存储）
+            for offset in range(0, len(symbols), MoneyFlowRankTool.BATCH_SIZE):
+                batch = symbols[offset:offset + MoneyFlowRankTool.BATCH_SIZE]
+                responses = await asyncio.gather(*[
+                    client.get_stock_kline_frame(
+                        region=str(s["region"]),
+                        code=str(s["code"]),
+                        period="day",
+                        limit=days,
+                        cache=False
+                    )
+                    for s in batch
+                ], return_exceptions=True)
+                
+                labels = []
+                frames = []
+                for symbol, response in zip(batch, responses):
+                    label = f"{symbol['region']}.{symbol['code']}"
+                    if symbol.get("name"):
+                        label = f"{symbol['name']} ({label})"
+                    if isinstance(response, ItickAPIError):
+                        failures.append(f"{label}: [{response.code}] {response.message}")
+                    elif isinstance(response, Exception):
+                        failures.append(f"{label}: {response}")
+                    elif len(response) == 0:
+                        failures.append(f"{label}: 无K线数据")
+                    else:
+                        labels.append(label)
+                        frames.append(response)
+                
+                if not frames:
+                    continue
+                
+                metrics = await executor.run(
+                    MoneyFlowRankTool.compute,
+                    frames,
+                    days,
+                    size=len(frames) * days
+                )
+                
+                for i, label in enumerate(labels):
+                    value = float(metrics[metric][i])
+                    if np.isnan(value) or metrics["active_days"][i] == 0:
+                        failures.append(f"{label}: 区间内无成交")
+                        continue
+                    
+                    row = {key: float(values[i]) for key, values in metrics.items()}
+                    row["label"] = label
+                    # 序号用于打破并列，避免比较字典
+                    MoneyFlowRankTool._push(top, (value, offset + i, row), top_n)
+                    MoneyFlowRankTool._push(bottom, (-value, offset + i, row), top_n)
+                    ranked += 1
+            
+            if ranked == 0:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": "❌ 未能获取任何股票的资金流向数据\n\n" + "\n".join(f"- {f}" for f in failures[:20])
+                    }],
+                    "isError": True
+                }
+            
+            def table(title: str, entries: List[Dict[str, Any]]) -> str:
+                text = f"""### {title}
+
+| 排名 | 股票 | 主力净额 | 主力净占比 | 整体净流入 | 区间涨跌 | 主力流入天数 |
+|------|------|---------|-----------|-----------|---------|-------------|
+"""
+                for rank, row in enumerate(entries, 1):
+                    text += (
+                        f"| {rank} | {row['label']} | ¥{row['main_net']/10000:.2f}万 | {row['main_ratio']:+.2f}% "
+                        f"| ¥{row['net']/10000:.2f}万 | {row['change_pct']:+.2f}% "
+                        f"| {int(row['main_days'])}/{int(row['active_days'])} |\n"
+                    )
+                return text
+            
+            inflow_rows = [row for _, _, row in sorted(top, reverse=True)]
+            outflow_rows = [row for _, _, row in sorted(bottom, reverse=True)]
+            
+            output = f"""## 🏆 资金流向排名
+
+**股票池**: {universe or '自定义'} | **统计区间**: 近{days}个交易日 | **排名指标**: {MoneyFlowRankTool.METRIC_LABELS[metric]}
+**参与排名**: {ranked}/{len(symbols)} 只
+
+---
+
+{table(f"📈 主力流入前 {len(inflow_rows)} 名", inflow_rows)}
+{table(f"📉 主力流出前 {len(outflow_rows)} 名", outflow_rows)}"""
+
+            if failures:
+                output += f"\n**⚠️ 跳过 {len(failures)} 只**:\n" + "\n".join(f"- {f}" for f in failures[:10])
+                if len(failures) > 10:
+                    output += f"\n- ……等 {len(failures)} 只"
+                output += "\n"
+            
+            output += """
+---
+**📌 计算方法**: 上涨日成交额计为流入、下跌日计为流出，按成交均价分档拆分各级别资金，主力 = 超大单 + 大单
+
+**⚠️ 风险提示**: 资金流向基于K线估算，仅供参考，不构成投资建议。
+
+*计算时间: """ + datetime.now().strftime('%Y-%m-%d %H:%M:%S') + "*"
+
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": output
+                }]
+            }
+        
+        except ItickAPIError as e:
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": f"❌ iTick API 错误: [{e.code}] {e.message}"
+                }],
+                "isError": True
+            }
+        except Exception as e:
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": f"❌ 系统错误: {str(e)}"
+                }],
+                "isError": True
+            }
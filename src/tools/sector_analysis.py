@@ -4,7 +4,12 @@ Sector Analysis Tool - 板块分析工具
 """
 from typing import Dict, Any, Optional, List
 from datetime import datetime
+import asyncio
+import numpy as np
 from ..itick_client import get_client, ItickAPIError
+from ..kline_frame import KlineFrame
+from ..sectors import get_sector_scheduler, load_registry
+from ..sector_stream import get_sector_stream
 
 
 class SectorAnalysisTool:
@@ -37,6 +42,15 @@ class SectorAnalysisTool:
 - 板块轮动趋势识别
 - 强势板块龙头股推荐
 
+📦 **内置板块**（sectors 参数，以板块ETF为成分）:
+- A股: 科技板块、消费板块、金融板块、新能源板块
+- 港股: 港股科技板块、港股医疗板块
+- 传入 ["all"] 分析全部内置板块；服务端开启板块快照时直接返回后台预计算结果
+- realtime=true 时返回由成分行情和逐笔成交增量维护的实时板块排名（不请求上游，适合"现在哪个板块领涨"）
+
+⚡ **性能说明**:
+- 所有股票的行情和K线有上限地并发获取（受客户端限流保护），单只股票超时或失败会在报告中列出
+
 📍 **常见板块**:
 - 科技板块: 半导体、软件、云计算、5G、人工智能
 - 医药板块: 创新药、医疗器械、疫苗、中药
@@ -93,9 +107,21 @@ class SectorAnalysisTool:
                     },
                     "required": ["region", "code", "sector"]
                 },
-                "description": "板块内的股票列表。例如: [{region:'SH', code:'600519', name:'茅台', sector:'白酒'}]",
+                "description": "板块内的股票列表（与 sectors 二选一）。例如: [{region:'SH', code:'600519', name:'茅台', sector:'白酒'}]",
                 "minItems": 2
             },
+            "sectors": {
+                "type": "array",
+                "items": {
+                    "type": "string"
+                },
+                "description": "内置板块名称（与 stocks 二选一），如 [\"科技板块\", \"新能源板块\"]；[\"all\"] 表示全部内置板块"
+            },
+            "realtime": {
+                "type": "boolean",
+                "description": "内置板块是否返回实时汇总（由成分行情和逐笔成交增量维护，不请求上游）",
+                "default": False
+            },
             "period": {
                 "type": "string",
                 "enum": ["day", "week", "month"],
@@ -108,100 +134,314 @@ class SectorAnalysisTool:
                 "default": 10,
                 "minimum": 5,
                 "maximum": 60
+            },
+            "max_concurrency": {
+                "type": "integer",
+                "description": "同时获取的股票数量上限（实际请求仍受客户端全局限流约束）",
+                "default": 16,
+                "minimum": 1,
+                "maximum": 64
             }
-        },
-        "required": ["stocks"]
+        }
     }
     
+    # 同时获取的股票数量上限
+    MAX_CONCURRENT_STOCKS = 16
+    
+    # 单只股票（行情+K线）的获取时限（秒）
+    FETCH_TIMEOUT = 10.0
+    
+    @staticmethod
+    async def fetch_stock(client, stock_info: Dict[str, Any], period: str, days: int) -> Dict[str, Any]:
+        """
+        并发获取单只股票的实时行情和K线
+        
+        Args:
+            client: iTick 客户端
+            stock_info: 股票信息 {region, code, name, sector}
+            period: K线周期
+            days: K线数量
+        
+        Returns:
+            股票数据；行情获取失败或超时时包含 error，仅K线失败时包含 history_error
+        """
+        region = stock_info.get("region")
+        code = stock_info.get("code")
+        name = stock_info.get("name", code)
+        sector = stock_info.get("sector", "未分类")
+        
+        try:
+            quote_data, frame = await asyncio.wait_for(
+                asyncio.gather(
+                    client.get_stock_quote(str(region), str(code)),
+                    client.get_stock_kline_frame(
+                        region=str(region),
+                        code=str(code),
+                        period=period,
+                        limit=days
+                    ),
+                    return_exceptions=True
+                ),
+                timeout=SectorAnalysisTool.FETCH_TIMEOUT
+            )
+            
+            if isinstance(quote_data, Exception):
+                raise quote_data
+            if not quote_data:
+                raise Exception("API返回空数据，可能是股票代码不正确")
+            
+            history_error = None
+            if isinstance(frame, Exception):
+                history_error = frame.message if isinstance(frame, ItickAPIError) else str(frame)
+                frame = KlineFrame.empty()
+            
+            # 计算资金流向（简化版）：上涨K线成交额计为流入，下跌计为流出
+            money_flow = float(np.where(frame.c >= frame.o, frame.tu, -frame.tu).sum())
+            
+            stock_data = {
+                "name": name,
+                "region": region,
+                "code": code,
+                "sector": sector,
+                "latest_price": quote_data.get('ld', 0),
+                "change_pct": quote_data.get('chp', 0),
+                "volume": quote_data.get('v', 0),
+                "turnover": quote_data.get('tu', 0),
+                "money_flow": money_flow
+            }
+            if history_error:
+                stock_data["history_error"] = history_error
+            return stock_data
+        
+        except asyncio.TimeoutError:
+            error = f"请求超时（>{SectorAnalysisTool.FETCH_TIMEOUT}秒）"
+        except ItickAPIError as e:
+            error = f"[{e.code}] {e.message}"
+        except Exception as e:
+            error = str(e)
+        
+        return {
+            "name": name,
+            "region": region,
+            "code": code,
+            "sector": sector,
+            "error": error
+        }
+    
+    @staticmethod
+    def format_sector_snapshots(snapshots: List[Any], failures: List[str]) -> str:
+        """内置板块快照报告"""
+        snapshots = sorted(snapshots, key=lambda s: s.summary['avg_score'], reverse=True)
+        days = get_sector_scheduler().days
+        
+        output = f"""## 📊 板块资金流向报告（内置板块）
+
+**分析时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+**板块数量**: {len(snapshots)}/{len(snapshots) + len(failures)}
+
+---
+
+### 🏆 板块资金流向排名
+
+| 排名 | 板块 | 资金评分 | 平均涨跌 | 成交额 | 估算净流入 | 龙头 | 数据时间 |
+|------|------|---------|---------|--------|-----------|------|---------|
+"""
+        for i, snapshot in enumerate(snapshots, 1):
+            summary = snapshot.summary
+            medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else ""
+            output += (
+                f"| {medal}{i} | {snapshot.name} | {summary['avg_score']:.0f} | {summary['avg_change']:+.2f}% "
+                f"| ¥{summary['total_turnover']/100000000:.2f}亿 | {summary['net_inflow']/100000000:+.2f}亿 "
+                f"| {summary['leader']['name']} ({summary['leader']['change_pct']:+.2f}%) "
+                f"| {datetime.fromtimestamp(snapshot.fetched_at).strftime('%H:%M:%S')} |\n"
+            )
+        
+        output += "\n---\n\n"
+        
+        for i, snapshot in enumerate(snapshots, 1):
+            output += f"""### {i}. {snapshot.name} - {snapshot.summary['verdict']}
+
+| ETF名称 | 代码 | 涨跌幅 | 量能比 | 近{days}日 | 评分 | 资金流向 | 估算净流入 |
+|--------|------|--------|--------|-------|------|---------|-----------|
+"""
+            for m in sorted(snapshot.members, key=lambda m: m['score'], reverse=True):
+                output += (
+                    f"| {m['name']} | {m['code']} | {m['change_pct']:+.2f}% | {m['volume_ratio']:.2f}x "
+                    f"| {m['period_change']:+.2f}% | {m['score']:.0f} | {m['flow_status']} "
+                    f"| {m['net_inflow']/100000000:+.2f}亿 |\n"
+                )
+            if snapshot.failures:
+                output += "\n**⚠️ 获取失败**: " + "; ".join(snapshot.failures) + "\n"
+            output += "\n---\n\n"
+        
+        if failures:
+            output += "**⚠️ 板块获取失败**:\n" + "\n".join(f"- {f}" for f in failures) + "\n\n---\n\n"
+        
+        output += """**📌 资金评分**: 今日涨跌幅权重50%、量能比（今日/昨日成交量）权重30%、近期涨跌权重20%，归一化到0-100；净流入为估算值
+
+*数据来源: iTick API*"""
+        return output
+    
+    @staticmethod
+    def format_realtime(ranking: List[Dict[str, Any]]) -> str:
+        """实时板块汇总报告"""
+        output = f"""## ⚡ 实时板块排名（内置板块）
+
+**查询时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+**板块数量**: {len(ranking)}
+
+| 排名 | 板块 | 平均涨跌 | 成交额 | 主动净买入 | 领涨 | 领跌 |
+|------|------|---------|--------|-----------|------|------|
+"""
+        def members(items: List[Any]) -> str:
+            return ", ".join(f"{name} ({change:+.2f}%)" for name, change in items)
+        
+        for i, sector in enumerate(ranking, 1):
+            trend = "🟢" if sector['avg_change'] > 0 else "🔴" if sector['avg_change'] < 0 else "⚪"
+            output += (
+                f"| {i} | {sector['name']} ({sector['count']}只) | {trend} {sector['avg_change']:+.2f}% "
+                f"| ¥{sector['turnover']/100000000:.2f}亿 | {sector['flow']/100000000:+.2f}亿 "
+                f"| {members(sector['leaders'])} | {members(sector['laggards'])} |\n"
+            )
+        
+        output += """
+---
+**📌 说明**: 涨跌幅和成交额以最近一次成分行情为基准，之后按逐笔成交实时更新；主动净买入按 tick rule 判断方向，仅统计采集到的成交
+
+*数据来源: iTick API（本地增量汇总）*"""
+        return output
+    
+    @staticmethod
+    async def run_sectors(names: List[str], api_key: Optional[str] = None, realtime: bool = False) -> Dict[str, Any]:
+        """分析内置板块：优先使用后台快照，没有新鲜快照时立即获取；realtime 时只读实时汇总"""
+        registry = load_registry()
+        if "all" in names:
+            names = list(registry)
+        
+        unknown = [name for name in names if name not in registry]
+        if unknown:
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": f"❌ 未知的板块: {', '.join(unknown)}\n\n**可用板块**: {', '.join(registry)}"
+                }],
+                "isError": True
+            }
+        
+        if realtime:
+            ranking = get_sector_stream().ranking(names, top_n=2)
+            if not ranking:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": "ℹ️ 暂无实时板块数据\n\n实时汇总由板块快照刷新和成分逐笔成交驱动，请在服务端启用 SECTOR_SNAPSHOT_ENABLED 或 SECTOR_STREAM_ENABLED，或先不带 realtime 查询一次板块"
+                    }]
+                }
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": SectorAnalysisTool.format_realtime(ranking)
+                }]
+            }
+        
+        # 先注册实时汇总，本次获取的成分行情也会计入
+        get_sector_stream()
+        
+        client = get_client(api_key)
+        scheduler = get_sector_scheduler()
+        names = list(dict.fromkeys(names))
+        results = await asyncio.gather(
+            *[scheduler.get_or_fetch(name, client) for name in names],
+            return_exceptions=True
+        )
+        
+        snapshots = []
+        failures = []
+        for name, result in zip(names, results):
+            if isinstance(result, ItickAPIError):
+                failures.append(f"{name}: [{result.code}] {result.message}")
+            elif isinstance(result, Exception):
+                failures.append(f"{name}: {result}")
+            else:
+                snapshots.append(result)
+        
+        if not snapshots:
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": "❌ 未能获取任何板块数据\n\n" + "\n".join(f"- {f}" for f in failures)
+                }],
+                "isError": True
+            }
+        
+        return {
+            "content": [{
+                "type": "text",
+                "text": SectorAnalysisTool.format_sector_snapshots(snapshots, failures)
+            }]
+        }
+    
     @staticmethod
     async def run(arguments: Dict[str, Any], api_key: Optional[str] = None) -> Dict[str, Any]:
         """执行板块分析"""
         try:
             stocks = arguments.get("stocks", [])
+            sectors = arguments.get("sectors") or []
+            
+            if sectors and not stocks:
+                return await SectorAnalysisTool.run_sectors(
+                    [str(name) for name in sectors],
+                    api_key,
+                    bool(arguments.get("realtime", False))
+                )
+            
             period = arguments.get("period", "day")
             days = arguments.get("days", 10)
+            max_concurrency = int(arguments.get("max_concurrency", SectorAnalysisTool.MAX_CONCURRENT_STOCKS))
             
             if not stocks or len(stocks) < 2:
                 return {
                     "content": [{
                         "type": "text",
-                        "text": "❌ 至少需要2只股票才能进行板块分析\n\n示例: [{\"region\": \"SH\", \"code\": \"600519\", \"name\": \"茅台\", \"sector\": \"白酒\"}]"
+                        "text": "❌ 至少需要2只股票才能进行板块分析（或通过 sectors 指定内置板块）\n\n示例: [{\"region\": \"SH\", \"code\": \"600519\", \"name\": \"茅台\", \"sector\": \"白酒\"}]\n\n**可用内置板块**: " + ", ".join(load_registry())
                     }],
                     "isError": True
                 }
             
             client = get_client(api_key)
             
-            # 收集股票数据
+            # 所有股票的行情和K线并发获取，单只股票失败或超时不影响其他股票
+            semaphore = asyncio.Semaphore(max(1, max_concurrency))
+            
+            async def fetch(stock_info: Dict[str, Any]) -> Dict[str, Any]:
+                async with semaphore:
+                    return await SectorAnalysisTool.fetch_stock(client, stock_info, period, days)
+            
+            results = await asyncio.gather(*[
+                fetch(stock_info) for stock_info in stocks
+                if stock_info.get("region") and stock_info.get("code")
+            ])
+            
             stock_results = []
             sector_groups = {}  # 按板块分组
+            failures = []
             
-            for stock_info in stocks:
-                region = stock_info.get("region")
-                code = stock_info.get("code")
-                name = stock_info.get("name", code)
-                sector = stock_info.get("sector", "未分类")
-                
-                if not region or not code:
+            for stock_data in results:
+                label = f"{stock_data['name']} ({stock_data['region']}.{stock_data['code']})"
+                if "error" in stock_data:
+                    failures.append(f"{label}: {stock_data['error']}")
                     continue
+                if stock_data.get("history_error"):
+                    failures.append(f"{label}: K线获取失败，资金流向按0计 - {stock_data['history_error']}")
                 
-                try:
-                    # 获取实时行情
-                    quote_data = await client.get_stock_quote(str(region), str(code))
-                    
-                    # 获取K线数据（计算资金流向）
-                    kline_data = await client.get_stock_kline(
-                        region=str(region),
-                        code=str(code),
-                        period=period,
-                        limit=days
-                    )
-                    
-                    latest_price = quote_data.get('ld', 0)
-                    change_pct = quote_data.get('chp', 0)
-                    volume = quote_data.get('v', 0)
-                    turnover = quote_data.get('tu', 0)
-                    
-                    # 计算资金流向（简化版）
-                    money_flow = 0
-                    if kline_data:
-                        for kline in kline_data:
-                            open_p = float(kline.get('o', 0))
-                            close_p = float(kline.get('c', 0))
-                            tu = float(kline.get('tu', 0))
-                            
-                            if close_p >= open_p:
-                                money_flow += tu
-                            else:
-                                money_flow -= tu
-                    
-                    stock_data = {
-                        "name": name,
-                        "region": region,
-                        "code": code,
-                        "sector": sector,
-                        "latest_price": latest_price,
-                        "change_pct": change_pct,
-                        "volume": volume,
-                        "turnover": turnover,
-                        "money_flow": money_flow
-                    }
-                    
-                    stock_results.append(stock_data)
-                    
-                    # 按板块分组
-                    if sector not in sector_groups:
-                        sector_groups[sector] = []
-                    sector_groups[sector].append(stock_data)
-                    
-                except Exception as e:
-                    continue
+                stock_results.append(stock_data)
+                sector_groups.setdefault(stock_data["sector"], []).append(stock_data)
             
             if not stock_results:
                 return {
                     "content": [{
                         "type": "text",
-                        "text": "❌ 未能获取任何股票数据"
+                        "text": "❌ 未能获取任何股票数据\n\n" + "\n".join(f"- {f}" for f in failures[:20])
                     }],
                     "isError": True
                 }
@@ -211,13 +451,19 @@ class SectorAnalysisTool:
 
 **分析时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 **分析周期**: {period} × {days}天
-**分析股票**: {len(stock_results)}只
+**分析股票**: {len(stock_results)}/{len(results)}只
 **涉及板块**: {len(sector_groups)}个
 
 ---
 
 """
             
+            if failures:
+                output += f"**⚠️ 数据获取问题 ({len(failures)})**:\n" + "\n".join(f"- {f}" for f in failures[:10])
+                if len(failures) > 10:
+                    output += f"\n- ……等 {len(failures)} 条"
+                output += "\n\n---\n\n"
+            
             # 板块汇总
             sector_summary = []
             
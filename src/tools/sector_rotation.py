@@ -0,0 +1,375 @@
+"""
+Sector Rotation Tool - 板块轮动工具
+按日计算各板块相对全部板块等权基准的滚动相对强弱及排名，识别轮动方向和动量领先板块
+"""
+from typing import Dict, Any, Optional, List
+from datetime import datetime
+import asyncio
+import numpy as np
+from ..itick_client import get_client, ItickAPIError
+from ..kline_frame import KlineFrame
+from ..compute import get_executor
+from ..sectors import load_registry
+from .. import indicators as ind
+
+
+class SectorRotationTool:
+    """板块轮动工具 - 板块相对强弱排名随时间的变化"""
+    
+    name = "itick_sector_rotation"
+    description = """分析【多个板块之间的轮动】：按日计算各板块相对强弱排名的变化，找出正在走强和走弱的板块。
+
+⚠️ **重要提示 - 工具适用范围**:
+- ✅ 适用于: 板块轮动、板块强弱排名变化（如"最近60天哪些板块在轮动走强"）
+- ❌ 单日板块涨跌和资金流向 → 请使用 itick_sector_analysis
+- ❌ 大盘指数对比 → 请使用 itick_index_analysis
+
+📊 **板块来源**（二选一）:
+- sectors: 内置板块名称（默认全部内置板块：科技、消费、金融、新能源、港股科技、港股医疗）
+- stocks: 自定义股票列表，每只股票指定所属板块（sector）
+
+📈 **计算方法**:
+- 板块日收益 = 成分股当日对数收益率的等权平均（成分停牌当日不计入）
+- 基准 = 所有板块日收益的等权平均
+- 相对强弱 = 板块相对基准在 rs_window 日内的超额涨幅，每日按相对强弱排名（1=最强）
+
+⚡ **性能说明**:
+- K线优先读取本地存储，成分并发获取（受客户端限流保护）
+- 板块 × 交易日矩阵一次向量化计算
+
+💡 **示例查询**:
+- "最近60天A股板块轮动情况"
+- "科技和新能源板块谁在走强"
+"""
+    
+    parameters = {
+        "type": "object",
+        "properties": {
+            "sectors": {
+                "type": "array",
+                "items": {
+                    "type": "string"
+                },
+                "description": "内置板块名称，默认全部内置板块"
+            },
+            "stocks": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "region": {
+                            "type": "string",
+                            "description": "市场代码"
+                        },
+                        "code": {
+                            "type": "string",
+                            "description": "股票代码"
+                        },
+                        "name": {
+                            "type": "string",
+                            "description": "股票名称"
+                        },
+                        "sector": {
+                            "type": "string",
+                            "description": "所属板块"
+                        }
+                    },
+                    "required": ["region", "code", "sector"]
+                },
+                "description": "自定义板块成分（与 sectors 二选一）"
+            },
+            "days": {
+                "type": "integer",
+                "description": "轮动分析的交易日数",
+                "default": 60,
+                "minimum": 10,
+                "maximum": 250
+            },
+            "rs_window": {
+                "type": "integer",
+                "description": "相对强弱的滚动窗口（交易日）",
+                "default": 20,
+                "minimum": 2,
+                "maximum": 120
+            },
+            "top_n": {
+                "type": "integer",
+                "description": "动量领先/落后各显示的板块数量",
+                "default": 3,
+                "minimum": 1,
+                "maximum": 10
+            }
+        }
+    }
+    
+    # 同时获取的成分数量上限
+    MAX_CONCURRENT_STOCKS = 16
+    
+    # 单只成分K线的获取时限（秒）
+    FETCH_TIMEOUT = 10.0
+    
+    # 热力图列数
+    HEATMAP_COLUMNS = 12
+    
+    @staticmethod
+    def rotation_matrix(frames: List[KlineFrame], groups: List[int], sectors: int, window: int) -> Dict[str, np.ndarray]:
+        """
+        计算板块 × 交易日的相对强弱和排名
+        
+        Args:
+            frames: 所有成分的日K线
+            groups: 每个成分所属板块的序号
+            sectors: 板块数量
+            window: 相对强弱窗口
+        
+        Returns:
+            timeline: 交易日时间戳; rs: 相对强弱(%); ranks: 每日排名（1=最强，无数据为 NaN）;
+            index: 板块净值（起点为1）
+        """
+        timeline, _, returns, mask = ind.aligned_returns([f.t for f in frames], [f.c for f in frames])
+        
+        # 成分收益按板块等权平均：membership (板块 × 成分) 矩阵乘法
+        membership = np.zeros((sectors, len(frames)))
+        membership[groups, np.arange(len(frames))] = 1.0
+        weights = mask.astype(np.float64)
+        counts = membership @ weights
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sector_returns = np.where(counts > 0, (membership @ (returns * weights)) / counts, 0.0)
+        
+        # 基准为各板块的等权平均，作为最后一行参与相对强弱计算
+        benchmark = sector_returns.mean(axis=0, keepdims=True)
+        log_index = np.concatenate(
+            [np.zeros((sectors + 1, 1)), np.cumsum(np.vstack([sector_returns, benchmark]), axis=1)],
+            axis=1
+        )
+        index = np.exp(log_index)
+        rs = ind.relative_strength(index, sectors, window)[:sectors]
+        
+        # 按日排名：相对强弱降序，NaN 排在最后
+        valid = ~np.isnan(rs)
+        order = np.argsort(np.where(valid, -rs, np.inf), axis=0, kind="stable")
+        ranks = np.empty(rs.shape)
+        np.put_along_axis(ranks, order, np.arange(1.0, sectors + 1)[:, None] * np.ones(rs.shape), axis=0)
+        ranks[~valid] = np.nan
+        
+        return {
+            "timeline": timeline,
+            "rs": rs,
+            "ranks": ranks,
+            "index": index[:sectors]
+        }
+    
+    @staticmethod
+    async def run(arguments: Dict[str, Any], api_key: Optional[str] = None) -> Dict[str, Any]:
+        """执行板块轮动分析"""
+        try:
+            stocks = arguments.get("stocks") or []
+            names = arguments.get("sectors") or []
+            days = int(arguments.get("days", 60))
+            rs_window = int(arguments.get("rs_window", 20))
+            top_n = int(arguments.get("top_n", 3))
+            
+            if not stocks:
+                registry = load_registry()
+                names = list(registry) if not names or "all" in names else [str(n) for n in names]
+                unknown = [name for name in names if name not in registry]
+                if unknown:
+                    return {
+                        "content": [{
+                            "type": "text",
+                            "text": f"❌ 未知的板块: {', '.join(unknown)}\n\n**可用板块**: {', '.join(registry)}"
+                        }],
+                        "isError": True
+                    }
+                stocks = [
+                    {**member, "sector": name}
+                    for name in names
+                    for member in registry[name]["members"]
+                ]
+            
+            stocks = [s for s in stocks if s.get("region") and s.get("code") and s.get("sector")]
+            sector_names = list(dict.fromkeys(str(s["sector"]) for s in stocks))
+            if len(sector_names) < 2:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": "❌ 至少需要2个板块才能进行轮动分析"
+                    }],
+                    "isError": True
+                }
+            
+            client = get_client(api_key)
+            semaphore = asyncio.Semaphore(SectorRotationTool.MAX_CONCURRENT_STOCKS)
+            
+            async def fetch(stock: Dict[str, Any]) -> KlineFrame:
+                async with semaphore:
+                    return await asyncio.wait_for(
+                        client.get_stock_kline_frame(
+                            region=str(stock["region"]),
+                            code=str(stock["code"]),
+                            period="day",
+                            limit=days + rs_window + 1
+                        ),
+                        timeout=SectorRotationTool.FETCH_TIMEOUT
+                    )
+            
+            responses = await asyncio.gather(*[fetch(s) for s in stocks], return_exceptions=True)
+            
+            frames = []
+            groups = []
+            failures = []
+            for stock, response in zip(stocks, responses):
+                label = f"{stock.get('name', stock['code'])} ({stock['region']}.{stock['code']})"
+                if isinstance(response, asyncio.TimeoutError):
+                    failures.append(f"{label}: 请求超时（>{SectorRotationTool.FETCH_TIMEOUT}秒）")
+                elif isinstance(response, ItickAPIError):
+                    failures.append(f"{label}: [{response.code}] {response.message}")
+                elif isinstance(response, Exception):
+                    failures.append(f"{label}: {response}")
+                elif len(response) < 2:
+                    failures.append(f"{label}: K线不足")
+                else:
+                    frames.append(response)
+                    groups.append(sector_names.index(str(stock["sector"])))
+            
+            covered = sorted(set(groups))
+            if len(covered) < 2:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": "❌ 有效数据不足2个板块\n\n" + "\n".join(f"- {f}" for f in failures[:20])
+                    }],
+                    "isError": True
+                }
+            
+            # 只保留有数据的板块
+            sector_names = [sector_names[i] for i in covered]
+            groups = [covered.index(g) for g in groups]
+            
+            stats = await get_executor().run(
+                SectorRotationTool.rotation_matrix,
+                frames,
+                groups,
+                len(sector_names),
+                rs_window,
+                size=sum(len(f) for f in frames)
+            )
+            
+            timeline = stats["timeline"][-days:]
+            rs = stats["rs"][:, -days:]
+            ranks = stats["ranks"][:, -days:]
+            index = stats["index"][:, -days:]
+            
+            if np.isnan(rs[:, -1]).all():
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": f"❌ 历史K线不足，无法计算 {rs_window} 日相对强弱"
+                    }],
+                    "isError": True
+                }
+            
+            def cell(value: float, spec: str) -> str:
+                return "-" if np.isnan(value) else format(value, spec)
+            
+            # 当前排名与排名变化
+            lag = min(5, len(timeline) - 1)
+            rows = []
+            for i, name in enumerate(sector_names):
+                rows.append({
+                    "name": name,
+                    "rank": ranks[i, -1],
+                    "rank_5d": ranks[i, -1 - lag] - ranks[i, -1],
+                    "rank_period": ranks[i, 0] - ranks[i, -1],
+                    "rs": rs[i, -1],
+                    "rs_5d": rs[i, -1] - rs[i, -1 - lag],
+                    "return": (index[i, -1] / index[i, 0] - 1) * 100
+                })
+            rows.sort(key=lambda r: np.inf if np.isnan(r["rank"]) else r["rank"])
+            
+            start_date = datetime.fromtimestamp(timeline[0] / 1000).strftime('%Y-%m-%d')
+            end_date = datetime.fromtimestamp(timeline[-1] / 1000).strftime('%Y-%m-%d')
+            
+            output = f"""## 🔄 板块轮动分析
+
+**分析区间**: {start_date} ~ {end_date}（{len(timeline)}个交易日）
+**相对强弱窗口**: {rs_window}日 | **板块数量**: {len(sector_names)} | **成分数量**: {len(frames)}/{len(stocks)}
+
+---
+
+### 📊 当前相对强弱排名
+
+| 排名 | 板块 | {rs_window}日相对强弱 | 5日强弱变化 | 5日排名变化 | 区间排名变化 | 区间涨跌 |
+|------|------|-------------------|------------|------------|-------------|---------|
+"""
+            for row in rows:
+                output += (
+                    f"| {cell(row['rank'], '.0f')} | {row['name']} | {cell(row['rs'], '+.2f')}% "
+                    f"| {cell(row['rs_5d'], '+.2f')} | {cell(row['rank_5d'], '+.0f')} "
+                    f"| {cell(row['rank_period'], '+.0f')} | {cell(row['return'], '+.2f')}% |\n"
+                )
+            
+            # 动量领先/落后：按近5日相对强弱变化
+            momentum = sorted(
+                (r for r in rows if not np.isnan(r["rs_5d"])),
+                key=lambda r: r["rs_5d"],
+                reverse=True
+            )
+            if momentum:
+                output += "\n### 🚀 动量领先（近5日相对强弱提升最多）\n\n"
+                for r in momentum[:top_n]:
+                    output += f"- **{r['name']}**: 相对强弱 {r['rs_5d']:+.2f}，当前第 {cell(r['rank'], '.0f')} 名\n"
+                output += "\n### 🧊 动量落后（近5日相对强弱下降最多）\n\n"
+                for r in momentum[::-1][:top_n]:
+                    output += f"- **{r['name']}**: 相对强弱 {r['rs_5d']:+.2f}，当前第 {cell(r['rank'], '.0f')} 名\n"
+            
+            # 排名热力图：等间隔抽取交易日
+            columns = np.unique(np.linspace(0, len(timeline) - 1, SectorRotationTool.HEATMAP_COLUMNS).astype(int))
+            header = " | ".join(datetime.fromtimestamp(timeline[c] / 1000).strftime('%m-%d') for c in columns)
+            output += f"""
+### 🗺️ 排名热力图（1=最强）
+
+| 板块 | {header} |
+|------|{"|".join("------" for _ in columns)}|
+"""
+            for row in rows:
+                i = sector_names.index(row["name"])
+                output += f"| {row['name']} | " + " | ".join(cell(ranks[i, c], ".0f") for c in columns) + " |\n"
+            
+            if failures:
+                output += f"\n**⚠️ 跳过 {len(failures)} 只成分**:\n" + "\n".join(f"- {f}" for f in failures[:10])
+                if len(failures) > 10:
+                    output += f"\n- ……等 {len(failures)} 只"
+                output += "\n"
+            
+            output += """
+---
+**📌 说明**: 相对强弱 = 板块净值相对全部板块等权基准在窗口内的超额涨幅；排名变化为正表示名次上升
+
+**⚠️ 风险提示**: 板块轮动分析基于历史数据，不构成投资建议。
+
+*计算时间: """ + datetime.now().strftime('%Y-%m-%d %H:%M:%S') + "*"
+
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": output
+                }]
+            }
+        
+        except ItickAPIError as e:
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": f"❌ iTick API 错误: [{e.code}] {e.message}"
+                }],
+                "isError": True
+            }
+        except Exception as e:
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": f"❌ 系统错误: {str(e)}"
+                }],
+                "isError": True
+            }
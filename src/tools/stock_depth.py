@@ -3,7 +3,11 @@ Stock Depth Tool - 股票盘口深度工具
 获取买卖盘口的五档/十档深度数据
 """
 from typing import Dict, Any, Optional
+import numpy as np
 from ..itick_client import get_client, ItickAPIError
+from ..depth_book import get_depth_engine
+from ..order_book import OrderBook
+from ..output_format import OUTPUT_FORMAT_PARAM, table_result, table_schema, validate_format
 
 
 class StockDepthTool:
@@ -39,6 +43,14 @@ class StockDepthTool:
 💡 **示例查询**:
 - "查看阿里巴巴(09988.HK)的盘口深度"
 - "分析比亚迪(002594.SZ)的买卖盘情况"
+
+📐 **盘口指标** (本地计算):
+- 价差(绝对值/基点)、中间价、微观价格(按买一卖一挂单量加权)
+- 累计挂单量、前1/5/10档委比（买卖力量对比）
+- 指定 order_size 时按当前挂单估算市价买入/卖出的成交均价、吃到的档位和滑点
+- 盘口在一段时间内的变化（如某价位的大单是否一直都在）请使用 itick_depth_history
+
+🧾 **输出格式** (output_format): markdown(默认) / json / csv / columnar-json，机器可读格式每档一行：side(ask/bid), level, price, volume, orders, cum_volume；指标在 structuredContent 的 metrics 中
 """
     
     parameters = {
@@ -52,17 +64,163 @@ class StockDepthTool:
             "code": {
                 "type": "string",
                 "description": "股票代码"
-            }
+            },
+            "order_size": {
+                "type": "number",
+                "description": "估算冲击成本的委托数量（股，可选）。按当前挂单计算市价买入/卖出的成交均价和相对中间价的滑点",
+                "exclusiveMinimum": 0
+            },
+            "output_format": OUTPUT_FORMAT_PARAM
         },
         "required": ["region", "code"]
     }
     
+    # 机器可读输出的列：买卖方向(ask/bid)、档位、价格、挂单量、订单数、自最优价起的累计挂单量
+    COLUMNS = {
+        "side": "string",
+        "level": "integer",
+        "price": "number",
+        "volume": "number",
+        "orders": "integer",
+        "cum_volume": "number"
+    }
+    
+    output_schema = table_schema(
+        {
+            "region": {"type": "string"},
+            "code": {"type": "string"},
+            "metrics": {
+                "type": "object",
+                "description": "盘口指标：best_bid, best_ask, spread, spread_bps, mid, microprice, bid_depth, ask_depth, bid_notional, ask_notional, imbalance(各档位数的委比), buy/sell(指定 order_size 时的冲击成本估算)"
+            }
+        },
+        COLUMNS
+    )
+    
+    @staticmethod
+    def depth_columns(book: OrderBook) -> Dict[str, Any]:
+        """
+        盘口转为列（卖盘在前，各自按档位顺序）
+        
+        Returns:
+            {side, level, price, volume, orders, cum_volume}
+        """
+        sides = [("ask", *book.side("ask")), ("bid", *book.side("bid"))]
+        return {
+            "side": [name for name, price, _, _ in sides for _ in range(len(price))],
+            "level": np.concatenate([np.arange(1, len(price) + 1) for _, price, _, _ in sides]),
+            "price": np.concatenate([price for _, price, _, _ in sides]),
+            "volume": np.concatenate([volume for _, _, volume, _ in sides]),
+            "orders": np.concatenate([orders for _, _, _, orders in sides]),
+            "cum_volume": np.concatenate([np.cumsum(volume) for _, _, volume, _ in sides])
+        }
+    
+    @staticmethod
+    def format_markdown(book: OrderBook, metrics: Dict[str, Any], region: str, code: str) -> str:
+        """生成盘口深度及买卖力量对比的 markdown 报告"""
+        if book.empty:
+            return f"""## 📊 股票盘口深度
+
+**股票信息**
+- 股票代码: {code}
+- 市场: {region}
+
+⚠️ **未获取到盘口挂单**（可能未开市、停牌或该市场不提供盘口数据）
+
+---
+*数据来源: iTick API*
+"""
+        
+        # 卖盘从高到低，买盘从高到低
+        rows = []
+        for name, label in (("ask", "卖"), ("bid", "买")):
+            price, volume, orders = book.side(name)
+            cumulative = np.cumsum(volume)
+            levels = [
+                f"| {label}{i + 1} | {p:g} | {v:,.0f} | {o} | {c:,.0f} |"
+                for i, (p, v, o, c) in enumerate(zip(
+                    price.tolist(), volume.tolist(), orders.tolist(), cumulative.tolist()
+                ))
+            ]
+            rows.extend(reversed(levels) if name == "ask" else levels)
+        table = "| 档位 | 价格 | 挂单量 | 订单数 | 累计挂单量 |\n|------|------|--------|--------|------------|\n" + "\n".join(rows)
+        
+        def price_text(value):
+            return "—" if value is None else f"{value:g}"
+        
+        lines = [f"- 买一 / 卖一: {price_text(metrics['best_bid'])} / {price_text(metrics['best_ask'])}"]
+        if metrics["spread"] is not None:
+            lines.append(f"- 价差: {metrics['spread']:g}（{metrics['spread_bps']:.1f} bp）")
+            lines.append(f"- 中间价: {metrics['mid']:.4f}，微观价格: {metrics['microprice']:.4f}")
+        else:
+            lines.append("- ⚠️ 只有单边挂单（可能涨停或跌停），无法计算价差和中间价")
+        for item in metrics["imbalance"]:
+            if item["imbalance"] is not None:
+                lines.append(
+                    f"- 前{item['levels']}档委比: {item['imbalance'] * 100:+.2f}%"
+                    f"（买 {item['bid_volume']:,.0f} / 卖 {item['ask_volume']:,.0f}）"
+                )
+        lines.append(
+            f"- 总挂单: 买 {metrics['bid_depth']:,.0f}（{metrics['bid_notional']:,.0f} 元）"
+            f" / 卖 {metrics['ask_depth']:,.0f}（{metrics['ask_notional']:,.0f} 元）"
+        )
+        
+        top = next((item["imbalance"] for item in reversed(metrics["imbalance"]) if item["imbalance"] is not None), None)
+        if top is not None:
+            if top > 0.2:
+                lines.append("- 💪 买盘挂单明显多于卖盘，下方承接较强")
+            elif top < -0.2:
+                lines.append("- ⚠️ 卖盘挂单明显多于买盘，上方抛压较重")
+            else:
+                lines.append("- ⚖️ 买卖挂单大致均衡")
+        
+        impact = ""
+        for name, label in (("buy", "市价买入"), ("sell", "市价卖出")):
+            sweep = metrics[name]
+            if sweep is None:
+                continue
+            if sweep["vwap"] is None:
+                impact += f"- {label} {sweep['size']:,.0f}: 对手盘无挂单\n"
+                continue
+            impact += (
+                f"- {label} {sweep['size']:,.0f}: 成交均价 {sweep['vwap']:.4f}，最差价 {sweep['worst_price']:g}，"
+                f"吃到第 {sweep['levels']} 档"
+            )
+            if sweep["slippage_bps"] is not None:
+                impact += f"，滑点 {sweep['slippage_bps']:.1f} bp"
+            if sweep["filled"] < sweep["size"]:
+                impact += f"（可见挂单只够成交 {sweep['filled']:,.0f}）"
+            impact += "\n"
+        if impact:
+            impact = f"\n**冲击成本估算**（按当前可见挂单）\n{impact}"
+        
+        summary = "\n".join(lines)
+        return f"""## 📊 股票盘口深度
+
+**股票信息**
+- 股票代码: {code}
+- 市场: {region}
+
+**盘口**
+
+{table}
+
+**买卖力量对比**
+{summary}
+{impact}
+---
+*数据来源: iTick API*
+*说明: 委比 = (买量 - 卖量) / (买量 + 卖量)；微观价格按买一卖一挂单量加权，买盘挂单多时偏向卖一*
+"""
+    
     @staticmethod
     async def run(arguments: Dict[str, Any], api_key: Optional[str] = None) -> Dict[str, Any]:
         """执行工具逻辑"""
         try:
             region = arguments.get("region")
             code = arguments.get("code")
+            order_size = arguments.get("order_size")
+            output_format = arguments.get("output_format", "markdown")
             
             if not region or not code:
                 return {
@@ -73,31 +231,29 @@ class StockDepthTool:
                     "isError": True
                 }
             
+            format_error = validate_format(output_format)
+            if format_error:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": format_error
+                    }],
+                    "isError": True
+                }
+            
             # 调用 iTick API
             client = get_client(api_key)
             data = await client.get_stock_depth(region, code)
             
-            # 格式化输出
-            result = f"""## 📊 股票盘口深度
-
-**股票信息**
-- 股票代码: {data.get('s', code)}
-- 市场: {region}
-
-**盘口数据**
-{data}
-
----
-*数据来源: iTick API*
-*说明: 盘口深度反映当前买卖挂单情况，可用于判断支撑阻力位*
-"""
-            
-            return {
-                "content": [{
-                    "type": "text",
-                    "text": result
-                }]
-            }
+            # 快照同时更新本地维护的盘口（开启盘口记录时写入盘口历史）
+            book = get_depth_engine().on_depth(str(region), str(code), data or {})
+            metrics = book.metrics(float(order_size) if order_size else None)
+            return table_result(
+                {"region": str(region), "code": str(code), "metrics": metrics},
+                StockDepthTool.depth_columns(book),
+                output_format,
+                lambda: StockDepthTool.format_markdown(book, metrics, str(region), str(code))
+            )
             
         except ItickAPIError as e:
             return {
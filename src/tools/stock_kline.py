@@ -4,7 +4,16 @@ Stock Kline Tool - 股票K线数据工具
 """
 from typing import Dict, Any, Optional
 from datetime import datetime
-from ..itick_client import get_client, ItickAPIError
+from ..config import settings
+from ..itick_client import get_client, date_range_ms, ItickAPIError
+from ..kline_frame import KlineFrame
+from ..resample import SECOND_PERIODS
+from ..tick_bars import get_tick_bars
+from ..tick_feed import get_tick_feed
+from ..downsample import DOWNSAMPLE_METHODS, downsample
+from ..output_format import (
+    FRAME_COLUMNS, OUTPUT_FORMAT_PARAM, STRUCTURED_ROWS, frame_columns, table_result, table_schema, validate_format
+)
 
 
 class StockKlineTool:
@@ -25,7 +34,9 @@ class StockKlineTool:
 - 进行量价分析
 
 ⏰ **支持的时间周期**:
-- 短周期: 1min(1分钟), 5min(5分钟), 60min(1小时)
+- 秒级: 1s, 5s, 15s, 30s — 由本地采集的逐笔成交实时合成（首次查询时开始采集该股票，只有开始采集之后的数据）
+- 短周期: 1min(1分钟), 5min(5分钟), 15min(15分钟), 30min(30分钟), 60min(1小时)
+- 15min/30min 由5分钟K线在本地按交易时段合成
 - 长周期: day(日线), week(周线), month(月线)
 
 📍 **使用建议**:
@@ -38,6 +49,12 @@ class StockKlineTool:
 - "获取腾讯(00700.HK)最近30天的日K线数据"
 - "查看茅台(600519.SH)2024年1月到3月的周K线"
 - "分析苹果(AAPL)最近3个月的日K走势"
+
+🧾 **输出格式** (output_format):
+- markdown(默认): 区间统计 + 最新20条明细（structuredContent 同样只含这20条）
+- json / csv / columnar-json: 文本返回区间内全部K线，t 为 Unix 毫秒时间戳，适合程序处理；structuredContent 最多含最新1000条
+
+📉 **长区间降采样** (max_points): 如一年的1分钟线，可指定 max_points=500，按 ohlc（分桶聚合蜡烛图）或 lttb（保留收盘价走势的原始K线）压缩，返回大小有上限且走势不失真
 """
     
     parameters = {
@@ -64,114 +81,109 @@ class StockKlineTool:
             },
             "period": {
                 "type": "string",
-                "description": "K线时间周期。可选值: 1min(1分钟), 5min(5分钟), 60min(1小时), day(日线-默认), week(周线), month(月线)",
-                "enum": ["1min", "5min", "60min", "day", "week", "month"],
+                "description": "K线时间周期。可选值: 1s/5s/15s/30s(秒级，由逐笔成交合成), 1min(1分钟), 5min(5分钟), 15min(15分钟), 30min(30分钟), 60min(1小时), day(日线-默认), week(周线), month(月线)",
+                "enum": [*SECOND_PERIODS, "1min", "5min", "15min", "30min", "60min", "day", "week", "month"],
                 "default": "day"
-            }
+            },
+            "max_points": {
+                "type": "integer",
+                "description": "返回K线的最大条数（可选）。区间内K线更多时在服务端降采样，保留整体走势，适合长区间的分钟线",
+                "minimum": 10,
+                "maximum": 5000
+            },
+            "downsample": {
+                "type": "string",
+                "description": "降采样方法（指定 max_points 时生效）。ohlc=按条数分桶聚合为蜡烛图(默认，量额为桶内合计), lttb=按收盘价走势(LTTB)挑选原始K线",
+                "enum": list(DOWNSAMPLE_METHODS),
+                "default": "ohlc"
+            },
+            "output_format": OUTPUT_FORMAT_PARAM
         },
         "required": ["region", "code", "start_date", "end_date"]
     }
     
+    output_schema = table_schema(
+        {
+            "region": {"type": "string"},
+            "code": {"type": "string"},
+            "period": {"type": "string"},
+            "start_date": {"type": "string"},
+            "end_date": {"type": "string"},
+            "count": {"type": "integer", "description": "返回的K线条数"},
+            "source_count": {"type": "integer", "description": "降采样前区间内的K线条数"},
+            "downsample": {"type": ["string", "null"], "description": "实际使用的降采样方法，未降采样时为 null"}
+        },
+        FRAME_COLUMNS
+    )
+    
+    # markdown 明细显示的K线条数（未降采样时），structuredContent 只包含这些K线
+    DETAIL_ROWS = 20
+    
     @staticmethod
-    async def run(arguments: Dict[str, Any], api_key: Optional[str] = None) -> Dict[str, Any]:
-        """执行K线数据查询"""
-        try:
-            region = arguments.get("region")
-            code = arguments.get("code")
-            start_date = arguments.get("start_date")
-            end_date = arguments.get("end_date")
-            period = arguments.get("period", "day")
-            
-            if not all([region, code, start_date, end_date]):
-                return {
-                    "content": [{
-                        "type": "text",
-                        "text": "❌ 缺少必需参数：region(市场), code(代码), start_date(起始日期), end_date(结束日期)"
-                    }],
-                    "isError": True
-                }
+    def format_markdown(
+        frame: KlineFrame,
+        region: str,
+        code: str,
+        period: str,
+        start_date: str,
+        end_date: str,
+        sampled: Optional[KlineFrame] = None,
+        method: Optional[str] = None
+    ) -> str:
+        """
+        生成K线数据的 markdown 报告
+        
+        区间统计基于全部K线；明细为最新 DETAIL_ROWS 条，降采样时为降采样后的全部K线。
+        """
+        if len(frame) > 0:
+            # 构建Markdown表格
+            table_header = "| 时间 | 开盘(O) | 最高(H) | 最低(L) | 收盘(C) | 成交量(V) | 成交额(T) |\n|------|---------|---------|---------|---------|-----------|----------|\n"
             
-            # 类型断言，因为上面已经检查过了
-            region_str = str(region)
-            code_str = str(code)
-            start_date_str = str(start_date)
-            end_date_str = str(end_date)
-            period_str = str(period)
+            # 显示最新的 DETAIL_ROWS 条数据（降采样时显示全部降采样结果）
+            display = frame.tail(StockKlineTool.DETAIL_ROWS) if sampled is None else sampled
+            if period in SECOND_PERIODS:
+                time_format = '%m-%d %H:%M:%S'
+            elif period in ['1min', '5min', '15min', '30min', '60min']:
+                time_format = '%m-%d %H:%M'
+            else:
+                time_format = '%Y-%m-%d'
             
-            # 调用 iTick API
-            client = get_client(api_key)
-            kline_data = await client.get_stock_kline(
-                region_str, code_str, start_date_str, end_date_str, period_str
+            table_rows = "".join(
+                f"| {datetime.fromtimestamp(t / 1000).strftime(time_format)} | {o:g} | {h:g} | {l:g} | {c:g} | {v:,.0f} | {tu:,.0f} |\n"
+                for t, o, h, l, c, v, tu in zip(
+                    display.t.tolist(), display.o.tolist(), display.h.tolist(), display.l.tolist(),
+                    display.c.tolist(), display.v.tolist(), display.tu.tolist()
+                )
             )
             
-            # 格式化K线数据
-            if isinstance(kline_data, list) and len(kline_data) > 0:
-                # 构建Markdown表格
-                table_header = "| 时间 | 开盘(O) | 最高(H) | 最低(L) | 收盘(C) | 成交量(V) | 成交额(T) |\n|------|---------|---------|---------|---------|-----------|----------|\n"
-                table_rows = ""
-                
-                # 显示最新的20条数据
-                display_data = kline_data[-20:] if len(kline_data) > 20 else kline_data
-                
-                for item in display_data:
-                    # 解析时间戳
-                    timestamp = item.get('t', 0)
-                    if timestamp:
-                        dt = datetime.fromtimestamp(timestamp / 1000)
-                        if period in ['1min', '5min', '60min']:
-                            time_str = dt.strftime('%m-%d %H:%M')
-                        else:
-                            time_str = dt.strftime('%Y-%m-%d')
-                    else:
-                        time_str = 'N/A'
-                    
-                    open_price = item.get('o', 'N/A')
-                    high = item.get('h', 'N/A')
-                    low = item.get('l', 'N/A')
-                    close = item.get('c', 'N/A')
-                    volume = item.get('v', 0)
-                    turnover = item.get('tu', 0)
-                    
-                    # 格式化数字
-                    volume_str = f"{volume:,.0f}" if isinstance(volume, (int, float)) else str(volume)
-                    turnover_str = f"{turnover:,.0f}" if isinstance(turnover, (int, float)) else str(turnover)
-                    
-                    table_rows += f"| {time_str} | {open_price} | {high} | {low} | {close} | {volume_str} | {turnover_str} |\n"
-                
-                # 计算统计信息
-                total_count = len(kline_data)
-                if total_count > 0:
-                    first_close = kline_data[0].get('c', 0)
-                    last_close = kline_data[-1].get('c', 0)
-                    if first_close and last_close:
-                        change = last_close - first_close
-                        change_pct = (change / first_close * 100) if first_close else 0
-                        trend = "📈 上涨" if change > 0 else "📉 下跌" if change < 0 else "➡️ 持平"
-                    else:
-                        change = 0
-                        change_pct = 0
-                        trend = "N/A"
-                else:
-                    change = 0
-                    change_pct = 0
-                    trend = "N/A"
-                
-                result = f"""## � 股票K线数据分析
+            # 计算统计信息
+            total_count = len(frame)
+            first_close = float(frame.c[0])
+            last_close = float(frame.c[-1])
+            change = last_close - first_close
+            change_pct = change / first_close * 100
+            trend = "📈 上涨" if change > 0 else "📉 下跌" if change < 0 else "➡️ 持平"
+            if sampled is None:
+                detail_title = f"最新 {len(display)} 条"
+            else:
+                detail_title = f"{method} 降采样: {total_count} 条 → {len(display)} 条"
+            
+            result = f"""## � 股票K线数据分析
 
 **基本信息**
-- 股票代码: {code_str}
-- 市场: {region_str}
-- 时间周期: {period_str}
-- 日期范围: {start_date_str[:4]}-{start_date_str[4:6]}-{start_date_str[6:8]} 至 {end_date_str[:4]}-{end_date_str[4:6]}-{end_date_str[6:8]}
+- 股票代码: {code}
+- 市场: {region}
+- 时间周期: {period}
+- 日期范围: {start_date[:4]}-{start_date[4:6]}-{start_date[6:8]} 至 {end_date[:4]}-{end_date[4:6]}-{end_date[6:8]}
 - 数据条数: {total_count}条
 
 **区间表现**
-- 期初收盘: {kline_data[0].get('c', 'N/A') if total_count > 0 else 'N/A'}
-- 期末收盘: {kline_data[-1].get('c', 'N/A') if total_count > 0 else 'N/A'}
+- 期初收盘: {first_close:g}
+- 期末收盘: {last_close:g}
 - 区间涨跌: {change:+.2f} ({change_pct:+.2f}%)
 - 趋势: {trend}
 
-**K线数据明细** (最新 {len(display_data)} 条)
+**K线数据明细** ({detail_title})
 
 {table_header}{table_rows}
 
@@ -186,8 +198,8 @@ class StockKlineTool:
 
 *数据来源: iTick API*
 """
-            else:
-                result = f"""## � 股票K线数据
+        else:
+            result = f"""## � 股票K线数据
 
 **查询信息**
 - 股票代码: {code}
@@ -211,13 +223,109 @@ class StockKlineTool:
 ---
 *数据来源: iTick API*
 """
+        return result
+    
+    @staticmethod
+    async def run(arguments: Dict[str, Any], api_key: Optional[str] = None) -> Dict[str, Any]:
+        """执行K线数据查询"""
+        try:
+            region = arguments.get("region")
+            code = arguments.get("code")
+            start_date = arguments.get("start_date")
+            end_date = arguments.get("end_date")
+            period = arguments.get("period", "day")
+            max_points = arguments.get("max_points")
+            method = arguments.get("downsample", "ohlc")
+            output_format = arguments.get("output_format", "markdown")
             
-            return {
-                "content": [{
-                    "type": "text",
-                    "text": result
-                }]
+            if not all([region, code, start_date, end_date]):
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": "❌ 缺少必需参数：region(市场), code(代码), start_date(起始日期), end_date(结束日期)"
+                    }],
+                    "isError": True
+                }
+            
+            format_error = validate_format(output_format)
+            if format_error is None and method not in DOWNSAMPLE_METHODS:
+                format_error = f"❌ 不支持的降采样方法: {method}（可用: {', '.join(DOWNSAMPLE_METHODS)}）"
+            if format_error:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": format_error
+                    }],
+                    "isError": True
+                }
+            
+            # 类型断言，因为上面已经检查过了
+            region_str = str(region)
+            code_str = str(code)
+            start_date_str = str(start_date)
+            end_date_str = str(end_date)
+            period_str = str(period)
+            
+            if period_str in SECOND_PERIODS:
+                # 秒级K线：本地由逐笔成交合成
+                region_str = region_str.upper()
+                start, end = date_range_ms(start_date_str, end_date_str, region_str)
+                frame = get_tick_bars().query(region_str, code_str, period_str, start, end)
+                # 每次查询为临时采集续期
+                feed = get_tick_feed()
+                started = not feed.watching(region_str, code_str)
+                refused = feed.watch(region_str, code_str, api_key)
+                if len(frame) == 0 and refused:
+                    return {
+                        "content": [{
+                            "type": "text",
+                            "text": f"❌ 本地没有 {region_str}.{code_str} 的逐笔成交，无法合成 {period_str} K线：{refused}"
+                        }],
+                        "isError": True
+                    }
+                if len(frame) == 0 and started:
+                    return {
+                        "content": [{
+                            "type": "text",
+                            "text": f"📡 已开始采集 {region_str}.{code_str} 的逐笔成交，{period_str} K线将在成交发生后实时合成，请稍后再查询（{settings.tick_watch_ttl // 60} 分钟内未再查询将停止采集）。"
+                        }]
+                    }
+            else:
+                # 调用 iTick API
+                client = get_client(api_key)
+                frame = await client.get_stock_kline_frame(
+                    region_str, code_str, start_date_str, end_date_str, period_str
+                )
+            
+            # 超过 max_points 时降采样
+            sampled = None
+            if max_points and len(frame) > int(max_points):
+                sampled = downsample(frame, int(max_points), method)
+            
+            meta = {
+                "region": region_str,
+                "code": code_str,
+                "period": period_str,
+                "start_date": start_date_str,
+                "end_date": end_date_str,
+                "count": len(frame if sampled is None else sampled),
+                "source_count": len(frame),
+                "downsample": None if sampled is None else method
             }
+            # markdown 格式的 structuredContent 与明细一致（降采样结果条数已由 max_points 限制）
+            if output_format == "markdown":
+                rows = StockKlineTool.DETAIL_ROWS if sampled is None else None
+            else:
+                rows = STRUCTURED_ROWS
+            return table_result(
+                meta,
+                frame_columns(frame if sampled is None else sampled),
+                output_format,
+                lambda: StockKlineTool.format_markdown(
+                    frame, region_str, code_str, period_str, start_date_str, end_date_str, sampled, method
+                ),
+                rows
+            )
             
         except ItickAPIError as e:
             return {
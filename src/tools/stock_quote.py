@@ -5,6 +5,7 @@ Stock Quote Tool - 股票实时报价工具
 from typing import Dict, Any, Optional
 from datetime import datetime
 from ..itick_client import get_client, ItickAPIError
+from ..output_format import OUTPUT_FORMAT_PARAM, table_result, table_schema, validate_format
 
 
 class StockQuoteTool:
@@ -51,6 +52,8 @@ class StockQuoteTool:
 - "查询腾讯控股(00700.HK)的最新股价"
 - "获取苹果公司(AAPL)实时报价"
 - "查看茅台(600519.SH)当前价格"
+
+🧾 **输出格式** (output_format): markdown(默认) / json / csv / columnar-json，机器可读格式使用 iTick 原始字段名（ld=最新价, ch/chp=涨跌额/涨跌幅, t=毫秒时间戳）
 """
     
     parameters = {
@@ -64,76 +67,80 @@ class StockQuoteTool:
             "code": {
                 "type": "string",
                 "description": "股票代码（不含市场后缀和前导零）。例如: 700(腾讯), AAPL(苹果), 600519(茅台), 1(长和), 000001(平安银行)"
-            }
+            },
+            "output_format": OUTPUT_FORMAT_PARAM
         },
         "required": ["region", "code"]
     }
     
+    # 机器可读输出的字段（iTick 行情字段名）及其 JSON 类型
+    COLUMNS = {
+        "s": "string",
+        "t": "integer",
+        "ld": "number",
+        "o": "number",
+        "h": "number",
+        "l": "number",
+        "v": "number",
+        "tu": "number",
+        "ch": "number",
+        "chp": "number",
+        "ts": "integer"
+    }
+    
+    output_schema = table_schema(
+        {
+            "region": {"type": "string"},
+            "code": {"type": "string"}
+        },
+        COLUMNS
+    )
+    
     @staticmethod
-    async def run(arguments: Dict[str, Any], api_key: Optional[str] = None) -> Dict[str, Any]:
-        """执行实时报价查询"""
-        try:
-            region = arguments.get("region")
-            code = arguments.get("code")
-            
-            if not region or not code:
-                return {
-                    "content": [{
-                        "type": "text",
-                        "text": "❌ 缺少必需参数：region（市场代码）和 code（股票代码）\n\n示例: region='HK', code='700'"
-                    }],
-                    "isError": True
-                }
-            
-            region_str = str(region)
-            code_str = str(code)
-            
-            # 调用 iTick API
-            client = get_client(api_key)
-            data = await client.get_stock_quote(region_str, code_str)
-            
-            # 解析时间戳
-            timestamp = data.get('t', 0)
-            if timestamp:
-                dt = datetime.fromtimestamp(timestamp / 1000)
-                time_str = dt.strftime('%Y-%m-%d %H:%M:%S')
-            else:
-                time_str = 'N/A'
-            
-            # 格式化数字
-            latest_price = data.get('ld', 'N/A')
-            open_price = data.get('o', 'N/A')
-            high_price = data.get('h', 'N/A')
-            low_price = data.get('l', 'N/A')
-            volume = data.get('v', 0)
-            turnover = data.get('tu', 0)
-            
-            # 计算涨跌
-            if isinstance(latest_price, (int, float)) and isinstance(open_price, (int, float)) and open_price:
-                change = latest_price - open_price
-                change_pct = (change / open_price * 100)
-                if change > 0:
-                    change_str = f"📈 +{change:.2f} (+{change_pct:.2f}%)"
-                elif change < 0:
-                    change_str = f"📉 {change:.2f} ({change_pct:.2f}%)"
-                else:
-                    change_str = f"➡️ 0.00 (0.00%)"
-            else:
-                change_str = "N/A"
-            
-            # 交易状态
-            ts_code = data.get('ts', -1)
-            if ts_code == 0:
-                status = "✅ 正常交易"
+    def format_markdown(data: Dict[str, Any], region: str, code: str) -> str:
+        """生成实时报价的 markdown 报告"""
+        # 解析时间戳
+        timestamp = data.get('t', 0)
+        if timestamp:
+            dt = datetime.fromtimestamp(timestamp / 1000)
+            time_str = dt.strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            time_str = 'N/A'
+        
+        # 格式化数字
+        latest_price = data.get('ld', 'N/A')
+        open_price = data.get('o', 'N/A')
+        high_price = data.get('h', 'N/A')
+        low_price = data.get('l', 'N/A')
+        volume = data.get('v', 0)
+        turnover = data.get('tu', 0)
+        
+        # 计算涨跌
+        if isinstance(latest_price, (int, float)) and isinstance(open_price, (int, float)) and open_price:
+            change = latest_price - open_price
+            change_pct = (change / open_price * 100)
+            if change > 0:
+                change_str = f"📈 +{change:.2f} (+{change_pct:.2f}%)"
+            elif change < 0:
+                change_str = f"📉 {change:.2f} ({change_pct:.2f}%)"
             else:
-                status = f"⚠️ 状态码: {ts_code}"
-            
-            # 格式化输出
-            result = f"""## 📊 股票实时报价
+                change_str = f"➡️ 0.00 (0.00%)"
+        else:
+            change_str = "N/A"
+        
+        # 交易状态
+        ts_code = data.get('ts', -1)
+        if ts_code == 0:
+            status = "✅ 正常交易"
+        else:
+            status = f"⚠️ 状态码: {ts_code}"
+        
+        # 格式化输出
+        result = f"""## 📊 股票实时报价
 
 **股票信息**
-- 📌 代码: {data.get('s', code_str)}
-- 🌍 市场: {region_str}
+- 📌 代码: {data.get('s', code)}
+- 🌍 市场: {region}
 - ⏰ 更新时间: {time_str}
 - 🚦 交易状态: {status}
 
@@ -157,13 +164,48 @@ class StockQuoteTool:
 *数据来源: iTick API*
 *查询时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*
 """
+        return result
+    
+    @staticmethod
+    async def run(arguments: Dict[str, Any], api_key: Optional[str] = None) -> Dict[str, Any]:
+        """执行实时报价查询"""
+        try:
+            region = arguments.get("region")
+            code = arguments.get("code")
+            output_format = arguments.get("output_format", "markdown")
             
-            return {
-                "content": [{
-                    "type": "text",
-                    "text": result
-                }]
-            }
+            if not region or not code:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": "❌ 缺少必需参数：region（市场代码）和 code（股票代码）\n\n示例: region='HK', code='700'"
+                    }],
+                    "isError": True
+                }
+            
+            format_error = validate_format(output_format)
+            if format_error:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": format_error
+                    }],
+                    "isError": True
+                }
+            
+            region_str = str(region)
+            code_str = str(code)
+            
+            # 调用 iTick API
+            client = get_client(api_key)
+            data = await client.get_stock_quote(region_str, code_str)
+            
+            return table_result(
+                {"region": region_str, "code": code_str},
+                {name: [data.get(name)] for name in StockQuoteTool.COLUMNS},
+                output_format,
+                lambda: StockQuoteTool.format_markdown(data, region_str, code_str)
+            )
             
         except ItickAPIError as e:
             return {
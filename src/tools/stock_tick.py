@@ -4,7 +4,13 @@ Stock Tick Tool - 股票Tick数据工具
 """
 from typing import Dict, Any, Optional
 from datetime import datetime
+import numpy as np
+import pytz
 from ..itick_client import get_client, ItickAPIError
+from ..config import settings
+from ..tick_recorder import get_tick_recorder, local_date, local_time_ms
+from ..resample import market_session
+from ..output_format import OUTPUT_FORMAT_PARAM, table_result, table_schema, validate_format
 
 
 class StockTickTool:
@@ -38,12 +44,20 @@ class StockTickTool:
 
 🔔 **注意事项**:
 - Tick数据更新频率极高
-- 仅显示最新一笔成交
+- 默认仅显示最新一笔成交
 - 需在交易时间内使用最有效
 
+🗂️ **历史逐笔**（需服务端开启逐笔成交记录，股票在采集列表中）:
+- history=500: 最近500笔成交
+- start_time/end_time (HH:MM 或 HH:MM:SS，市场当地时间) + 可选 date: 时间段内的成交，如 10:00 ~ 10:05
+- 附带按 tick rule 推断的主动买卖方向(side: 1=买, -1=卖, 0=未知)
+
 💡 **示例查询**:
 - "查看宁德时代(300750.SZ)的最新Tick数据"
 - "获取腾讯控股(00700.HK)实时成交记录"
+- "腾讯今天10:00到10:05之间的逐笔成交"
+
+🧾 **输出格式** (output_format): markdown(默认) / json / csv / columnar-json，列为 t(毫秒时间戳), ld(成交价), v(成交量), side(主动方向，仅历史逐笔)
 """
     
     parameters = {
@@ -57,53 +71,75 @@ class StockTickTool:
             "code": {
                 "type": "string",
                 "description": "股票代码（不含市场后缀）。例如: 300750(宁德时代), 700(腾讯), AAPL(苹果)"
-            }
+            },
+            "history": {
+                "type": "integer",
+                "description": "返回本地记录的最近N笔成交（可选，与时间段同时指定时取时间段内最近N笔）",
+                "minimum": 1,
+                "maximum": 10000
+            },
+            "date": {
+                "type": "string",
+                "description": "历史逐笔的日期 YYYYMMDD（可选，默认为最近一笔记录所在的交易日）",
+                "pattern": "^\\d{8}$"
+            },
+            "start_time": {
+                "type": "string",
+                "description": "历史逐笔的起始时间，市场当地时间 HH:MM 或 HH:MM:SS（可选）",
+                "pattern": "^\\d{2}:\\d{2}(:\\d{2})?$"
+            },
+            "end_time": {
+                "type": "string",
+                "description": "历史逐笔的结束时间（含），市场当地时间 HH:MM 或 HH:MM:SS（可选）",
+                "pattern": "^\\d{2}:\\d{2}(:\\d{2})?$"
+            },
+            "output_format": OUTPUT_FORMAT_PARAM
         },
         "required": ["region", "code"]
     }
     
+    # 机器可读输出的列及其 JSON 类型（最新成交的 side 为 null）
+    COLUMNS = {
+        "t": "integer",
+        "ld": "number",
+        "v": "number",
+        "side": "integer"
+    }
+    
+    output_schema = table_schema(
+        {
+            "region": {"type": "string"},
+            "code": {"type": "string"},
+            "source": {"type": "string", "enum": ["latest", "recorder"], "description": "latest=iTick 最新一笔, recorder=本地记录的历史逐笔"}
+        },
+        COLUMNS
+    )
+    
+    # markdown 明细显示的笔数
+    DISPLAY_TICKS = 20
+    
     @staticmethod
-    async def run(arguments: Dict[str, Any], api_key: Optional[str] = None) -> Dict[str, Any]:
-        """执行Tick数据查询"""
-        try:
-            region = arguments.get("region")
-            code = arguments.get("code")
-            
-            if not region or not code:
-                return {
-                    "content": [{
-                        "type": "text",
-                        "text": "❌ 缺少必需参数：region（市场代码）和 code（股票代码）"
-                    }],
-                    "isError": True
-                }
-            
-            region_str = str(region)
-            code_str = str(code)
-            
-            # 调用 iTick API
-            client = get_client(api_key)
-            data = await client.get_stock_tick(region_str, code_str)
-            
-            # 解析数据
-            stock_code = data.get('s', code_str)
-            latest_price = data.get('ld', 'N/A')
-            volume = data.get('v', 0)
-            timestamp = data.get('t', 0)
-            
-            # 解析时间
-            if timestamp:
-                dt = datetime.fromtimestamp(timestamp / 1000)
-                time_str = dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]  # 保留毫秒
-            else:
-                time_str = 'N/A'
-            
-            # 格式化输出
-            result = f"""## 🔄 股票Tick数据（逐笔成交）
+    def format_markdown(data: Dict[str, Any], region: str, code: str) -> str:
+        """生成最新成交的 markdown 报告"""
+        # 解析数据
+        stock_code = data.get('s', code)
+        latest_price = data.get('ld', 'N/A')
+        volume = data.get('v', 0)
+        timestamp = data.get('t', 0)
+        
+        # 解析时间
+        if timestamp:
+            dt = datetime.fromtimestamp(timestamp / 1000)
+            time_str = dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]  # 保留毫秒
+        else:
+            time_str = 'N/A'
+        
+        # 格式化输出
+        result = f"""## 🔄 股票Tick数据（逐笔成交）
 
 **股票信息**
 - 📌 代码: {stock_code}
-- 🌍 市场: {region_str}
+- 🌍 市场: {region}
 
 **最新成交**
 - 💰 成交价: **{latest_price}**
@@ -119,13 +155,169 @@ class StockTickTool:
 *数据来源: iTick API*
 *查询时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*
 """
-            
+        return result
+    
+    @staticmethod
+    def format_history(records: np.ndarray, region: str, code: str) -> str:
+        """生成历史逐笔的 markdown 报告（汇总 + 最近20笔明细）"""
+        if len(records) == 0:
+            return f"""## 🔄 历史逐笔成交
+
+**股票信息**
+- 📌 代码: {code}
+- 🌍 市场: {region}
+
+⚠️ 所选时间段内没有记录到成交
+"""
+        
+        price, volume, side = records["price"], records["volume"], records["side"]
+        amount = price * volume
+        buy = float(amount[side > 0].sum())
+        sell = float(amount[side < 0].sum())
+        total_volume = float(volume.sum())
+        vwap = float(amount.sum() / total_volume) if total_volume else float(price[-1])
+        
+        # 按市场当地时间显示（与 start_time/end_time 一致）
+        tz = pytz.timezone(market_session(region)[0])
+        
+        def time_of(t: int, layout: str = '%H:%M:%S.%f') -> str:
+            return datetime.fromtimestamp(t / 1000, tz).strftime(layout)[:-3]
+        
+        display = records[-StockTickTool.DISPLAY_TICKS:]
+        side_labels = {1: "🟢 买", -1: "🔴 卖", 0: "⚪ -"}
+        rows = "".join(
+            f"| {time_of(t)} | {p:g} | {v:,.0f} | {side_labels.get(d, '⚪ -')} |\n"
+            for t, p, v, d in zip(
+                display["t"].tolist(), display["price"].tolist(),
+                display["volume"].tolist(), display["side"].tolist()
+            )
+        )
+        first_t, last_t = int(records["t"][0]), int(records["t"][-1])
+        
+        return f"""## 🔄 历史逐笔成交
+
+**股票信息**
+- 📌 代码: {code}
+- 🌍 市场: {region}
+- ⏰ 时间范围: {time_of(first_t, '%Y-%m-%d %H:%M:%S.%f')} ~ {time_of(last_t)}（当地时间）
+- 🧾 成交笔数: {len(records)}
+
+**成交汇总**
+- 💰 最新价: **{float(price[-1]):g}** | 最高 {float(price.max()):g} | 最低 {float(price.min()):g}
+- ⚖️ 成交均价(VWAP): {vwap:.4f}
+- 📦 成交量: {total_volume:,.0f} 股 | 成交额: {float(amount.sum()):,.0f}
+- 🟢 主动买入额: {buy:,.0f} | 🔴 主动卖出额: {sell:,.0f} | 净额: {buy - sell:+,.0f}
+
+**最近 {len(display)} 笔**
+
+| 时间 | 成交价 | 成交量 | 方向 |
+|------|-------|-------|------|
+{rows}
+---
+*数据来源: 本地逐笔成交记录（主动方向按 tick rule 推断）*
+"""
+    
+    @staticmethod
+    def run_history(
+        region: str,
+        code: str,
+        history: Optional[int],
+        date: Optional[str],
+        start_time: Optional[str],
+        end_time: Optional[str],
+        output_format: str
+    ) -> Dict[str, Any]:
+        """从逐笔成交记录中查询最近N笔或时间段内的成交"""
+        if not settings.tick_recorder_enabled:
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": "❌ 服务端未开启逐笔成交记录，无法查询历史逐笔\n\n请设置 TICK_RECORDER_ENABLED=true，并把股票加入 TICK_WATCHLIST"
+                }],
+                "isError": True
+            }
+        
+        ring = get_tick_recorder().ring(region, code)
+        if ring is None or len(ring) == 0:
             return {
                 "content": [{
                     "type": "text",
-                    "text": result
-                }]
+                    "text": f"❌ 本地没有 {region}.{code} 的逐笔成交记录\n\n请把该股票加入 TICK_WATCHLIST（如 {region}.{code}）后等待采集"
+                }],
+                "isError": True
             }
+        
+        if date or start_time or end_time:
+            # 时间段按二分查找定位，默认为最近一笔记录所在的交易日
+            day = str(date) if date else local_date(region, int(ring.last()["t"]))
+            start = local_time_ms(region, day, str(start_time or "00:00"))
+            if end_time:
+                end = local_time_ms(region, day, str(end_time))
+            else:
+                end = local_time_ms(region, day, "23:59:59") + 999
+            records = ring.between(start, end)
+            if history:
+                records = records[-int(history):]
+        else:
+            records = ring.tail(int(history))
+        
+        return table_result(
+            {"region": region, "code": code, "source": "recorder"},
+            {"t": records["t"], "ld": records["price"], "v": records["volume"], "side": records["side"]},
+            output_format,
+            lambda: StockTickTool.format_history(records, region, code)
+        )
+    
+    @staticmethod
+    async def run(arguments: Dict[str, Any], api_key: Optional[str] = None) -> Dict[str, Any]:
+        """执行Tick数据查询"""
+        try:
+            region = arguments.get("region")
+            code = arguments.get("code")
+            history = arguments.get("history")
+            date = arguments.get("date")
+            start_time = arguments.get("start_time")
+            end_time = arguments.get("end_time")
+            output_format = arguments.get("output_format", "markdown")
+            
+            if not region or not code:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": "❌ 缺少必需参数：region（市场代码）和 code（股票代码）"
+                    }],
+                    "isError": True
+                }
+            
+            format_error = validate_format(output_format)
+            if format_error:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": format_error
+                    }],
+                    "isError": True
+                }
+            
+            region_str = str(region).upper()
+            code_str = str(code)
+            
+            # 历史逐笔：从本地环形文件读取
+            if history or date or start_time or end_time:
+                return StockTickTool.run_history(
+                    region_str, code_str, history, date, start_time, end_time, output_format
+                )
+            
+            # 调用 iTick API
+            client = get_client(api_key)
+            data = await client.get_stock_tick(region_str, code_str)
+            
+            return table_result(
+                {"region": region_str, "code": code_str, "source": "latest"},
+                {"t": [data.get("t")], "ld": [data.get("ld")], "v": [data.get("v")], "side": [None]},
+                output_format,
+                lambda: StockTickTool.format_markdown(data, region_str, code_str)
+            )
             
         except ItickAPIError as e:
             return {
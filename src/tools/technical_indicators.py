@@ -5,7 +5,13 @@ Technical Indicators Tool - 技术指标分析工具
 from typing import Dict, Any, Optional, List
 import math
 from datetime import datetime
+from ..config import settings
 from ..itick_client import get_client, ItickAPIError
+from ..compute import get_executor, ComputeExecutor
+from ..resample import SECOND_PERIODS
+from ..tick_bars import get_tick_bars
+from ..tick_feed import get_tick_feed
+from ..output_format import OUTPUT_FORMAT_PARAM, table_result, table_schema, validate_format
 
 
 class TechnicalIndicatorsTool:
@@ -34,7 +40,7 @@ class TechnicalIndicatorsTool:
 - 确定支撑阻力位
 - 辅助交易决策
 
-⏰ **数据周期**: 支持日线、周线、月线、分钟线
+⏰ **数据周期**: 支持日线、周线、月线、分钟线，以及由本地采集的逐笔成交合成的秒级K线（1s/5s/15s/30s）
 
 📍 **使用建议**:
 - 结合多个指标综合判断
@@ -47,13 +53,20 @@ class TechnicalIndicatorsTool:
 - RSI参数: 默认14期，>70超买，<30超卖
 - KDJ参数: (9,3,3)，J值>100超买，<0超卖
 - BOLL参数: 20期中轨，2倍标准差
+- 数据量: 按所选指标和EMA收敛精度自动计算最少所需K线条数（如仅MA5/BOLL只需少量K线）
 
 💡 **示例查询**:
 - "计算腾讯(700.HK)的MACD和RSI指标"
 - "分析茅台(600519.SH)的KDJ超买超卖情况"
 - "查看苹果(AAPL)的布林带和均线系统"
+
+🧾 **输出格式** (output_format): markdown(默认) / json / csv / columnar-json，机器可读格式每个指标字段一行：indicator, field, value
 """
     
+    # EMA收敛精度的取值范围
+    MIN_PRECISION = 0.000001
+    MAX_PRECISION = 0.1
+    
     parameters = {
         "type": "object",
         "properties": {
@@ -77,21 +90,129 @@ class TechnicalIndicatorsTool:
             },
             "period": {
                 "type": "string",
-                "enum": ["1min", "5min", "60min", "day", "week", "month"],
-                "description": "K线周期。1min=1分钟, 5min=5分钟, 60min=60分钟, day=日线, week=周线, month=月线",
+                "enum": [*SECOND_PERIODS, "1min", "5min", "15min", "30min", "60min", "day", "week", "month"],
+                "description": "K线周期。1s/5s/15s/30s=秒级(由逐笔成交合成，首次查询时开始采集), 1min=1分钟, 5min=5分钟, 15min=15分钟, 30min=30分钟, 60min=60分钟, day=日线, week=周线, month=月线",
                 "default": "day"
             },
             "limit": {
                 "type": "integer",
-                "description": "计算所需的K线数据条数（建议至少100条以保证指标准确性）",
-                "default": 200,
-                "minimum": 100,
+                "description": "手动指定K线数据条数（可选）。不指定时按所选指标和精度自动计算最少所需条数",
+                "minimum": 10,
                 "maximum": 1000
-            }
+            },
+            "precision": {
+                "type": "number",
+                "description": "EMA类指标（MACD）的收敛精度，即初始值残余权重上限。越小越精确，所需K线越多",
+                "default": 0.001,
+                "minimum": MIN_PRECISION,
+                "maximum": MAX_PRECISION
+            },
+            "output_format": OUTPUT_FORMAT_PARAM
         },
         "required": ["region", "code"]
     }
     
+    # 机器可读输出每个指标字段一行：指标、字段、值（数值或信号描述）
+    COLUMNS = {
+        "indicator": "string",
+        "field": "string",
+        "value": ["number", "string"]
+    }
+    
+    output_schema = table_schema(
+        {
+            "region": {"type": "string"},
+            "code": {"type": "string"},
+            "period": {"type": "string"},
+            "count": {"type": "integer", "description": "参与计算的K线条数"},
+            "last_close": {"type": "number"}
+        },
+        COLUMNS
+    )
+    
+    # 各指标的参数（与下方 calculate_* 默认参数保持一致）
+    MACD_PARAMS = (12, 26, 9)
+    RSI_PERIOD = 14
+    KDJ_PERIOD = 9
+    BOLL_PERIOD = 20
+    MA_PERIODS = (5, 10, 20, 60)
+    
+    # 单次请求的K线条数上限（iTick limit 最大1000）
+    MAX_LIMIT = 1000
+    
+    @staticmethod
+    def ema_warmup(period: int, precision: float) -> int:
+        """
+        计算EMA收敛所需的预热条数
+        
+        EMA以首个价格为初值，n条之后初值的残余权重为 (1-α)^n，α=2/(N+1)。
+        令其不超过 precision 即得所需条数。
+        
+        Args:
+            period: EMA周期
+            precision: 初值残余权重上限
+            
+        Returns:
+            预热K线条数
+        """
+        alpha = 2 / (period + 1)
+        return max(period, math.ceil(math.log(precision) / math.log(1 - alpha)))
+    
+    @staticmethod
+    def validate_precision(precision: Any) -> Optional[str]:
+        """
+        检查EMA收敛精度参数
+        
+        Returns:
+            错误信息，有效时为 None
+        """
+        try:
+            value = float(precision)
+        except (TypeError, ValueError):
+            value = float("nan")
+        low = TechnicalIndicatorsTool.MIN_PRECISION
+        high = TechnicalIndicatorsTool.MAX_PRECISION
+        if not low <= value <= high:
+            return f"❌ 无效的 precision: {precision}（应为 {low:g} 到 {high:g} 之间的小数，如 0.001）"
+        return None
+    
+    @staticmethod
+    def plan_lookback(indicators: List[str], precision: float = 0.001) -> int:
+        """
+        计算所选指标需要的最少K线条数
+        
+        Args:
+            indicators: 指标列表（macd/rsi/kdj/boll/ma/ema/all）
+            precision: EMA收敛精度
+            
+        Returns:
+            需要请求的K线条数（不超过 MAX_LIMIT）
+        """
+        if "all" in indicators:
+            indicators = ["macd", "rsi", "kdj", "boll", "ma"]
+        
+        tool = TechnicalIndicatorsTool
+        required = [1]
+        
+        if "macd" in indicators:
+            fast, slow, signal = tool.MACD_PARAMS
+            # 慢线EMA收敛后，DEA（DIF的EMA）还需要自身的预热
+            required.append(tool.ema_warmup(slow, precision) + tool.ema_warmup(signal, precision))
+        
+        if "rsi" in indicators:
+            required.append(tool.RSI_PERIOD + 1)
+        
+        if "kdj" in indicators:
+            required.append(tool.KDJ_PERIOD)
+        
+        if "boll" in indicators:
+            required.append(tool.BOLL_PERIOD)
+        
+        if "ma" in indicators or "ema" in indicators:
+            required.append(max(tool.MA_PERIODS))
+        
+        return min(max(required), tool.MAX_LIMIT)
+    
     @staticmethod
     def calculate_ma(prices: List[float], period: int) -> Optional[float]:
         """计算移动平均线"""
@@ -276,6 +397,94 @@ class TechnicalIndicatorsTool:
             "width": round((upper - lower) / middle * 100, 2)  # 带宽百分比
         }
     
+    @staticmethod
+    def compute_indicators(
+        closes: List[float],
+        highs: List[float],
+        lows: List[float],
+        indicators: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        计算所选指标
+        
+        Args:
+            closes: 收盘价序列
+            highs: 最高价序列
+            lows: 最低价序列
+            indicators: 指标列表
+            
+        Returns:
+            指标名称 -> 指标结果
+        """
+        results = {}
+        
+        if "all" in indicators:
+            indicators = ["macd", "rsi", "kdj", "boll", "ma"]
+        
+        if "macd" in indicators:
+            results["MACD"] = TechnicalIndicatorsTool.calculate_macd(closes)
+        
+        if "rsi" in indicators:
+            results["RSI"] = TechnicalIndicatorsTool.calculate_rsi(closes)
+        
+        if "kdj" in indicators:
+            results["KDJ"] = TechnicalIndicatorsTool.calculate_kdj(highs, lows, closes)
+        
+        if "boll" in indicators:
+            results["BOLL"] = TechnicalIndicatorsTool.calculate_boll(closes)
+        
+        if "ma" in indicators or "ema" in indicators:
+            results["均线系统"] = {
+                "MA5": round(TechnicalIndicatorsTool.calculate_ma(closes, 5) or 0, 2),
+                "MA10": round(TechnicalIndicatorsTool.calculate_ma(closes, 10) or 0, 2),
+                "MA20": round(TechnicalIndicatorsTool.calculate_ma(closes, 20) or 0, 2),
+                "MA60": round(TechnicalIndicatorsTool.calculate_ma(closes, 60) or 0, 2),
+                "当前价": round(closes[-1], 2)
+            }
+        
+        return results
+    
+    @staticmethod
+    def format_markdown(
+        results: Dict[str, Dict[str, Any]],
+        region: str,
+        code: str,
+        period: str,
+        count: int,
+        last_close: float
+    ) -> str:
+        """生成技术指标的 markdown 报告"""
+        sections = []
+        for indicator_name, indicator_data in results.items():
+            if "error" in indicator_data:
+                sections.append(f"### {indicator_name}\n\n❌ {indicator_data['error']}\n\n")
+            else:
+                items = "".join(f"- **{key}**: {value}\n" for key, value in indicator_data.items())
+                sections.append(f"### {indicator_name}\n\n{items}\n")
+        
+        return f"""## 📊 技术指标分析
+
+**股票信息**
+- 📌 代码: {region}.{code}
+- 📈 周期: {period}
+- 📅 数据量: {count} 条K线
+- 💰 最新价: {last_close:.2f}
+
+---
+
+{"".join(sections)}---
+**📌 使用提示**:
+1. 金叉(看涨): 快线上穿慢线，买入信号
+2. 死叉(看空): 快线下穿慢线，卖出信号
+3. RSI>70超买，RSI<30超卖
+4. KDJ的J值>100超买，<0超卖
+5. 价格突破布林带上轨可能超买，跌破下轨可能超卖
+6. 多个指标共振时信号更可靠
+
+**⚠️ 风险提示**: 技术指标仅供参考，不构成投资建议。请结合基本面和市场环境综合判断。
+
+*计算时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*"""
+    
     @staticmethod
     async def run(arguments: Dict[str, Any], api_key: Optional[str] = None) -> Dict[str, Any]:
         """执行技术指标计算"""
@@ -284,7 +493,9 @@ class TechnicalIndicatorsTool:
             code = arguments.get("code")
             indicators = arguments.get("indicators", ["macd", "rsi"])
             period = arguments.get("period", "day")
-            limit = arguments.get("limit", 200)
+            limit = arguments.get("limit")
+            precision = arguments.get("precision", 0.001)
+            output_format = arguments.get("output_format", "markdown")
             
             if not region or not code:
                 return {
@@ -295,98 +506,110 @@ class TechnicalIndicatorsTool:
                     "isError": True
                 }
             
-            # 获取K线数据
-            client = get_client(api_key)
-            kline_data = await client.get_stock_kline(
-                region=str(region),
-                code=str(code),
-                period=period,
-                limit=limit
-            )
-            
-            if not kline_data or len(kline_data) < 50:
+            format_error = validate_format(output_format)
+            if format_error:
                 return {
                     "content": [{
                         "type": "text",
-                        "text": f"❌ K线数据不足（需要至少50条，当前{len(kline_data)}条），无法计算技术指标"
+                        "text": format_error
                     }],
                     "isError": True
                 }
             
-            # 提取价格数据
-            closes = [float(k.get('c', 0)) for k in kline_data if k.get('c')]
-            highs = [float(k.get('h', 0)) for k in kline_data if k.get('h')]
-            lows = [float(k.get('l', 0)) for k in kline_data if k.get('l')]
-            
-            # 计算指标
-            results = {}
-            
-            if "all" in indicators:
-                indicators = ["macd", "rsi", "kdj", "boll", "ma"]
-            
-            if "macd" in indicators:
-                results["MACD"] = TechnicalIndicatorsTool.calculate_macd(closes)
-            
-            if "rsi" in indicators:
-                results["RSI"] = TechnicalIndicatorsTool.calculate_rsi(closes)
+            precision_error = TechnicalIndicatorsTool.validate_precision(precision)
+            if precision_error:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": precision_error
+                    }],
+                    "isError": True
+                }
+            precision = float(precision)
             
-            if "kdj" in indicators:
-                results["KDJ"] = TechnicalIndicatorsTool.calculate_kdj(highs, lows, closes)
+            # 按指标计算最少所需K线条数，手动指定时以 limit 为准
+            if limit:
+                limit = min(int(limit), TechnicalIndicatorsTool.MAX_LIMIT)
+            else:
+                limit = TechnicalIndicatorsTool.plan_lookback(indicators, precision)
             
-            if "boll" in indicators:
-                results["BOLL"] = TechnicalIndicatorsTool.calculate_boll(closes)
+            # 获取K线数据（秒级K线由本地逐笔成交合成）
+            if period in SECOND_PERIODS:
+                region = str(region).upper()
+                frame = get_tick_bars().query(region, str(code), period, limit=limit)
+                # 每次查询为临时采集续期
+                feed = get_tick_feed()
+                started = not feed.watching(region, str(code))
+                refused = feed.watch(region, str(code), api_key)
+                if len(frame) == 0 and refused:
+                    return {
+                        "content": [{
+                            "type": "text",
+                            "text": f"❌ 本地没有 {region}.{code} 的逐笔成交，无法合成 {period} K线：{refused}"
+                        }],
+                        "isError": True
+                    }
+                if len(frame) == 0 and started:
+                    return {
+                        "content": [{
+                            "type": "text",
+                            "text": f"📡 已开始采集 {region}.{code} 的逐笔成交，{period} K线将在成交发生后实时合成，请稍后再查询（{settings.tick_watch_ttl // 60} 分钟内未再查询将停止采集）。"
+                        }]
+                    }
+            else:
+                client = get_client(api_key)
+                frame = await client.get_stock_kline_frame(
+                    region=str(region),
+                    code=str(code),
+                    period=period,
+                    limit=limit
+                )
             
-            if "ma" in indicators or "ema" in indicators:
-                results["均线系统"] = {
-                    "MA5": round(TechnicalIndicatorsTool.calculate_ma(closes, 5) or 0, 2),
-                    "MA10": round(TechnicalIndicatorsTool.calculate_ma(closes, 10) or 0, 2),
-                    "MA20": round(TechnicalIndicatorsTool.calculate_ma(closes, 20) or 0, 2),
-                    "MA60": round(TechnicalIndicatorsTool.calculate_ma(closes, 60) or 0, 2),
-                    "当前价": round(closes[-1], 2)
+            if len(frame) == 0:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": "❌ 未获取到K线数据，无法计算技术指标"
+                    }],
+                    "isError": True
                 }
             
-            # 格式化输出
-            output = f"""## 📊 技术指标分析
-
-**股票信息**
-- 📌 代码: {region}.{code}
-- 📈 周期: {period}
-- 📅 数据量: {len(kline_data)} 条K线
-- 💰 最新价: {closes[-1]:.2f}
-
----
-
-"""
-            
-            for indicator_name, indicator_data in results.items():
-                output += f"### {indicator_name}\n\n"
-                
-                if "error" in indicator_data:
-                    output += f"❌ {indicator_data['error']}\n\n"
-                else:
-                    for key, value in indicator_data.items():
-                        output += f"- **{key}**: {value}\n"
-                    output += "\n"
+            # 提取价格数据（列已对齐，转为列表供逐点计算）
+            closes = frame.c.tolist()
+            highs = frame.h.tolist()
+            lows = frame.l.tolist()
             
-            output += """---
-**📌 使用提示**:
-1. 金叉(看涨): 快线上穿慢线，买入信号
-2. 死叉(看空): 快线下穿慢线，卖出信号
-3. RSI>70超买，RSI<30超卖
-4. KDJ的J值>100超买，<0超卖
-5. 价格突破布林带上轨可能超买，跌破下轨可能超卖
-6. 多个指标共振时信号更可靠
-
-**⚠️ 风险提示**: 技术指标仅供参考，不构成投资建议。请结合基本面和市场环境综合判断。
-
-*计算时间: """ + datetime.now().strftime('%Y-%m-%d %H:%M:%S') + "*"
+            # 计算指标（纯 Python 循环，数据量大时在进程池中执行）
+            results = await get_executor().run(
+                TechnicalIndicatorsTool.compute_indicators,
+                closes, highs, lows, indicators,
+                size=len(closes),
+                kind=ComputeExecutor.PROCESS
+            )
             
-            return {
-                "content": [{
-                    "type": "text",
-                    "text": output
-                }]
+            # 每个指标字段一行（数据不足的指标只有 error 字段）
+            rows = [
+                (name, key, value)
+                for name, data in results.items()
+                for key, value in data.items()
+            ]
+            meta = {
+                "region": str(region),
+                "code": str(code),
+                "period": period,
+                "count": len(frame),
+                "last_close": closes[-1]
             }
+            return table_result(
+                meta,
+                {
+                    "indicator": [row[0] for row in rows],
+                    "field": [row[1] for row in rows],
+                    "value": [row[2] for row in rows]
+                },
+                output_format,
+                lambda: TechnicalIndicatorsTool.format_markdown(results, region, code, period, len(frame), closes[-1])
+            )
             
         except ItickAPIError as e:
             return {
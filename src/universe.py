@@ -0,0 +1,49 @@
+"""
+Stock Universes - 股票池
+从 src/data/universes 目录加载命名股票池，供批量排名类工具使用
+"""
+from typing import Any, Dict, List
+from pathlib import Path
+from functools import lru_cache
+import json
+
+
+UNIVERSE_DIR = Path(__file__).parent / "data" / "universes"
+
+
+def list_universes() -> Dict[str, str]:
+    """
+    列出所有可用股票池
+    
+    Returns:
+        {股票池名称: 描述}
+    """
+    universes = {}
+    for path in sorted(UNIVERSE_DIR.glob("*.json")):
+        universes[path.stem] = load_universe_file(path.stem).get("description", "")
+    return universes
+
+
+@lru_cache(maxsize=None)
+def load_universe_file(name: str) -> Dict[str, Any]:
+    """读取股票池文件（结果缓存）"""
+    path = UNIVERSE_DIR / f"{name}.json"
+    if not name.replace("_", "").isalnum() or not path.is_file():
+        available = ", ".join(p.stem for p in sorted(UNIVERSE_DIR.glob("*.json")))
+        raise ValueError(f"未知的股票池: {name}（可用: {available}）")
+    
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_universe(name: str) -> List[Dict[str, str]]:
+    """
+    加载股票池成分
+    
+    Args:
+        name: 股票池名称（文件名，不含 .json）
+    
+    Returns:
+        [{region, code, name}, ...]
+    """
+    return [dict(symbol) for symbol in load_universe_file(name)["symbols"]]
@@ -0,0 +1,170 @@
+"""
+Volatility - 波动率估计
+基于 NumPy 的向量化波动率序列：滚动收盘价波动率、EWMA（RiskMetrics）、
+Parkinson 和 Garman-Klass（利用最高/最低价），输入为 (序列数 × K线数) 矩阵
+"""
+from typing import Dict
+import numpy as np
+from .kline_frame import KlineFrame
+from .resample import INTRADAY_MINUTES, market_session
+from . import indicators as ind
+
+
+TRADING_DAYS = 252
+
+# 非分钟级周期每年的K线数
+PERIODS_PER_YEAR = {
+    "day": TRADING_DAYS,
+    "week": 52,
+    "month": 12
+}
+
+# RiskMetrics 日频衰减因子
+EWMA_LAMBDA = 0.94
+
+
+def periods_per_year(period: str, region: str = "SH") -> float:
+    """
+    每年的K线数（用于年化）
+    
+    Args:
+        period: K线周期
+        region: 市场代码（分钟级周期按该市场的交易时长折算）
+    
+    Returns:
+        每年K线数
+    """
+    if period in INTRADAY_MINUTES:
+        _, sessions = market_session(region)
+        minutes = sum(end - start for start, end in sessions)
+        return TRADING_DAYS * minutes / INTRADAY_MINUTES[period]
+    return PERIODS_PER_YEAR.get(period, TRADING_DAYS)
+
+
+def _log(matrix: np.ndarray) -> np.ndarray:
+    """对数，非正数处为 NaN"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.log(matrix)
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def log_returns(closes: np.ndarray) -> np.ndarray:
+    """对数收益率，与 closes 同形状，首列为 NaN"""
+    out = np.full(closes.shape, np.nan)
+    if closes.shape[1] > 1:
+        out[:, 1:] = np.diff(_log(closes), axis=1)
+    return out
+
+
+def _rolling_sums(matrix: np.ndarray, window: int):
+    """滚动窗口内有效值的个数、和与平方和（前缀和实现，与窗口长度无关）"""
+    valid = ~np.isnan(matrix)
+    x = np.where(valid, matrix, 0.0)
+    
+    def windowed(values: np.ndarray) -> np.ndarray:
+        cs = np.zeros((values.shape[0], values.shape[1] + 1))
+        np.cumsum(values, axis=1, out=cs[:, 1:])
+        return cs[:, window:] - cs[:, :-window]
+    
+    return windowed(valid.astype(np.float64)), windowed(x), windowed(x * x)
+
+
+def rolling_mean(matrix: np.ndarray, window: int) -> np.ndarray:
+    """滚动均值，窗口内存在 NaN 时结果为 NaN"""
+    out = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] >= window:
+        n, s, _ = _rolling_sums(matrix, window)
+        out[:, window - 1:] = np.where(n == window, s / window, np.nan)
+    return out
+
+
+def close_to_close(closes: np.ndarray, window: int = 20) -> np.ndarray:
+    """
+    滚动收盘价波动率：最近 window 期对数收益率的样本标准差（未年化）
+    
+    Args:
+        closes: 收盘价矩阵
+        window: 窗口期数（≥2）
+    
+    Returns:
+        与 closes 同形状的矩阵，样本不足处为 NaN
+    """
+    returns = log_returns(closes)
+    out = np.full(closes.shape, np.nan)
+    if window < 2 or returns.shape[1] < window:
+        return out
+    
+    n, s, ss = _rolling_sums(returns, window)
+    with np.errstate(invalid="ignore"):
+        var = np.clip((ss - s * s / window) / (window - 1), 0, None)
+    out[:, window - 1:] = np.where(n == window, np.sqrt(var), np.nan)
+    return out
+
+
+def ewma(closes: np.ndarray, lam: float = EWMA_LAMBDA) -> np.ndarray:
+    """
+    EWMA 波动率（RiskMetrics）：σ²[t] = λ·σ²[t-1] + (1-λ)·r²[t]（未年化）
+    
+    以首个收益率的平方为初值，停牌等缺失的收益率沿用上一期方差。
+    """
+    returns = log_returns(closes)
+    variance = ind.ewm(ind.ffill(returns * returns), 1 - lam)
+    return np.sqrt(variance)
+
+
+def parkinson(highs: np.ndarray, lows: np.ndarray, window: int = 20) -> np.ndarray:
+    """
+    Parkinson 波动率：σ² = mean(ln(H/L)²) / (4·ln2)（未年化）
+    
+    只用最高/最低价，对相同样本数的估计效率约为收盘价波动率的5倍，但不含隔夜跳空。
+    """
+    hl = _log(highs) - _log(lows)
+    return np.sqrt(rolling_mean(hl * hl, window) / (4 * np.log(2)))
+
+
+def garman_klass(
+    opens: np.ndarray,
+    highs: np.ndarray,
+    lows: np.ndarray,
+    closes: np.ndarray,
+    window: int = 20
+) -> np.ndarray:
+    """
+    Garman-Klass 波动率：σ² = mean(½·ln(H/L)² − (2ln2−1)·ln(C/O)²)（未年化）
+    """
+    hl = _log(highs) - _log(lows)
+    co = _log(closes) - _log(opens)
+    term = 0.5 * hl * hl - (2 * np.log(2) - 1) * co * co
+    return np.sqrt(np.clip(rolling_mean(term, window), 0, None))
+
+
+def frame_volatility(
+    frame: KlineFrame,
+    period: str = "day",
+    region: str = "SH",
+    window: int = 20,
+    lam: float = EWMA_LAMBDA
+) -> Dict[str, np.ndarray]:
+    """
+    单个K线序列的各类年化波动率序列（%）
+    
+    Args:
+        frame: K线数据
+        period: K线周期（决定年化因子）
+        region: 市场代码
+        window: 滚动窗口期数
+        lam: EWMA 衰减因子
+    
+    Returns:
+        {"close": 滚动收盘价, "ewma": EWMA, "parkinson": Parkinson, "garman_klass": Garman-Klass}，
+        各序列与 frame 等长
+    """
+    scale = np.sqrt(periods_per_year(period, region)) * 100
+    o, h, l, c = (np.asarray(x, dtype=np.float64)[None, :] for x in (frame.o, frame.h, frame.l, frame.c))
+    return {
+        "close": close_to_close(c, window)[0] * scale,
+        "ewma": ewma(c, lam)[0] * scale,
+        "parkinson": parkinson(h, l, window)[0] * scale,
+        "garman_klass": garman_klass(o, h, l, c, window)[0] * scale
+    }
@@ -0,0 +1,57 @@
+"""
+Bar Store 覆盖区间测试
+"""
+import numpy as np
+from src.bar_store import BarStore
+from src.kline_frame import KlineFrame
+
+DAY_MS = 86400000
+KEY = ("stock", "SH", "600519", "day")
+
+
+def make_frame(first_day: int, days: int) -> KlineFrame:
+    """连续交易日的K线"""
+    t = (first_day + np.arange(days)) * DAY_MS
+    close = np.linspace(100, 110, days)
+    return KlineFrame(t, close, close, close, close, np.ones(days), close)
+
+
+def put_chunk(store: BarStore, first_day: int, days: int):
+    """写入一段完整覆盖 [first_day, first_day + days) 的K线"""
+    store.put(KEY, make_frame(first_day, days), first_day * DAY_MS, (first_day + days) * DAY_MS - 1)
+
+
+def test_out_of_order_chunks_keep_coverage():
+    store = BarStore()
+    put_chunk(store, 19000, 10)
+    put_chunk(store, 19020, 10)
+
+    # 第三段先于第二段完成，第一段的覆盖区间不丢失
+    assert store.coverage(KEY) == [(19000 * DAY_MS, 19010 * DAY_MS - 1), (19020 * DAY_MS, 19030 * DAY_MS - 1)]
+    assert store.covers(KEY, 19002 * DAY_MS, 19008 * DAY_MS)
+    assert not store.covers(KEY, 19008 * DAY_MS, 19022 * DAY_MS)
+
+    # 第二段补上空隙后合并为一个区间
+    put_chunk(store, 19010, 10)
+    assert store.coverage(KEY) == [(19000 * DAY_MS, 19030 * DAY_MS - 1)]
+    assert len(store.get(KEY)) == 30
+
+
+def test_query_uses_interval_containing_range():
+    store = BarStore()
+    put_chunk(store, 19000, 10)
+    put_chunk(store, 19020, 10)
+
+    selected = store.query(*KEY, "SH", start=19001 * DAY_MS, end=19005 * DAY_MS)
+    assert selected is not None and len(selected) == 5
+    assert store.query(*KEY, "SH", start=19005 * DAY_MS, end=19025 * DAY_MS) is None
+
+
+def test_coverage_persisted(tmp_path):
+    store = BarStore(directory=str(tmp_path))
+    put_chunk(store, 19020, 10)
+    put_chunk(store, 19000, 10)
+
+    reloaded = BarStore(directory=str(tmp_path))
+    assert reloaded.summary(KEY) == (20, store.coverage(KEY))
+    assert reloaded.coverage(KEY) == store.coverage(KEY)
@@ -0,0 +1,61 @@
+"""
+批量技术指标与单只股票技术指标的一致性测试
+"""
+import numpy as np
+from src.kline_frame import KlineFrame
+from src.tools.batch_indicators import BatchIndicatorsTool
+from src.tools.technical_indicators import TechnicalIndicatorsTool
+
+DAY_MS = 86400000
+
+
+def make_frame(days: np.ndarray, seed: int) -> KlineFrame:
+    """按给定交易日生成随机游走K线"""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1.5, len(days)))
+    high = close + rng.uniform(0, 1, len(days))
+    low = close - rng.uniform(0, 1, len(days))
+    volume = rng.uniform(1e5, 1e6, len(days))
+    return KlineFrame(days * DAY_MS, close, high, low, close, volume, close * volume)
+
+
+def single(frame: KlineFrame) -> dict:
+    """单只股票工具的计算结果"""
+    closes, highs, lows = frame.c.tolist(), frame.h.tolist(), frame.l.tolist()
+    return {
+        "ma5": TechnicalIndicatorsTool.calculate_ma(closes, 5),
+        "ma20": TechnicalIndicatorsTool.calculate_ma(closes, 20),
+        "rsi": TechnicalIndicatorsTool.calculate_rsi(closes)["rsi"],
+        "dif": TechnicalIndicatorsTool.calculate_macd(closes)["dif"],
+        "j": TechnicalIndicatorsTool.calculate_kdj(highs, lows, closes)["j"],
+        "upper": TechnicalIndicatorsTool.calculate_boll(closes)["upper"]
+    }
+
+
+def test_batch_matches_single_on_mismatched_calendars():
+    # 每日交易、隔日交易、较早结束的三只股票
+    frames = [
+        make_frame(np.arange(19000, 19120), 1),
+        make_frame(np.arange(19000, 19240, 2), 2),
+        make_frame(np.arange(18950, 19040), 3)
+    ]
+    metrics = BatchIndicatorsTool.compute(frames)
+    
+    for i, frame in enumerate(frames):
+        expected = single(frame)
+        assert metrics["last"][i] == frame.c[-1]
+        assert np.isclose(metrics["ma5"][i], expected["ma5"])
+        assert np.isclose(metrics["ma20"][i], expected["ma20"])
+        assert np.isclose(metrics["rsi"][i], expected["rsi"], atol=0.005)
+        assert np.isclose(metrics["dif"][i], expected["dif"], atol=0.00005)
+        assert np.isclose(metrics["j"][i], expected["j"], atol=0.005)
+        assert np.isclose(metrics["change_pct"][i], (frame.c[-1] / frame.c[0] - 1) * 100)
+
+
+def test_batch_short_series_padded_with_nan():
+    frames = [make_frame(np.arange(19000, 19100), 4), make_frame(np.arange(19000, 19010), 5)]
+    metrics = BatchIndicatorsTool.compute(frames)
+    
+    # 10 根K线不足以计算 MA20 和 RSI(14)，不会被其他股票的时间轴补齐
+    assert np.isnan(metrics["ma20"][1]) and np.isnan(metrics["rsi"][1])
+    assert np.isclose(metrics["ma5"][1], frames[1].c[-5:].mean())